@@ -1,14 +1,30 @@
-import datetime
-from typing import Optional
+import hashlib
+import json
+import time
+from typing import AsyncIterator, Dict, Iterator, List, Optional
 
-from app.api.canvas_client import CanvasClient
-from app.services.openai_service import OpenAIService
+from app.api.async_canvas_client import AsyncCanvasClient
+from app.api.data_store import get_canvas_store
+from app.agent.fetch_planner import COURSES_TASK, AsyncFetchPlanner, data_age
+from app.agent.memory import ConversationMemory
+from app.services.async_openai_service import AsyncOpenAIService
+from app.services.course_index import get_course_index
+from app.services.classification_cache import normalize_query
+from app.prompt.canvasai import ERROR_RESPONSE
 from app.logger import logger
-from app.utils.loading_utils import LoadingAnimation
+from app.config import SPECULATIVE_PREFETCH
+from app.utils.async_utils import iter_sync, run_sync
+from app.utils.cassette import record_event
+from app.utils.tracing import record_span, span
+
 
 class CanvasAI:
     '''
     A versatile agent that can perform a wide range of tasks using Canvas API based on user input.
+
+    The pipeline is asyncio-native (aprocess_query, astream_query) so many
+    queries can share one event loop; the synchronous methods are thin
+    wrappers that run it on a background loop.
     '''
     
     name: str = "canvasai"
@@ -16,20 +32,30 @@ class CanvasAI:
         "A versatile agent that can solve academic questions using multiple tools"
     )
     
-    def __init__(self):
-        # Initialize APIs and services
-        self.canvas_client = CanvasClient()
-        self.openai_service = OpenAIService()
+    def __init__(self, api_key: Optional[str] = None):
+        # Initialize APIs and services; HTTP pools and caches are shared between agents
+        # Errors are raised so the planner reports them as missing data instead of storing an empty result
+        self.canvas_client = AsyncCanvasClient(api_key=api_key, raise_errors=True)
+        self.openai_service = AsyncOpenAIService()
+        self.fetch_planner = AsyncFetchPlanner(self.canvas_client, store=get_canvas_store())
         
-        # Conversation history for context
-        self.conversation_history = []
-        self.max_history_length = 10
+        # Active courses from the latest query, used to resolve course mentions
+        self._courses = None
+        self._courses_size = 0
+        
+        # Token-capped conversation history for context
+        self.memory = ConversationMemory()
     
     def authenticate_user(self, user_token: Optional[str] = None) -> bool:
+        """Authenticate user with Canvas API"""
+        return run_sync(self.aauthenticate_user(user_token))
+    
+    async def aauthenticate_user(self, user_token: Optional[str] = None) -> bool:
         """Authenticate user with Canvas API"""
         logger.info("Authenticating user with Canvas API...")
-        with LoadingAnimation("Authenticating", "spinner"):
-            result = self.canvas_client.authenticate_user(user_token)
+        record_event("authenticate", user_token or self.canvas_client.api_key)
+        with span("authenticate", message="Authenticating"):
+            result = await self.canvas_client.authenticate_user(user_token)
         
         if result:
             logger.info("Authentication successful")
@@ -37,171 +63,235 @@ class CanvasAI:
             logger.error("Authentication failed")
         return result
     
+    @property
+    def courses(self) -> Optional[List[Dict]]:
+        return self._courses
+    
+    @courses.setter
+    def courses(self, courses: Optional[List[Dict]]):
+        # Measured once per load so footprint() stays cheap
+        if courses is not self._courses:
+            self._courses_size = len(json.dumps(courses, default=str)) if courses else 0
+        self._courses = courses
+    
+    def footprint(self) -> int:
+        """Approximate bytes of per-session state: the conversation and the loaded courses"""
+        return self.memory.size_bytes() + self._courses_size
+    
     def update_conversation_history(self, user_query: str, bot_response: str):
         """Update conversation history with the latest exchange"""
-        self.conversation_history.append({
-            "user": user_query,
-            "assistant": bot_response,
-            "timestamp": datetime.datetime.now().isoformat()
-        })
-        
-        # Trim history if it exceeds max length
-        if len(self.conversation_history) > self.max_history_length:
-            self.conversation_history = self.conversation_history[-self.max_history_length:]
+        self.memory.add(user_query, bot_response)
     
     def _prepare_context(self, query: str) -> str:
-        """Prepare context for OpenAI by formatting conversation history"""
-        context = "Previous conversation:\n"
-        
-        for exchange in self.conversation_history[-3:]:  # Last 3 exchanges
-            context += f"User: {exchange['user']}\n"
-            context += f"Assistant: {exchange['assistant']}\n"
-        
-        context += f"\nCurrent query: {query}\n"
-        return context
+        """Prepare context for OpenAI from the conversation memory"""
+        return self.memory.context(query)
     
-    def _extract_course_id(self, course_name: str) -> Optional[int]:
-        """Extract course ID from course name or partial name - used as fallback"""
-        courses = self.canvas_client.load_active_courses()
-        
-        # Try exact match first
-        for course in courses:
-            if course["name"].lower() == course_name.lower():
-                logger.info(f"Found exact course match: {course['name']}")
-                return course["id"]
+    def _answer_scope(self) -> str:
+        """Identify the Canvas user so cached answers are never shared between students"""
+        user_info = self.canvas_client.user_info or {}
+        if user_info.get("id") is not None:
+            return f"user:{user_info['id']}"
+        return "token:" + hashlib.sha256((self.canvas_client.api_key or "").encode()).hexdigest()
+    
+    def _context_key(self, query: str) -> str:
+        """
+        Key for the conversation state an answer depends on: the distinct recent
+        user queries other than the current one. Earlier assistant replies are left
+        out since they differ run to run without changing what was asked.
+        """
+        current = normalize_query(query)
+        recent = []
+        for previous_query in self.memory.recent_queries():
+            previous = normalize_query(previous_query)
+            if previous != current and previous not in recent:
+                recent.append(previous)
+        return "|".join(recent)
+    
+    async def _extract_course_id(self, course_name: str) -> Optional[int]:
+        """Resolve a course name or partial name through the course index - used as fallback"""
+        courses = self.courses if self.courses is not None else (await self.fetch_planner.fetch(COURSES_TASK)).value
+        matches = get_course_index(courses).resolve(course_name)
         
-        # Try partial match
-        for course in courses:
-            if course_name.lower() in course["name"].lower():
-                logger.info(f"Found partial course match: {course['name']}")
-                return course["id"]
+        if matches and matches[0].confidence != "low":
+            best = matches[0]
+            logger.info(f"Found {best.reason} course match: {best.course['name']} (score {best.score:.2f})")
+            return best.course["id"]
         
         return None
     
     async def run(self, query: str):
-        """Run the agent with the given query (async interface for potential future use)"""
-        return self.process_query(query)
+        """Run the agent with the given query"""
+        return await self.aprocess_query(query)
+    
+    async def _agather_data(self, query: str, result: Dict) -> AsyncIterator[Dict]:
+        """
+        Load courses, classify the query and fetch the Canvas data it needs.
+        Yields a progress event as each phase starts; the data dict, the
+        classified query type and the age of the data are left in result["data"],
+        result["query_type"] and result["data_age"].
+        """
+        # First load courses as they're needed for classification
+        logger.info("Loading course data...")
+        yield {"type": "progress", "phase": "courses", "message": "Fetching course information"}
+        with span("courses", message="Fetching course information"):
+            fetched = await self.fetch_planner.fetch(COURSES_TASK)
+            courses = fetched.value
+            self.courses = courses
+            data = {"courses": courses}
+        # When Canvas returned each piece of data, kept out of data, which is what the answer cache is keyed on
+        fetched_at = {COURSES_TASK.key: fetched.fetched_at}
+        
+        # Start fetching the likely data while the query is being classified
+        speculation = self.fetch_planner.speculate(query, courses) if SPECULATIVE_PREFETCH else {}
+        
+        # Use OpenAI to classify the query and extract key information, including course matching
+        logger.info("Classifying query...")
+        yield {"type": "progress", "phase": "classify", "message": "Analyzing your question"}
+        with span("classify", message="Analyzing your question"):
+            classification = await self.openai_service.classify_query(query, courses)
+        
+        # Extract relevant information based on classification
+        query_type = classification.get("query_type", "unknown")
+        course_name = classification.get("course")
+        course_id = classification.get("course_id")
+        confidence = classification.get("course_match_confidence")
+        
+        logger.info(f"Query classified as: {query_type}, Course: {course_name or 'None'}")
+        
+        # Resolve the course, falling back to name matching if classification had no ID
+        if course_id:
+            logger.info(f"Using course ID from classification: {course_id} ('{course_name}', confidence: {confidence})")
+        elif course_name:
+            logger.info(f"Course name mentioned but no ID match from classification. Trying fallback method.")
+            with span("resolve_course", message=f"Finding course '{course_name}'"):
+                course_id = await self._extract_course_id(course_name)
+            
+            if course_id:
+                logger.info(f"Found course ID: {course_id}")
+            else:
+                logger.warning(f"Could not find course: {course_name}")
+        
+        # Plan the Canvas fetches for this query and run independent ones concurrently
+        include_deadlines = query_type in ["deadlines", "upcoming"] or not course_name
+        tasks = self.fetch_planner.plan(query_type, course_id, include_deadlines)
+        if tasks:
+            yield {
+                "type": "progress",
+                "phase": "fetch",
+                "message": "Retrieving course data",
+                "fetches": [task.key for task in tasks],
+            }
+            with span("fetch", message="Retrieving course data"):
+                missing = await self.fetch_planner.execute(tasks, data, prefetched=speculation, fetched_at=fetched_at)
+            if missing:
+                logger.warning(f"Answering with partial data, missing: {', '.join(missing)}")
+        else:
+            self.fetch_planner.discard(speculation)
+        
+        if course_id:
+            data["course_id"] = course_id
+        ages = data_age(fetched_at)
+        if ages:
+            logger.info(f"Answering with data aged {', '.join(f'{key} {age:.0f}s' for key, age in ages.items())}")
+        result["data"] = data
+        result["query_type"] = query_type
+        result["data_age"] = ages
     
     def process_query(self, query: str) -> str:
         """
         Process a natural language query from the student
         Uses OpenAI to understand the query and formulate a response
         """
+        return run_sync(self.aprocess_query(query))
+    
+    async def aprocess_query(self, query: str) -> str:
+        """Async implementation of process_query"""
+        return (await self.aanswer_query(query))["response"]
+    
+    def answer_query(self, query: str) -> Dict:
+        """
+        process_query, returning the response along with the age in seconds of
+        the Canvas data it used: {"response": ..., "data_age": {key: seconds}}
+        """
+        return run_sync(self.aanswer_query(query))
+    
+    async def aanswer_query(self, query: str) -> Dict:
+        """Async implementation of answer_query"""
+        record_event("query", self.canvas_client.api_key, query=query)
         try:
-            # First load courses as they're needed for classification
-            logger.info("Loading course data...")
-            with LoadingAnimation("Fetching course information", "spinner"):
-                courses = self.canvas_client.load_active_courses()
-                data = {"courses": courses}
-            
-            # Use OpenAI to classify the query and extract key information, including course matching
-            logger.info("Classifying query...")
-            with LoadingAnimation("Analyzing your question", "spinner"):
-                classification = self.openai_service.classify_query(query, courses)
-            
-            # Extract relevant information based on classification
-            query_type = classification.get("query_type", "unknown")
-            course_name = classification.get("course")
-            course_id = classification.get("course_id")
-            confidence = classification.get("course_match_confidence")
-            
-            logger.info(f"Query classified as: {query_type}, Course: {course_name or 'None'}")
-            
-            # Get course-specific information if a course was identified
-            if course_id:
-                logger.info(f"Using course ID from classification: {course_id} ('{course_name}', confidence: {confidence})")
-                
-                if query_type in ["assignments", "deadlines"]:
-                    logger.info(f"Fetching assignments for course {course_id}")
-                    with LoadingAnimation("Retrieving assignments", "spinner"):
-                        data["assignments"] = self.canvas_client.get_course_assignments(course_id)
-                
-                if query_type in ["grades"]:
-                    logger.info(f"Fetching grades for course {course_id}")
-                    with LoadingAnimation("Retrieving grades", "spinner"):
-                        data["grades"] = self.canvas_client.get_course_grades(course_id)
-                
-                if query_type in ["course_materials", "modules"]:
-                    logger.info(f"Fetching modules and files for course {course_id}")
-                    with LoadingAnimation("Retrieving course materials", "spinner"):
-                        data["modules"] = self.canvas_client.get_course_modules(course_id)
-                        data["files"] = self.canvas_client.get_course_files(course_id)
-                
-                if query_type in ["announcements"]:
-                    logger.info(f"Fetching announcements for course {course_id}")
-                    with LoadingAnimation("Retrieving announcements", "spinner"):
-                        data["announcements"] = self.canvas_client.get_course_announcements(course_id)
-                
-                # Get detailed course info
-                logger.info(f"Fetching detailed course information for {course_id}")
-                with LoadingAnimation("Getting course details", "spinner"):
-                    data["course_details"] = self.canvas_client.get_course_details(course_id)
-                    data["course_id"] = course_id
-            
-            elif course_name:
-                # Fallback to original method if we have a course name but no ID match
-                logger.info(f"Course name mentioned but no ID match from classification. Trying fallback method.")
-                with LoadingAnimation(f"Finding course '{course_name}'", "spinner"):
-                    course_id = self._extract_course_id(course_name)
-                    
-                if course_id:
-                    logger.info(f"Found course ID: {course_id}")
-                    
-                    if query_type in ["assignments", "deadlines"]:
-                        logger.info(f"Fetching assignments for course {course_id}")
-                        with LoadingAnimation("Retrieving assignments", "spinner"):
-                            data["assignments"] = self.canvas_client.get_course_assignments(course_id)
-                    
-                    if query_type in ["grades"]:
-                        logger.info(f"Fetching grades for course {course_id}")
-                        with LoadingAnimation("Retrieving grades", "spinner"):
-                            data["grades"] = self.canvas_client.get_course_grades(course_id)
-                    
-                    if query_type in ["course_materials", "modules"]:
-                        logger.info(f"Fetching modules and files for course {course_id}")
-                        with LoadingAnimation("Retrieving course materials", "spinner"):
-                            data["modules"] = self.canvas_client.get_course_modules(course_id)
-                            data["files"] = self.canvas_client.get_course_files(course_id)
-                    
-                    if query_type in ["announcements"]:
-                        logger.info(f"Fetching announcements for course {course_id}")
-                        with LoadingAnimation("Retrieving announcements", "spinner"):
-                            data["announcements"] = self.canvas_client.get_course_announcements(course_id)
-                    
-                    # Get detailed course info
-                    logger.info(f"Fetching detailed course information for {course_id}")
-                    with LoadingAnimation("Getting course details", "spinner"):
-                        data["course_details"] = self.canvas_client.get_course_details(course_id)
-                        data["course_id"] = course_id
-                else:
-                    logger.warning(f"Could not find course: {course_name}")
-            
-            # Get global information for certain query types
-            if query_type in ["deadlines", "upcoming"] or not course_name:
-                logger.info("Fetching upcoming deadlines across all courses")
-                with LoadingAnimation("Checking upcoming deadlines", "spinner"):
-                    data["upcoming_deadlines"] = self.canvas_client.get_upcoming_deadlines()
+            gathered = {}
+            async for _ in self._agather_data(query, gathered):
+                pass
+            data, query_type = gathered["data"], gathered["query_type"]
             
             # Now, use OpenAI to generate a response based on the fetched data
             context = self._prepare_context(query)
             
             # Generate response
             logger.info("Generating response based on collected data")
-            with LoadingAnimation("Formulating response", "spinner"):
-                bot_response = self.openai_service.generate_response(context, data, query)
+            with span("generate", message="Formulating response"):
+                bot_response = await self.openai_service.generate_response(
+                    context, data, query, query_type,
+                    scope=self._answer_scope(), context_key=self._context_key(query)
+                )
             
             # Update conversation history
             self.update_conversation_history(query, bot_response)
             logger.info("Response generated successfully")
             
-            return bot_response
+            return {"response": bot_response, "data_age": gathered["data_age"]}
             
         except Exception as e:
             logger.error(f"Error processing query: {e}")
-            return f"I'm sorry, I encountered an error while processing your query. Please try again or rephrase your question. Error details: {str(e)}"
+            return {"response": ERROR_RESPONSE.format(error=e), "data_age": {}}
+    
+    def stream_query(self, query: str) -> Iterator[Dict]:
+        """
+        Streaming variant of process_query
+
+        Yields progress events while data is gathered, then the answer as token
+        events while the model writes it, and a final done (or error) event.
+        """
+        return iter_sync(self.astream_query(query))
+    
+    async def astream_query(self, query: str) -> AsyncIterator[Dict]:
+        """Async implementation of stream_query"""
+        record_event("stream", self.canvas_client.api_key, query=query)
+        try:
+            gathered = {}
+            async for event in self._agather_data(query, gathered):
+                yield event
+            data, query_type = gathered["data"], gathered["query_type"]
+            
+            context = self._prepare_context(query)
+            logger.info("Streaming response based on collected data")
+            yield {"type": "progress", "phase": "respond", "message": "Formulating response"}
+            started = time.perf_counter()
+            chunks = []
+            async for text in self.openai_service.stream_response(
+                context, data, query, query_type,
+                scope=self._answer_scope(), context_key=self._context_key(query)
+            ):
+                chunks.append(text)
+                yield {"type": "token", "text": text}
+            record_span("generate", started)
+            
+            bot_response = "".join(chunks).strip()
+            self.update_conversation_history(query, bot_response)
+            logger.info("Response streamed successfully")
+            yield {"type": "done", "data_age": gathered["data_age"]}
+            
+        except Exception as e:
+            logger.error(f"Error processing query: {e}")
+            yield {"type": "error", "message": ERROR_RESPONSE.format(error=e)}
     
     def load_active_courses(self):
         """Convenience method to directly access canvas client"""
+        return run_sync(self.aload_active_courses())
+    
+    async def aload_active_courses(self):
+        """Load the active courses of the authenticated user"""
         logger.info("Loading active courses")
-        with LoadingAnimation("Loading active courses", "spinner"):
-            return self.canvas_client.load_active_courses()
+        record_event("courses", self.canvas_client.api_key)
+        with span("courses", message="Loading active courses"):
+            return (await self.fetch_planner.fetch(COURSES_TASK)).value
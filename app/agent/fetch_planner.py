@@ -0,0 +1,365 @@
+import asyncio
+import contextvars
+import datetime
+import json
+import re
+import threading
+import time
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Tuple
+
+from app.logger import logger
+from app.api.data_store import STORED_METHODS, StoredData
+from app.utils import metrics
+from app.utils.date_utils import parse_canvas_date
+from app.config import (
+    CANVAS_MAX_CONCURRENCY, CANVAS_STORE_MAX_AGE, CANVAS_STORE_REVALIDATE_AFTER, QUERY_FETCH_DEADLINE
+)
+
+
+@dataclass(frozen=True)
+class FetchTask:
+    """
+    A single Canvas fetch needed to answer a query
+
+    The result is stored in the query data under `key`. `inputs` maps keyword
+    arguments of the client method to data keys that must be available first,
+    which is what orders dependent fetches.
+    """
+    key: str
+    method: str
+    args: Tuple = ()
+    inputs: Tuple[Tuple[str, str], ...] = ()
+
+    @property
+    def identity(self) -> Tuple:
+        return (self.method, self.args, self.inputs)
+
+    @property
+    def depends_on(self) -> Tuple[str, ...]:
+        return tuple(data_key for _, data_key in self.inputs)
+
+
+# The active courses, loaded before every query
+COURSES_TASK = FetchTask("courses", "load_active_courses")
+# Upcoming deadlines across the active courses
+DEADLINES_TASK = FetchTask("upcoming_deadlines", "get_upcoming_deadlines", inputs=(("courses", "courses"),))
+
+
+def data_age(fetched_at: Dict[str, float]) -> Dict[str, float]:
+    """Seconds since Canvas returned the data each key was answered with"""
+    now = time.time()
+    return {key: round(max(now - at, 0.0), 1) for key, at in fetched_at.items()}
+
+
+def upcoming_only(deadlines: Any) -> Any:
+    """Drop deadlines that have passed since the listing was fetched"""
+    if not isinstance(deadlines, list):
+        return deadlines
+    now = datetime.datetime.now(datetime.timezone.utc)
+    return [deadline for deadline in deadlines
+            if (due := parse_canvas_date(deadline.get("due_date"))) is None or due > now]
+
+
+# Course-specific data needed for each query type
+COURSE_FETCHES: Dict[str, List[Tuple[str, str]]] = {
+    "assignments": [("assignments", "get_course_assignments")],
+    "deadlines": [("assignments", "get_course_assignments")],
+    "grades": [("grades", "get_course_grades")],
+    "course_materials": [("modules", "get_course_modules"), ("files", "get_course_files")],
+    "modules": [("modules", "get_course_modules"), ("files", "get_course_files")],
+    "announcements": [("announcements", "get_course_announcements")],
+}
+
+# Keywords that hint at a query type before classification returns
+SPECULATION_KEYWORDS: Dict[str, Tuple[str, ...]] = {
+    "deadlines": ("due", "deadline", "upcoming", "today", "tomorrow", "this week", "next week", "to do", "todo"),
+    "grades": ("grade", "score", "mark", "gpa", "result"),
+    "assignments": ("assignment", "homework", "quiz", "submission"),
+    "course_materials": ("module", "file", "material", "slides", "lecture", "reading"),
+    "announcements": ("announcement", "news", "update", "notice"),
+}
+
+
+def plan_fetches(query_type: str, course_id: Optional[int], include_deadlines: bool) -> List[FetchTask]:
+    """Build the de-duplicated list of fetches for a classified query"""
+    tasks = []
+    if course_id:
+        for key, method in COURSE_FETCHES.get(query_type, []):
+            tasks.append(FetchTask(key, method, (course_id,)))
+        tasks.append(FetchTask("course_details", "get_course_details", (course_id,)))
+
+    if include_deadlines:
+        tasks.append(DEADLINES_TASK)
+
+    unique = {}
+    for task in tasks:
+        unique.setdefault(task.identity, task)
+    return list(unique.values())
+
+
+def guess_fetches(query: str, courses: List[Dict]) -> List[FetchTask]:
+    """
+    Guess the fetches a query will need from keywords and literal course mentions
+
+    Mirrors plan_fetches(): a course named in the query gets its details plus
+    any keyword-implied data, and deadlines are guessed when no course is named.
+    """
+    text = query.lower()
+    query_types = [query_type for query_type, keywords in SPECULATION_KEYWORDS.items()
+                   if any(keyword in text for keyword in keywords)]
+
+    mentioned = None
+    for course in courses:
+        names = [course.get("name", ""), course.get("course_code", "")]
+        if any(name and re.search(rf"\b{re.escape(name.lower())}\b", text) for name in names):
+            mentioned = course
+            break
+
+    tasks = []
+    if mentioned is not None:
+        for query_type in query_types:
+            tasks.extend(plan_fetches(query_type, mentioned["id"], include_deadlines=False))
+        tasks.extend(plan_fetches("unknown", mentioned["id"], include_deadlines=False))
+    if mentioned is None or "deadlines" in query_types:
+        tasks.extend(plan_fetches("unknown", None, include_deadlines=True))
+
+    unique = {}
+    for task in tasks:
+        unique.setdefault(task.identity, task)
+    return list(unique.values())
+
+
+class PrefetchStats:
+    """
+    Counters for speculative fetches, used to tune the speculation heuristics;
+    the process-wide totals are also exported as metrics
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.speculated = 0
+        self.used = 0
+        self.wasted = 0
+        self.wasted_bytes = 0
+
+    def record(self, speculated: int = 0, used: int = 0, wasted: int = 0, wasted_bytes: int = 0):
+        with self._lock:
+            self.speculated += speculated
+            self.used += used
+            self.wasted += wasted
+            self.wasted_bytes += wasted_bytes
+        for result, count in (("speculated", speculated), ("used", used), ("wasted", wasted)):
+            if count:
+                metrics.PREFETCH_FETCHES.labels(result).inc(count)
+        if wasted_bytes:
+            metrics.PREFETCH_WASTED_BYTES.inc(wasted_bytes)
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "speculated": self.speculated,
+                "used": self.used,
+                "wasted": self.wasted,
+                "wasted_bytes": self.wasted_bytes,
+                "hit_rate": self.used / self.speculated if self.speculated else 0.0,
+            }
+
+
+class AsyncFetchPlanner:
+    """
+    Turns a query classification into Canvas fetch tasks and runs them
+
+    Independent tasks run concurrently as tasks on the caller's event loop,
+    with a semaphore bounding how many are in flight; tasks whose inputs are
+    not available yet wait for the tasks producing them. Everything must
+    finish within a per-query deadline, after which the remaining keys are
+    reported as missing so the response can be generated from partial data.
+
+    With a CanvasStore, the fetches in STORED_METHODS are answered from the
+    data stored by earlier fetches or the background sync, and data older than
+    revalidate_after is then refreshed from Canvas in the background. Each
+    fetch resolves to a StoredData, so the time Canvas returned the value
+    travels with it into the query that used it.
+    """
+
+    def __init__(self, canvas_client, max_workers: int = CANVAS_MAX_CONCURRENCY,
+                 deadline: float = QUERY_FETCH_DEADLINE, store=None,
+                 revalidate_after: float = CANVAS_STORE_REVALIDATE_AFTER, max_age: float = CANVAS_STORE_MAX_AGE):
+        self.canvas_client = canvas_client
+        self.deadline = deadline
+        self.max_workers = max_workers
+        self.prefetch_stats = PrefetchStats()
+        self.store = store
+        self.revalidate_after = revalidate_after
+        self.max_age = max_age
+        self._revalidating: Dict[Tuple, asyncio.Task] = {}
+
+    def plan(self, query_type: str, course_id: Optional[int], include_deadlines: bool) -> List[FetchTask]:
+        """Build the de-duplicated list of fetches for a classified query"""
+        return plan_fetches(query_type, course_id, include_deadlines)
+
+    def guess_tasks(self, query: str, courses: List[Dict]) -> List[FetchTask]:
+        """Guess the fetches a query will need from keywords and literal course mentions"""
+        return guess_fetches(query, courses)
+
+    def speculate(self, query: str, courses: List[Dict]) -> Dict[Tuple, asyncio.Task]:
+        """Start the guessed fetches as tasks while the query is classified"""
+        limiter = asyncio.Semaphore(self.max_workers)
+        tasks = self.guess_tasks(query, courses)
+        speculation = {task.identity: self._submit(task, {"courses": courses}, limiter) for task in tasks}
+        self.prefetch_stats.record(speculated=len(speculation))
+        return speculation
+
+    def discard(self, speculation: Dict[Tuple, asyncio.Task]) -> int:
+        """Cancel speculative fetches the plan didn't need; returns the number wasted"""
+        for task in speculation.values():
+            if task.done() and not task.cancelled():
+                self._record_waste(task)
+            else:
+                task.cancel()
+                self.prefetch_stats.record(wasted=1)
+        wasted = len(speculation)
+        speculation.clear()
+        return wasted
+
+    def _record_waste(self, task: asyncio.Task):
+        try:
+            size = len(json.dumps(task.result().value, default=str))
+        except Exception:
+            size = 0
+        self.prefetch_stats.record(wasted=1, wasted_bytes=size)
+
+    def owner(self) -> Optional[str]:
+        """Whose data a fetch returns; nothing is stored for an unauthenticated client"""
+        user_info = self.canvas_client.user_info or {}
+        if self.store is None or user_info.get("id") is None:
+            return None
+        return f"{self.canvas_client.api_url}|{user_info['id']}"
+
+    def _stored(self, task: FetchTask) -> bool:
+        return task.method in STORED_METHODS
+
+    async def _fetch(self, task: FetchTask, kwargs: Dict, owner: Optional[str]) -> StoredData:
+        """Fetch from Canvas, storing the result for later queries"""
+        started = time.time()
+        value = await getattr(self.canvas_client, task.method)(*task.args, **kwargs)
+        if owner is not None and self._stored(task):
+            await asyncio.to_thread(self.store.put, owner, task.method, task.args, value, started)
+        return StoredData(value, started)
+
+    def _revalidate(self, task: FetchTask, kwargs: Dict, owner: str):
+        """Refresh stored data from Canvas in the background, once per fetch at a time"""
+        if task.identity in self._revalidating:
+            return
+        logger.info(f"Revalidating stored {task.key} ({task.method}{task.args})")
+        # An empty context keeps the refresh out of the trace of the query that started it
+        refresh = contextvars.Context().run(asyncio.ensure_future, self._fetch(task, kwargs, owner))
+        self._revalidating[task.identity] = refresh
+        refresh.add_done_callback(lambda done: self._revalidated(task, done))
+
+    def _revalidated(self, task: FetchTask, refresh: asyncio.Task):
+        self._revalidating.pop(task.identity, None)
+        if not refresh.cancelled() and refresh.exception() is not None:
+            logger.error(f"Error revalidating {task.key}: {refresh.exception()}")
+
+    def _submit(self, task: FetchTask, data: Dict, limiter: asyncio.Semaphore) -> asyncio.Task:
+        kwargs = {arg: data[data_key] for arg, data_key in task.inputs}
+        owner = self.owner() if self._stored(task) else None
+
+        async def run():
+            if owner is not None:
+                stored: Optional[StoredData] = await asyncio.to_thread(self.store.get, owner, task.method, task.args)
+                if stored is not None and stored.age < self.max_age:
+                    logger.info(f"Using stored {task.key} ({task.method}{task.args}), {stored.age:.0f}s old")
+                    if stored.age > self.revalidate_after:
+                        self._revalidate(task, kwargs, owner)
+                    if task.method == DEADLINES_TASK.method:
+                        return StoredData(upcoming_only(stored.value), stored.fetched_at)
+                    return stored
+            logger.info(f"Fetching {task.key} ({task.method}{task.args})")
+            async with limiter:
+                return await self._fetch(task, kwargs, owner)
+        return asyncio.ensure_future(run())
+
+    async def fetch(self, task: FetchTask) -> StoredData:
+        """Run a single fetch without inputs, such as COURSES_TASK, with the time Canvas returned it"""
+        return await self._submit(task, {}, asyncio.Semaphore(self.max_workers))
+
+    async def refresh(self, task: FetchTask, kwargs: Optional[Dict] = None) -> Any:
+        """Fetch from Canvas now, bypassing the stored data but updating it"""
+        fetched = await self._fetch(task, kwargs or {}, self.owner() if self._stored(task) else None)
+        return fetched.value
+
+    async def wait_revalidation(self):
+        """Wait for the background refreshes in flight"""
+        if self._revalidating:
+            await asyncio.gather(*self._revalidating.values(), return_exceptions=True)
+
+    async def execute(self, tasks: List[FetchTask], data: Dict, deadline: Optional[float] = None,
+                      prefetched: Optional[Dict[Tuple, asyncio.Task]] = None,
+                      fetched_at: Optional[Dict[str, float]] = None) -> Dict[str, str]:
+        """
+        Run the tasks, storing each result in data under its key and the time
+        Canvas returned it in fetched_at, if given
+
+        Tasks already started speculatively are taken from prefetched instead
+        of being fetched again; speculative fetches left over are discarded.
+
+        Returns a mapping of data keys that could not be fetched to the reason,
+        which is also recorded in data["missing_data"].
+        """
+        prefetched = prefetched if prefetched is not None else {}
+        limiter = asyncio.Semaphore(self.max_workers)
+        used = 0
+        deadline = self.deadline if deadline is None else deadline
+        loop = asyncio.get_running_loop()
+        expires_at = loop.time() + deadline
+        remaining = list(tasks)
+        pending: Dict[asyncio.Task, FetchTask] = {}
+        missing: Dict[str, str] = {}
+
+        while remaining or pending:
+            ready = [task for task in remaining if all(key in data for key in task.depends_on)]
+            for task in ready:
+                remaining.remove(task)
+                future = prefetched.pop(task.identity, None)
+                if future is not None and not future.cancelled():
+                    used += 1
+                else:
+                    future = self._submit(task, data, limiter)
+                pending[future] = task
+
+            timeout = expires_at - loop.time()
+            if not pending or timeout <= 0:
+                break
+
+            done, _ = await asyncio.wait(pending, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+            for future in done:
+                task = pending.pop(future)
+                try:
+                    fetched = future.result()
+                    data[task.key] = fetched.value
+                    if fetched_at is not None:
+                        fetched_at[task.key] = fetched.fetched_at
+                except Exception as e:
+                    logger.error(f"Error fetching {task.key}: {e}")
+                    missing[task.key] = f"failed: {e}"
+
+        for future, task in pending.items():
+            future.cancel()
+            logger.warning(f"Fetching {task.key} did not finish within {deadline:.1f}s")
+            missing[task.key] = f"not retrieved within {deadline:.1f}s"
+        for task in remaining:
+            missing[task.key] = f"waiting on unavailable data: {', '.join(task.depends_on)}"
+
+        if missing:
+            data["missing_data"] = missing
+
+        if used or prefetched:
+            self.prefetch_stats.record(used=used)
+            wasted = self.discard(prefetched)
+            stats = self.prefetch_stats.snapshot()
+            logger.info(f"Speculative prefetch: {used} used, {wasted} wasted "
+                        f"(session: {stats['hit_rate']:.0%} used, {stats['wasted_bytes']} bytes wasted)")
+        return missing
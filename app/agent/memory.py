@@ -0,0 +1,146 @@
+import datetime
+import re
+import threading
+from typing import List
+
+from app.config import MEMORY_TOKEN_BUDGET, MEMORY_SUMMARY_SHARE, MEMORY_REPLY_CHARS
+from app.models.canvas_data import Conversation
+from app.services.projection import estimate_tokens
+
+# Folded turns kept in the rolling summary; older ones are forgotten
+MAX_SUMMARY_TURNS = 20
+
+
+def compact_reply(text: str, limit: int = MEMORY_REPLY_CHARS) -> str:
+    """
+    Reduce a markdown answer to its plain content for later context: no
+    headings, emphasis, bullets or emojis, one line, cut at a sentence end
+    """
+    text = re.sub(r"^\s*#{1,6}\s.*$", "", text, flags=re.MULTILINE)
+    text = re.sub(r"\*\*|__|`", "", text)
+    text = re.sub(r"^\s*(?:[•*\-]|\d+\.)\s+", "", text, flags=re.MULTILINE)
+    text = re.sub(r"[\U0001F000-\U0001FAFF☀-➿️]", "", text)
+    text = re.sub(r"\s*\n\s*", "; ", text.strip())
+    text = re.sub(r"\s{2,}", " ", text)
+    if len(text) <= limit:
+        return text
+    clipped = text[:limit]
+    sentence_end = max(clipped.rfind(". "), clipped.rfind("; "))
+    if sentence_end > limit // 2:
+        clipped = clipped[:sentence_end + 1]
+    return clipped.rstrip() + " ..."
+
+
+# Openers that carry no content worth summarizing
+GREETING = re.compile(r"^(hi|hello|hey|great|sure|of course|good question|thanks)\b", re.IGNORECASE)
+
+
+def _key_sentence(text: str, limit: int = 160) -> str:
+    """First sentence of a reply that says something (not a greeting or a fragment)"""
+    sentences = [s.strip() for s in re.split(r"(?<=[.!?;])\s+", text) if s.strip()]
+    sentence = next((s for s in sentences if len(s.split()) >= 4 and not GREETING.match(s)),
+                    sentences[0] if sentences else "")
+    sentence = sentence.rstrip(";")
+    return sentence if len(sentence) <= limit else sentence[:limit].rsplit(" ", 1)[0] + "..."
+
+
+class ConversationMemory:
+    """
+    Token-capped conversation memory for the response prompt
+
+    Exchanges are stored compactly (markdown stripped, long answers cut) and
+    the most recent ones are kept verbatim while they fit the recent share of
+    the token budget. Older exchanges are folded into a rolling extractive
+    summary, which is cached and only rebuilt when the history changes.
+    """
+
+    def __init__(self, max_tokens: int = MEMORY_TOKEN_BUDGET, summary_share: float = MEMORY_SUMMARY_SHARE):
+        self.max_tokens = max_tokens
+        self.summary_tokens = int(max_tokens * summary_share)
+        self.recent_tokens = max_tokens - self.summary_tokens
+        self._recent: List[Conversation] = []
+        self._folded: List[str] = []
+        self._version = 0
+        self._summary_version = -1
+        self._summary = ""
+        # Bytes held by the exchanges and folded lines, kept up to date as they change
+        self._size = 0
+        self._lock = threading.Lock()
+
+    def add(self, user_query: str, bot_response: str):
+        """Record an exchange, folding the oldest recent ones into the summary when over budget"""
+        exchange = Conversation(
+            user=user_query.strip(),
+            assistant=compact_reply(bot_response),
+            timestamp=datetime.datetime.now().isoformat()
+        )
+        with self._lock:
+            self._recent.append(exchange)
+            while len(self._recent) > 1 and self._recent_size() > self.recent_tokens:
+                oldest = self._recent.pop(0)
+                self._folded.append(f"Asked \"{oldest.user}\"; answered: {_key_sentence(oldest.assistant)}")
+            del self._folded[:-MAX_SUMMARY_TURNS]
+            self._size = (sum(len(exchange.user) + len(exchange.assistant) + len(exchange.timestamp)
+                              for exchange in self._recent)
+                          + sum(len(line) for line in self._folded))
+            self._version += 1
+
+    def clear(self):
+        with self._lock:
+            self._recent.clear()
+            self._folded.clear()
+            self._size = 0
+            self._version += 1
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._recent) + len(self._folded)
+
+    def size_bytes(self) -> int:
+        """Approximate memory held by the stored exchanges"""
+        with self._lock:
+            return self._size + len(self._summary)
+
+    @property
+    def summary(self) -> str:
+        """Rolling summary of the folded turns, rebuilt only when the history has changed"""
+        with self._lock:
+            if self._summary_version != self._version:
+                self._summary = self._build_summary()
+                self._summary_version = self._version
+            return self._summary
+
+    def recent_queries(self, limit: int = 3) -> List[str]:
+        with self._lock:
+            return [exchange.user for exchange in self._recent[-limit:]]
+
+    def context(self, query: str) -> str:
+        """Conversation context for the response prompt, within the token budget"""
+        summary = self.summary
+        with self._lock:
+            recent = list(self._recent)
+
+        context = "Previous conversation:\n"
+        if summary:
+            context += f"Summary of earlier turns: {summary}\n"
+        for exchange in recent:
+            context += f"User: {exchange.user}\n"
+            context += f"Assistant: {exchange.assistant}\n"
+        context += f"\nCurrent query: {query}\n"
+        return context
+
+    def _recent_size(self) -> int:
+        return sum(estimate_tokens(exchange.user) + estimate_tokens(exchange.assistant) + 4
+                   for exchange in self._recent)
+
+    def _build_summary(self) -> str:
+        # Newest folded turns are kept when the summary is over its share
+        lines: List[str] = []
+        used = 0
+        for line in reversed(self._folded):
+            cost = estimate_tokens(line) + 1
+            if used + cost > self.summary_tokens:
+                break
+            lines.append(line)
+            used += cost
+        return " | ".join(reversed(lines))
@@ -0,0 +1,160 @@
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from typing import Callable, Dict, Iterator, List, Optional
+
+from app.logger import logger
+from app.agent.canvasai import CanvasAI
+from app.config import AGENT_POOL_MAX_SESSIONS, AGENT_POOL_IDLE_TIMEOUT, AGENT_POOL_MAX_BYTES
+
+
+@dataclass
+class _PooledAgent:
+    agent: CanvasAI
+    last_used: float = field(default_factory=time.monotonic)
+    # footprint() of the agent when it was last used
+    size: int = 0
+
+
+class AgentPool:
+    """
+    Bounded pool of per-session agents
+
+    Each browser session gets its own CanvasAI, so conversations and Canvas
+    credentials are never shared between users. Agents idle for longer than
+    idle_timeout are dropped, and the least recently used ones are evicted
+    when the pool holds more than max_sessions agents or their conversations
+    and course lists take more than max_bytes. Each agent's size is measured
+    when it is used and the total is kept up to date, so the caps cost
+    nothing per idle agent. HTTP pools and caches live outside the agents
+    and are shared by all of them.
+    """
+
+    def __init__(self, max_sessions: int = AGENT_POOL_MAX_SESSIONS, idle_timeout: float = AGENT_POOL_IDLE_TIMEOUT,
+                 max_bytes: int = AGENT_POOL_MAX_BYTES, factory: Callable[[Optional[str]], CanvasAI] = CanvasAI):
+        self.max_sessions = max_sessions
+        self.idle_timeout = idle_timeout
+        self.max_bytes = max_bytes
+        self.factory = factory
+        self._agents: "OrderedDict[str, _PooledAgent]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._bytes = 0
+        # Per-session locks so concurrent get_or_create calls authenticate one agent
+        self._creating: Dict[str, List] = {}
+        self._evictions = {"idle": 0, "lru": 0, "memory": 0}
+
+    def get(self, session_id: str) -> Optional[CanvasAI]:
+        """The agent of a session, marked as recently used, or None"""
+        with self._lock:
+            pooled = self._agents.get(session_id)
+            if pooled is None:
+                self._evict_idle()
+                return None
+            pooled.last_used = time.monotonic()
+            self._agents.move_to_end(session_id)
+            # Conversations grow between calls, so the size is updated and the caps checked on every use
+            self._measure(pooled)
+            self._evict(keep=session_id)
+            return pooled.agent
+
+    def create(self, session_id: str, api_key: Optional[str] = None) -> Optional[CanvasAI]:
+        """
+        Create and authenticate an agent for a session, replacing any earlier one
+
+        Returns None when Canvas rejects the credentials.
+        """
+        agent = self.factory(api_key)
+        if not agent.authenticate_user():
+            return None
+        with self._lock:
+            self._discard(session_id)
+            pooled = _PooledAgent(agent)
+            self._agents[session_id] = pooled
+            self._measure(pooled)
+            self._evict(keep=session_id)
+        return agent
+
+    def get_or_create(self, session_id: str, api_key: Optional[str] = None) -> Optional[CanvasAI]:
+        """The agent of a session, creating one if it has none; concurrent calls create a single agent"""
+        agent = self.get(session_id)
+        if agent is not None:
+            return agent
+        with self._creation_lock(session_id):
+            return self.get(session_id) or self.create(session_id, api_key)
+
+    @contextmanager
+    def _creation_lock(self, session_id: str) -> Iterator[None]:
+        with self._lock:
+            entry = self._creating.setdefault(session_id, [threading.Lock(), 0])
+            entry[1] += 1
+        try:
+            with entry[0]:
+                yield
+        finally:
+            with self._lock:
+                entry[1] -= 1
+                if not entry[1]:
+                    del self._creating[session_id]
+
+    def active(self, within: float) -> Dict[str, CanvasAI]:
+        """Agents of the sessions used in the last `within` seconds, least recently used first"""
+        used_after = time.monotonic() - within
+        with self._lock:
+            return {session_id: pooled.agent for session_id, pooled in self._agents.items()
+                    if pooled.last_used > used_after}
+
+    def remove(self, session_id: str) -> bool:
+        with self._lock:
+            return self._discard(session_id) is not None
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._agents)
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {
+                "sessions": len(self._agents),
+                "bytes": self._bytes,
+                "evictions": dict(self._evictions),
+            }
+
+    def _evict_idle(self):
+        expired_before = time.monotonic() - self.idle_timeout
+        # Entries are in least recently used order, so idle ones are at the front
+        while self._agents:
+            session_id, pooled = next(iter(self._agents.items()))
+            if pooled.last_used > expired_before:
+                break
+            self._discard(session_id)
+            self._evictions["idle"] += 1
+            logger.info(f"Dropped agent of idle session {session_id[:8]}")
+
+    def _evict(self, keep: str):
+        self._evict_idle()
+        while len(self._agents) > self.max_sessions and self._evict_oldest(keep, "lru"):
+            pass
+        while self.max_bytes and self._bytes > self.max_bytes and self._evict_oldest(keep, "memory"):
+            pass
+
+    def _measure(self, pooled: _PooledAgent):
+        size = pooled.agent.footprint()
+        self._bytes += size - pooled.size
+        pooled.size = size
+
+    def _discard(self, session_id: str) -> Optional[_PooledAgent]:
+        pooled = self._agents.pop(session_id, None)
+        if pooled is not None:
+            self._bytes -= pooled.size
+        return pooled
+
+    def _evict_oldest(self, keep: str, reason: str) -> Optional[_PooledAgent]:
+        for session_id in self._agents:
+            if session_id != keep:
+                pooled = self._discard(session_id)
+                self._evictions[reason] += 1
+                logger.info(f"Evicted agent of session {session_id[:8]} ({reason})")
+                return pooled
+        return None
@@ -0,0 +1,270 @@
+import asyncio
+import datetime
+import heapq
+import itertools
+import time
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+from app.logger import logger
+from app.agent.canvasai import CanvasAI
+from app.agent.fetch_planner import COURSES_TASK, DEADLINES_TASK, FetchTask
+from app.config import SYNC_DUE_SOON_HOURS, SYNC_IDLE_AFTER, SYNC_INTERVAL, SYNC_REQUEST_BUDGET
+from app.utils import metrics
+from app.utils.async_utils import get_background_loop
+from app.utils.date_utils import parse_canvas_date
+from app.utils.tracing import start_trace
+
+# Job priorities, most urgent first
+PRIORITY_USER = 0
+PRIORITY_DUE_SOON = 1
+PRIORITY_COURSE = 2
+
+# Courses with nothing due soon are refreshed this many times less often
+QUIET_COURSE_INTERVAL_FACTOR = 4
+
+# Per-course data kept in sync, under the same keys as the query plans
+COURSE_SYNC_FETCHES = (
+    ("course_details", "get_course_details"),
+    ("assignments", "get_course_assignments"),
+    ("grades", "get_course_grades"),
+    ("announcements", "get_course_announcements"),
+)
+
+
+@dataclass(order=True)
+class SyncJob:
+    run_at: float
+    priority: int
+    seq: int
+    owner: str = field(compare=False)
+    task: FetchTask = field(compare=False)
+
+
+@dataclass
+class _SyncedUser:
+    # The most recently used agent of the user, whose credentials the jobs run with
+    agent: CanvasAI
+    courses: List[Dict] = field(default_factory=list)
+    due_soon: Set[int] = field(default_factory=set)
+    queued: Set[Tuple] = field(default_factory=set)
+
+
+class SyncScheduler:
+    """
+    Keeps the Canvas data of active users fresh in the Canvas store
+
+    Every Canvas user with a session used within idle_after gets a job per
+    fetch: their courses and upcoming deadlines, then the details,
+    assignments, grades and announcements of each active course. Jobs wait
+    in a queue until they are due and then run one at a time on the
+    background event loop, most urgent first: user-wide data, then courses
+    with an assignment due within due_soon_hours, then the other courses,
+    which are also refreshed less often. The Canvas requests each job makes
+    are charged against request_budget per minute; once it is spent, due
+    jobs wait and the lag grows. Users who go idle are dropped.
+    """
+
+    def __init__(self, pool, interval: float = SYNC_INTERVAL, request_budget: int = SYNC_REQUEST_BUDGET,
+                 idle_after: float = SYNC_IDLE_AFTER, due_soon_hours: float = SYNC_DUE_SOON_HOURS,
+                 tick: float = 1.0):
+        self.pool = pool
+        self.interval = interval
+        self.request_budget = request_budget
+        self.idle_after = idle_after
+        self.due_soon = datetime.timedelta(hours=due_soon_hours)
+        self.tick = tick
+        self._users: Dict[str, _SyncedUser] = {}
+        # Jobs by when they are due, and due jobs by priority
+        self._scheduled: List[SyncJob] = []
+        self._ready: List[Tuple[int, float, int, SyncJob]] = []
+        self._seq = itertools.count()
+        self._tokens = float(request_budget)
+        self._refilled = time.monotonic()
+        self._stopping = False
+        self._future = None
+        self.jobs_run = 0
+        self.requests = 0
+
+    def start(self):
+        """Run the scheduler on the background event loop"""
+        self._stopping = False
+        self._future = asyncio.run_coroutine_threadsafe(self.run(), get_background_loop())
+        self._future.add_done_callback(self._ended)
+        logger.info(f"Background sync started: every {self.interval:.0f}s, "
+                    f"{self.request_budget} Canvas requests per minute")
+
+    def stop(self, timeout: float = 5.0):
+        """Stop after the job in progress"""
+        self._stopping = True
+        if self._future is not None:
+            try:
+                self._future.result(timeout)
+            except Exception as e:
+                logger.warning(f"Background sync did not stop cleanly: {e}")
+            self._future = None
+
+    def _ended(self, future):
+        if self._stopping:
+            return
+        if future.cancelled():
+            logger.error("Background sync was cancelled; stored data is no longer refreshed")
+        elif future.exception() is not None:
+            logger.error(f"Background sync stopped unexpectedly: {future.exception()}")
+        else:
+            logger.error("Background sync stopped unexpectedly")
+
+    async def run(self):
+        while not self._stopping:
+            try:
+                now = time.monotonic()
+                self._track_active_users()
+                self._promote(now)
+                self._report(now)
+                job = self._next_job(now)
+                if job is None:
+                    await asyncio.sleep(self.tick)
+                    continue
+                await self._run_job(job)
+            except Exception as e:
+                # One bad user or job must not end the sync for the rest of the process
+                logger.exception(f"Error in background sync: {e}")
+                await asyncio.sleep(self.tick)
+
+    def _track_active_users(self):
+        """Start syncing users with recently used sessions and drop those gone idle"""
+        agents: Dict[str, CanvasAI] = {}
+        # Least recently used first, so each user ends up with their latest session's agent
+        for agent in self.pool.active(self.idle_after).values():
+            owner = agent.fetch_planner.owner()
+            if owner is not None:
+                agents[owner] = agent
+
+        idle = [owner for owner in self._users if owner not in agents]
+        for owner in idle:
+            del self._users[owner]
+            logger.info(f"Stopped syncing idle user {owner}")
+        if idle:
+            self._scheduled = [job for job in self._scheduled if job.owner in self._users]
+            self._ready = [entry for entry in self._ready if entry[3].owner in self._users]
+            heapq.heapify(self._scheduled)
+            heapq.heapify(self._ready)
+
+        for owner, agent in agents.items():
+            user = self._users.get(owner)
+            if user is None:
+                self._users[owner] = _SyncedUser(agent)
+                self._schedule(owner, COURSES_TASK, time.monotonic())
+                logger.info(f"Syncing user {owner}")
+            else:
+                user.agent = agent
+        metrics.SYNC_USERS.set(len(self._users))
+
+    def _priority(self, user: _SyncedUser, task: FetchTask) -> int:
+        if not task.args:
+            return PRIORITY_USER
+        return PRIORITY_DUE_SOON if task.args[0] in user.due_soon else PRIORITY_COURSE
+
+    def _schedule(self, owner: str, task: FetchTask, run_at: float):
+        user = self._users[owner]
+        if task.identity in user.queued:
+            return
+        user.queued.add(task.identity)
+        heapq.heappush(self._scheduled, SyncJob(run_at, self._priority(user, task), next(self._seq), owner, task))
+
+    def _promote(self, now: float):
+        while self._scheduled and self._scheduled[0].run_at <= now:
+            job = heapq.heappop(self._scheduled)
+            heapq.heappush(self._ready, (job.priority, job.run_at, job.seq, job))
+
+    def _report(self, now: float):
+        metrics.SYNC_QUEUE_DEPTH.set(len(self._ready))
+        metrics.SYNC_LAG_SECONDS.set(max((now - entry[1] for entry in self._ready), default=0.0))
+
+    def _next_job(self, now: float) -> Optional[SyncJob]:
+        """The most urgent due job, if the request budget has room for it"""
+        self._tokens = min(float(self.request_budget),
+                           self._tokens + (now - self._refilled) * self.request_budget / 60)
+        self._refilled = now
+        if not self._ready or self._tokens < 1:
+            return None
+        return heapq.heappop(self._ready)[3]
+
+    async def _run_job(self, job: SyncJob):
+        user = self._users[job.owner]
+        user.queued.discard(job.task.identity)
+        if job.task.args and not any(course["id"] == job.task.args[0] for course in user.courses):
+            # The course is no longer active
+            return
+
+        kwargs = {arg: user.courses for arg, data_key in job.task.inputs if data_key == "courses"}
+        value, result = None, "ok"
+        # Trace the job to count the Canvas requests it makes
+        with start_trace("sync", log=False) as trace:
+            try:
+                value = await user.agent.fetch_planner.refresh(job.task, kwargs)
+            except Exception as e:
+                logger.error(f"Error syncing {job.task.key} ({job.task.method}{job.task.args}): {e}")
+                result = "error"
+        requests = trace.totals().get("canvas", {}).get("count", 0)
+        self._tokens -= requests
+        self.jobs_run += 1
+        self.requests += requests
+        metrics.SYNC_JOBS.labels(job.task.key, result).inc()
+        metrics.SYNC_CANVAS_REQUESTS.inc(requests)
+
+        # The user may have gone idle while the job ran
+        if job.owner not in self._users:
+            return
+        now = time.monotonic()
+        if result == "ok":
+            self._schedule_followups(job.owner, job.task, value, now)
+        interval = self.interval
+        if self._priority(user, job.task) == PRIORITY_COURSE:
+            interval *= QUIET_COURSE_INTERVAL_FACTOR
+        self._schedule(job.owner, job.task, now + interval)
+
+    def _schedule_followups(self, owner: str, task: FetchTask, value: Any, now: float):
+        """Queue the jobs that depend on fresh courses or deadlines"""
+        user = self._users[owner]
+        if task.identity == COURSES_TASK.identity:
+            user.courses = value
+            self._schedule(owner, DEADLINES_TASK, now)
+            for course in value:
+                for key, method in COURSE_SYNC_FETCHES:
+                    self._schedule(owner, FetchTask(key, method, (course["id"],)), now)
+        elif task.identity == DEADLINES_TASK.identity:
+            cutoff = datetime.datetime.now(datetime.timezone.utc) + self.due_soon
+            due_soon = {deadline["course_id"] for deadline in value
+                        if (due := parse_canvas_date(deadline.get("due_date"))) is not None and due <= cutoff}
+            if due_soon != user.due_soon:
+                user.due_soon = due_soon
+                self._reprioritize(owner, now)
+
+    def _reprioritize(self, owner: str, now: float):
+        """Re-rank the queued jobs of a user whose courses with deadlines due soon changed"""
+        user = self._users[owner]
+        for job in self._scheduled:
+            if job.owner == owner:
+                job.priority = self._priority(user, job.task)
+                if job.priority == PRIORITY_DUE_SOON:
+                    # Don't leave it waiting for the longer interval of a quiet course
+                    job.run_at = min(job.run_at, now + self.interval)
+        ready = [entry[3] for entry in self._ready]
+        for job in ready:
+            if job.owner == owner:
+                job.priority = self._priority(user, job.task)
+        self._ready = [(job.priority, job.run_at, job.seq, job) for job in ready]
+        heapq.heapify(self._scheduled)
+        heapq.heapify(self._ready)
+
+    def stats(self) -> Dict[str, Any]:
+        now = time.monotonic()
+        return {
+            "users": len(self._users),
+            "scheduled": len(self._scheduled),
+            "due": len(self._ready),
+            "lag": max((now - entry[1] for entry in self._ready), default=0.0),
+            "jobs_run": self.jobs_run,
+            "canvas_requests": self.requests,
+        }
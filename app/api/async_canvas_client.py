@@ -0,0 +1,466 @@
+import asyncio
+import datetime
+from typing import AsyncIterator, Dict, Iterable, List, Optional, Tuple
+
+from app.logger import logger
+from app.config import (
+    CANVAS_API_KEY,
+    CANVAS_API_URL,
+    CANVAS_MAX_CONCURRENCY,
+    CANVAS_DEADLINE_SOURCE,
+    CANVAS_DEADLINE_WINDOW_DAYS,
+)
+from app.utils.date_utils import parse_canvas_date
+from app.utils.metrics import MODULE_ITEMS
+from app.api.transport import CanvasAPIError
+from app.api.async_transport import AsyncCanvasTransport, get_default_async_transport
+from app.api.pagination import aiter_records
+
+
+class AsyncCanvasClient:
+    """
+    asyncio-native client for the Canvas LMS API
+
+    Every call is a coroutine so concurrent queries share one event loop
+    instead of one thread each. The get_* methods log Canvas errors and
+    return an empty result, or re-raise them with raise_errors so callers
+    that keep results can tell a failure from real empty data; the iter_*
+    listings are lazy and always raise them. CanvasClient wraps this client
+    for synchronous callers.
+    """
+
+    def __init__(self, api_key: Optional[str] = None, api_url: Optional[str] = None,
+                 transport: Optional[AsyncCanvasTransport] = None, raise_errors: bool = False):
+        self.api_key = api_key or CANVAS_API_KEY
+        self.api_url = api_url or CANVAS_API_URL
+        self.user_info = None
+        # Pooled keep-alive transport, shared across clients unless one is given
+        self.transport = transport or get_default_async_transport()
+        self.headers = {"Authorization": f"Bearer {self.api_key}"}
+        self.raise_errors = raise_errors
+
+    async def _get(self, path: str, params: Optional[Dict] = None, headers: Optional[Dict] = None):
+        """Send a GET request for a Canvas API path through the shared transport"""
+        return await self.transport.get(f"{self.api_url}{path}", headers=headers or self.headers, params=params)
+
+    def _paginate(self, path: str, params: Optional[Dict] = None, per_page: Optional[int] = None,
+                  prefetch: bool = False) -> AsyncIterator[Dict]:
+        """Lazily yield every record of a paginated Canvas listing"""
+        return aiter_records(
+            self.transport,
+            f"{self.api_url}{path}",
+            headers=self.headers,
+            params=params,
+            per_page=per_page,
+            prefetch=prefetch
+        )
+
+    async def _collect(self, path: str, params: Optional[Dict] = None, per_page: Optional[int] = None) -> List[Dict]:
+        return [record async for record in self._paginate(path, params=params, per_page=per_page)]
+
+    def _failed(self, message: str, error: Exception, empty):
+        """Log a failed get_* call, then re-raise the error with raise_errors or return the empty result"""
+        logger.error(f"{message}: {error}")
+        if self.raise_errors:
+            raise error
+        return empty
+
+    def cache_stats(self) -> Dict:
+        """Hit/miss counters of the shared response cache, if one is attached"""
+        return self.transport.cache.stats() if self.transport.cache else {}
+
+    async def authenticate_user(self, user_token: Optional[str] = None) -> bool:
+        """
+        Authenticate user with Canvas API
+        Returns True if authentication is successful, False otherwise
+        """
+        token = user_token if user_token else self.api_key
+        if not token:
+            return False
+
+        headers = {"Authorization": f"Bearer {token}"}
+        try:
+            response = await self._get("/users/self", headers=headers)
+            if response.status_code == 200:
+                self.user_info = response.json()
+                return True
+            return False
+        except Exception as e:
+            logger.error(f"Authentication error: {e}")
+            return False
+
+    async def iter_active_courses(self, per_page: Optional[int] = None,
+                                  prefetch: bool = False) -> AsyncIterator[Dict]:
+        """
+        Lazily yield active courses for the authenticated user, page by page
+        Raises CanvasAPIError if Canvas rejects a page
+        """
+        courses = self._paginate(
+            "/courses",
+            params={"enrollment_state": "active", "include": ["term"]},
+            per_page=per_page,
+            prefetch=prefetch
+        )
+        async for course in courses:
+            if not course.get("access_restricted_by_date"):
+                yield course
+
+    async def load_active_courses(self) -> List[Dict]:
+        """Fetch active courses for the authenticated user"""
+        try:
+            return [course async for course in self.iter_active_courses()]
+        except CanvasAPIError as e:
+            return self._failed("Error fetching courses", e, [])
+        except Exception as e:
+            return self._failed("Error loading courses", e, [])
+
+    async def get_course_details(self, course_id: int) -> Dict:
+        """Get detailed information about a specific course"""
+        try:
+            response = await self._get(
+                f"/courses/{course_id}",
+                params={"include": ["syllabus_body", "term", "teachers"]}
+            )
+            if response.status_code == 200:
+                return response.json()
+            raise CanvasAPIError(response.status_code, str(response.url), response.text)
+        except CanvasAPIError as e:
+            return self._failed("Error fetching course details", e, {})
+        except Exception as e:
+            return self._failed("Error getting course details", e, {})
+
+    def iter_course_assignments(self, course_id: int, per_page: Optional[int] = None,
+                                prefetch: bool = False) -> AsyncIterator[Dict]:
+        """
+        Lazily yield assignment groups (with nested assignments) for a course
+        Raises CanvasAPIError if Canvas rejects a page
+        """
+        return self._paginate(
+            f"/courses/{course_id}/assignment_groups",
+            params={
+                "exclude_assignment_submission_types[]": "wiki_page",
+                "exclude_response_fields[]": ["description", "rubric"],
+                "include[]": ["assignments", "discussion_topic", "assessment_requests"]},
+            per_page=per_page,
+            prefetch=prefetch
+        )
+
+    async def _assignment_groups(self, course_id: int) -> List[Dict]:
+        return [group async for group in self.iter_course_assignments(course_id)]
+
+    async def get_course_assignments(self, course_id: int) -> List[Dict]:
+        """Get assignments for a specific course"""
+        try:
+            return await self._assignment_groups(course_id)
+        except CanvasAPIError as e:
+            return self._failed("Error fetching assignments", e, [])
+        except Exception as e:
+            return self._failed("Error getting assignments", e, [])
+
+    def iter_upcoming_assignments(self, course_id: int, per_page: Optional[int] = None,
+                                  prefetch: bool = False) -> AsyncIterator[Dict]:
+        """
+        Lazily yield a course's upcoming assignments, nearest due date first
+
+        Canvas sorts the listing server-side, so the first N upcoming items can be
+        taken without downloading the rest.
+        """
+        return self._paginate(
+            f"/courses/{course_id}/assignments",
+            params={"bucket": "upcoming", "order_by": "due_at"},
+            per_page=per_page,
+            prefetch=prefetch
+        )
+
+    async def get_course_grades(self, course_id: int) -> Dict:
+        """Get grades for a specific course"""
+        try:
+            # The assignment listing and the course total are independent
+            assignments, course_response = await asyncio.gather(
+                self._collect(f"/courses/{course_id}/assignments", params={"include": ["submission"]}),
+                self._get(f"/courses/{course_id}", params={"include": ["total_scores"]})
+            )
+            course_info = course_response.json() if course_response.status_code == 200 else {}
+            return summarize_grades(assignments, course_info)
+        except CanvasAPIError as e:
+            return self._failed("Error fetching grades", e, {})
+        except Exception as e:
+            return self._failed("Error getting grades", e, {})
+
+    async def _fetch_module_items(self, course_id: int, module: Dict, limiter: asyncio.Semaphore):
+        async with limiter:
+            try:
+                module["items"] = await self._collect(f"/courses/{course_id}/modules/{module['id']}/items")
+            except Exception as e:
+                if self.raise_errors:
+                    raise
+                # Keep whatever Canvas inlined rather than dropping the module
+                logger.warning(f"Error fetching items for module {module['id']}: {e}")
+                module.setdefault("items", [])
+
+    def iter_course_modules(self, course_id: int, per_page: Optional[int] = None,
+                            prefetch: bool = False) -> AsyncIterator[Dict]:
+        """
+        Lazily yield the modules of a course
+        Raises CanvasAPIError if Canvas rejects a page
+        """
+        return self._paginate(
+            f"/courses/{course_id}/modules",
+            params={"include": ["items"]},
+            per_page=per_page,
+            prefetch=prefetch
+        )
+
+    async def get_course_modules(self, course_id: int, max_workers: int = CANVAS_MAX_CONCURRENCY) -> List[Dict]:
+        """
+        Get modules and items for a specific course
+
+        Items Canvas inlines with include=items are used as-is; only modules whose
+        items were left out or truncated are fetched, concurrently.
+        """
+        try:
+            modules = [module async for module in self.iter_course_modules(course_id)]
+            truncated = [module for module in modules if module_items_truncated(module)]
+
+            MODULE_ITEMS.labels("inlined").inc(len(modules) - len(truncated))
+            MODULE_ITEMS.labels("fetched").inc(len(truncated))
+
+            if truncated:
+                limiter = asyncio.Semaphore(max(1, max_workers))
+                await asyncio.gather(*(self._fetch_module_items(course_id, module, limiter) for module in truncated))
+            return modules
+        except CanvasAPIError as e:
+            return self._failed("Error fetching modules", e, [])
+        except Exception as e:
+            return self._failed("Error getting modules", e, [])
+
+    def iter_course_files(self, course_id: int, per_page: Optional[int] = None,
+                          prefetch: bool = False) -> AsyncIterator[Dict]:
+        """
+        Lazily yield the files of a course
+        Raises CanvasAPIError if Canvas rejects a page
+        """
+        return self._paginate(f"/courses/{course_id}/files", per_page=per_page, prefetch=prefetch)
+
+    async def get_course_files(self, course_id: int) -> List[Dict]:
+        """Get files for a specific course"""
+        try:
+            return [file async for file in self.iter_course_files(course_id)]
+        except CanvasAPIError as e:
+            return self._failed("Error fetching files", e, [])
+        except Exception as e:
+            return self._failed("Error getting files", e, [])
+
+    def iter_course_announcements(self, course_id: int, per_page: Optional[int] = None,
+                                  prefetch: bool = False) -> AsyncIterator[Dict]:
+        """
+        Lazily yield the announcements of a course
+        Raises CanvasAPIError if Canvas rejects a page
+        """
+        return self._paginate(
+            f"/courses/{course_id}/discussion_topics",
+            params={"only_announcements": True},
+            per_page=per_page,
+            prefetch=prefetch
+        )
+
+    async def get_course_announcements(self, course_id: int) -> List[Dict]:
+        """Get announcements for a specific course"""
+        try:
+            return [announcement async for announcement in self.iter_course_announcements(course_id)]
+        except CanvasAPIError as e:
+            return self._failed("Error fetching announcements", e, [])
+        except Exception as e:
+            return self._failed("Error getting announcements", e, [])
+
+    def iter_planner_items(self, start_date: str, end_date: str, per_page: Optional[int] = None,
+                           prefetch: bool = False) -> AsyncIterator[Dict]:
+        """
+        Lazily yield the user's planner items between two ISO 8601 dates
+        Raises CanvasAPIError if Canvas rejects a page
+        """
+        return self._paginate(
+            "/planner/items",
+            params={"start_date": start_date, "end_date": end_date},
+            per_page=per_page,
+            prefetch=prefetch
+        )
+
+    async def get_planner_deadlines(self, courses: Optional[List[Dict]] = None,
+                                    window_days: int = CANVAS_DEADLINE_WINDOW_DAYS) -> List[Dict]:
+        """
+        Get upcoming deadlines from the user-scoped planner in one paginated listing
+
+        Raises on Canvas errors so that callers can fall back to scanning courses.
+        """
+        if courses is None:
+            courses = await self.load_active_courses()
+        courses_by_id = {course["id"]: course for course in courses}
+
+        now = datetime.datetime.now(datetime.timezone.utc)
+        start_date, end_date = planner_window(now, window_days)
+        # One listing replaces N course scans, so ask for Canvas' largest page size
+        items = [item async for item in self.iter_planner_items(start_date, end_date, per_page=100)]
+        upcoming_deadlines = extract_planner_deadlines(items, courses_by_id, now)
+
+        upcoming_deadlines.sort(key=lambda x: x["due_date"])
+        return upcoming_deadlines
+
+    async def get_upcoming_deadlines(self, courses: Optional[List[Dict]] = None,
+                                     max_workers: int = CANVAS_MAX_CONCURRENCY,
+                                     source: str = CANVAS_DEADLINE_SOURCE) -> List[Dict]:
+        """
+        Get upcoming assignment deadlines across all active courses
+
+        With the planner source a single user-scoped listing is used; if Canvas
+        rejects it the per-course scan is used instead.
+        """
+        if courses is None:
+            courses = await self.load_active_courses()
+
+        if source == "planner":
+            try:
+                return await self.get_planner_deadlines(courses)
+            except Exception as e:
+                logger.warning(f"Planner deadlines unavailable, scanning courses instead: {e}")
+
+        return await self.scan_course_deadlines(courses, max_workers=max_workers)
+
+    async def _course_deadlines(self, course: Dict, now: datetime.datetime, limiter: asyncio.Semaphore) -> List[Dict]:
+        async with limiter:
+            try:
+                assignment_groups = await self._assignment_groups(course["id"])
+            except Exception as e:
+                if self.raise_errors:
+                    raise
+                logger.warning(f"Skipping deadlines for course {course.get('id')}: {e}")
+                return []
+        return extract_upcoming_deadlines(course, assignment_groups, now)
+
+    async def scan_course_deadlines(self, courses: List[Dict],
+                                    max_workers: int = CANVAS_MAX_CONCURRENCY) -> List[Dict]:
+        """
+        Get upcoming deadlines by scanning every course's assignment groups
+
+        At most max_workers courses are fetched at once. A course that fails is
+        logged and skipped rather than failing the whole call, unless raise_errors is set.
+        """
+        try:
+            if not courses:
+                return []
+
+            now = datetime.datetime.now(datetime.timezone.utc)
+            limiter = asyncio.Semaphore(max(1, max_workers))
+            per_course = await asyncio.gather(*(self._course_deadlines(course, now, limiter) for course in courses))
+            upcoming_deadlines = [deadline for deadlines in per_course for deadline in deadlines]
+
+            upcoming_deadlines.sort(key=lambda x: x["due_date"])
+            return upcoming_deadlines
+        except Exception as e:
+            return self._failed("Error getting upcoming deadlines", e, [])
+
+
+def summarize_grades(assignments: Iterable[Dict], course_info: Dict) -> Dict:
+    """Combine assignments (with the user's submission) and the course total into a grade summary"""
+    grades_info = {
+        "overall": course_info.get("enrollments", [{}])[0].get("computed_current_score", None),
+        "assignments": []
+    }
+
+    for assignment in assignments:
+        submission = assignment.get("submission") or {}
+        grades_info["assignments"].append({
+            "assignment_name": assignment["name"],
+            "assignment_id": assignment["id"],
+            "points_possible": assignment["points_possible"],
+            "score": submission.get("score"),
+            "submitted": submission.get("submitted_at") is not None,
+            "graded": submission.get("grade") is not None
+        })
+
+    return grades_info
+
+
+def planner_window(now: datetime.datetime, window_days: int) -> Tuple[str, str]:
+    """Planner query window starting now; aligned to the hour so repeated calls hit the response cache"""
+    window_start = now.replace(minute=0, second=0, microsecond=0)
+    window_end = window_start + datetime.timedelta(days=window_days)
+    return window_start.strftime("%Y-%m-%dT%H:%M:%SZ"), window_end.strftime("%Y-%m-%dT%H:%M:%SZ")
+
+
+def module_items_truncated(module: Dict) -> bool:
+    """Check whether Canvas left out some or all of a module's items"""
+    if "items" not in module:
+        return True
+    return module.get("items_count", 0) > len(module["items"])
+
+
+def extract_upcoming_deadlines(course: Dict, assignment_groups: List[Dict], now: datetime.datetime) -> List[Dict]:
+    """Flatten a course's assignment groups into deadline entries due after now"""
+    upcoming_deadlines = []
+
+    for group in assignment_groups:
+        # Extract assignments from each group
+        assignments = group.get("assignments", [])
+
+        for assignment in assignments:
+            # Skip if no due date or if we can't parse it
+            due_date = parse_canvas_date(assignment.get("due_at"))
+            if due_date is None:
+                continue
+
+            # Check if assignment is upcoming (due in the future)
+            if due_date > now:
+                # Get submission status based on the assignment structure
+                submission = assignment.get("has_submitted_submissions", False)
+
+                upcoming_deadlines.append({
+                    "course_name": course["name"],
+                    "course_id": course["id"],
+                    "assignment_name": assignment["name"],
+                    "assignment_id": assignment["id"],
+                    "due_date": assignment["due_at"],
+                    "points_possible": assignment.get("points_possible", 0),
+                    "submitted": submission
+                })
+
+    return upcoming_deadlines
+
+
+# Planner item types that carry an assignment-style deadline
+PLANNER_DEADLINE_TYPES = frozenset({"assignment", "quiz", "discussion_topic"})
+
+
+def extract_planner_deadlines(items: Iterable[Dict], courses_by_id: Dict[int, Dict],
+                              now: datetime.datetime) -> List[Dict]:
+    """Map planner items onto the deadline entries produced by the course scan"""
+    upcoming_deadlines = []
+
+    for item in items:
+        if item.get("plannable_type") not in PLANNER_DEADLINE_TYPES:
+            continue
+        course = courses_by_id.get(item.get("course_id"))
+        if course is None:
+            continue
+
+        plannable = item.get("plannable", {})
+        due_at = plannable.get("due_at") or item.get("plannable_date")
+        due_date = parse_canvas_date(due_at)
+        if due_date is None or due_date <= now:
+            continue
+
+        # The planner reports the user's own submission state
+        submissions = item.get("submissions")
+        submitted = bool(submissions.get("submitted")) if isinstance(submissions, dict) else False
+
+        upcoming_deadlines.append({
+            "course_name": course["name"],
+            "course_id": course["id"],
+            "assignment_name": plannable.get("title") or plannable.get("name", ""),
+            "assignment_id": plannable.get("assignment_id") or item.get("plannable_id"),
+            "due_date": due_at,
+            "points_possible": plannable.get("points_possible", 0),
+            "submitted": submitted
+        })
+
+    return upcoming_deadlines
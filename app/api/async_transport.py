@@ -0,0 +1,168 @@
+import asyncio
+import threading
+import time
+import weakref
+from typing import Dict, Optional, Tuple, Union
+
+import httpx
+
+from app.logger import logger
+from app.api.cache import CachedResponse, ResponseCache, get_default_cache
+from app.api.transport import (
+    backoff_delay,
+    endpoint_name,
+    is_transient,
+    prepare_url,
+    record_response,
+)
+from app.utils.cassette import async_httpx_transport
+from app.utils.metrics import CANVAS_IN_FLIGHT
+from app.utils.tracing import span
+from app.config import (
+    CANVAS_POOL_MAXSIZE,
+    CANVAS_CONNECT_TIMEOUT,
+    CANVAS_READ_TIMEOUT,
+    CANVAS_MAX_RETRIES,
+    CANVAS_BACKOFF_FACTOR,
+    CANVAS_BACKOFF_MAX,
+)
+
+
+class AsyncCanvasTransport:
+    """
+    Pooled, keep-alive HTTP transport shared by Canvas clients, built on httpx.AsyncClient.
+
+    Transient failures (5xx, 429 and Canvas' 403 throttling response) are
+    retried with jittered exponential backoff. When a ResponseCache is
+    attached, cacheable GETs are served from it and revalidated with
+    conditional requests once stale. Waiting on the network never blocks the
+    event loop, so one loop can carry many queries at once. An AsyncClient is
+    bound to the loop it was created on, so one is kept per running loop.
+    """
+
+    def __init__(
+        self,
+        max_connections: int = CANVAS_POOL_MAXSIZE,
+        timeout: Tuple[float, float] = (CANVAS_CONNECT_TIMEOUT, CANVAS_READ_TIMEOUT),
+        max_retries: int = CANVAS_MAX_RETRIES,
+        backoff_factor: float = CANVAS_BACKOFF_FACTOR,
+        backoff_max: float = CANVAS_BACKOFF_MAX,
+        cache: Optional[ResponseCache] = None,
+    ):
+        self.cache = cache
+        self.max_retries = max_retries
+        self.backoff_factor = backoff_factor
+        self.backoff_max = backoff_max
+        self._limits = httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_connections)
+        self._timeout = httpx.Timeout(timeout[1], connect=timeout[0])
+        self._clients: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, httpx.AsyncClient]" = \
+            weakref.WeakKeyDictionary()
+        self._clients_lock = threading.Lock()
+
+    @property
+    def client(self) -> httpx.AsyncClient:
+        """The pooled client for the running event loop"""
+        loop = asyncio.get_running_loop()
+        with self._clients_lock:
+            client = self._clients.get(loop)
+            if client is None or client.is_closed:
+                client = httpx.AsyncClient(limits=self._limits, timeout=self._timeout,
+                                           transport=async_httpx_transport("canvas", limits=self._limits))
+                self._clients[loop] = client
+            return client
+
+    async def get(self, url: str, headers: Optional[Dict] = None,
+                  params: Optional[Dict] = None) -> Union[httpx.Response, CachedResponse]:
+        """Send a GET request through the pooled client, using the cache when possible"""
+        full_url = prepare_url(url, params)
+        if self.cache is None:
+            return await self.request("GET", full_url, headers=headers)
+
+        ttl = self.cache.ttl_for(full_url)
+        if ttl is None:
+            return await self.request("GET", full_url, headers=headers)
+
+        key = self.cache.make_key(full_url, headers)
+        entry = self.cache.get(key)
+        if entry is not None and self.cache.is_fresh(entry):
+            self.cache.record_hit()
+            return entry.response
+
+        request_headers = dict(headers or {})
+        if entry is not None:
+            # Stale: ask Canvas whether our copy is still current
+            if entry.etag:
+                request_headers["If-None-Match"] = entry.etag
+            if entry.last_modified:
+                request_headers["If-Modified-Since"] = entry.last_modified
+
+        response = await self.request("GET", full_url, headers=request_headers)
+        if response.status_code == 304 and entry is not None:
+            cached = self.cache.refresh(key, response.headers, ttl)
+            if cached is not None:
+                return cached
+            # Evicted while we were revalidating; fetch the full body
+            response = await self.request("GET", full_url, headers=headers)
+
+        self.cache.record_miss()
+        if response.status_code == 200:
+            self.cache.store(key, response.status_code, str(response.url), response.content, response.headers, ttl)
+        return response
+
+    async def request(self, method: str, url: str, **kwargs) -> httpx.Response:
+        """Send a request, timed as a canvas span of the current trace and recorded in the metrics"""
+        endpoint = endpoint_name(url)
+        started = time.perf_counter()
+        response = None
+        try:
+            with span("canvas", endpoint=endpoint), CANVAS_IN_FLIGHT.track():
+                response = await self._request(method, url, **kwargs)
+            return response
+        finally:
+            record_response(endpoint, started, response)
+
+    async def _request(self, method: str, url: str, **kwargs) -> httpx.Response:
+        """
+        Send a request, retrying transient failures
+
+        Only the final response is returned; connection errors are re-raised
+        once the retry budget is exhausted.
+        """
+        attempt = 0
+        while True:
+            try:
+                response = await self.client.request(method, url, **kwargs)
+            except (httpx.TransportError, httpx.TimeoutException) as e:
+                if attempt >= self.max_retries:
+                    raise
+                delay = backoff_delay(attempt, self.backoff_factor, self.backoff_max)
+                logger.warning(f"Canvas request to {url} failed ({e}), retrying in {delay:.2f}s")
+            else:
+                if attempt >= self.max_retries or not is_transient(response):
+                    return response
+                delay = backoff_delay(attempt, self.backoff_factor, self.backoff_max, response)
+                logger.warning(f"Canvas returned {response.status_code} for {url}, retrying in {delay:.2f}s")
+
+            await asyncio.sleep(delay)
+            attempt += 1
+
+    async def aclose(self):
+        """Close the pooled client of the running event loop"""
+        loop = asyncio.get_running_loop()
+        with self._clients_lock:
+            client = self._clients.pop(loop, None)
+        if client is not None:
+            await client.aclose()
+
+
+_default_async_transport: Optional[AsyncCanvasTransport] = None
+_default_async_transport_lock = threading.Lock()
+
+
+def get_default_async_transport() -> AsyncCanvasTransport:
+    """Get the process-wide transport shared by all Canvas clients"""
+    global _default_async_transport
+    with _default_async_transport_lock:
+        if _default_async_transport is None:
+            _default_async_transport = AsyncCanvasTransport(cache=get_default_cache())
+        return _default_async_transport
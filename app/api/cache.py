@@ -0,0 +1,208 @@
+import hashlib
+import json
+import re
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Tuple
+from urllib.parse import urlparse
+
+from requests.utils import parse_header_links
+
+from app.config import CANVAS_CACHE_ENABLED, CANVAS_CACHE_MAX_ENTRIES, CANVAS_CACHE_MAX_BYTES
+
+# Freshness lifetime (seconds) per Canvas endpoint, matched against the URL path.
+# Listings that change rarely within a session get long TTLs; anything not
+# listed here is never cached.
+DEFAULT_TTL_RULES: List[Tuple[str, float]] = [
+    (r"/users/self$", 3600),
+    (r"/courses$", 600),
+    (r"/courses/\d+$", 300),
+    (r"/courses/\d+/modules(/\d+/items)?$", 300),
+    (r"/courses/\d+/files$", 120),
+    (r"/courses/\d+/assignment_groups$", 60),
+    (r"/courses/\d+/assignments$", 30),
+    (r"/courses/\d+/discussion_topics$", 60),
+    (r"/planner/items$", 60),
+]
+
+# Response headers kept with a cache entry
+_STORED_HEADERS = ("Content-Type", "Link", "ETag", "Last-Modified")
+
+
+@dataclass
+class CachedResponse:
+    """A response-shaped view of a cached Canvas GET"""
+    status_code: int
+    url: str
+    content: bytes
+    headers: Dict[str, str] = field(default_factory=dict)
+    from_cache: bool = True
+
+    @property
+    def text(self) -> str:
+        return self.content.decode("utf-8", errors="replace")
+
+    @property
+    def links(self) -> Dict[str, Dict]:
+        """Parsed Link header, keyed by rel like requests.Response.links"""
+        resolved = {}
+        header = self.headers.get("Link")
+        if header:
+            for link in parse_header_links(header):
+                resolved[link.get("rel") or link.get("url")] = link
+        return resolved
+
+    def json(self) -> Any:
+        return json.loads(self.content)
+
+
+@dataclass
+class _CacheEntry:
+    response: CachedResponse
+    expires_at: float
+
+    @property
+    def size(self) -> int:
+        return len(self.response.content)
+
+    @property
+    def etag(self) -> Optional[str]:
+        return self.response.headers.get("ETag")
+
+    @property
+    def last_modified(self) -> Optional[str]:
+        return self.response.headers.get("Last-Modified")
+
+
+class ResponseCache:
+    """
+    Size-bounded LRU cache for Canvas GET responses
+
+    Entries live for a per-endpoint TTL. Once stale they are kept around so
+    that the transport can revalidate them with If-None-Match /
+    If-Modified-Since, turning an unchanged listing into a bodiless 304.
+    Keys include a hash of the Authorization header so users never share entries.
+    """
+
+    def __init__(
+        self,
+        ttl_rules: Optional[List[Tuple[str, float]]] = None,
+        max_entries: int = CANVAS_CACHE_MAX_ENTRIES,
+        max_bytes: int = CANVAS_CACHE_MAX_BYTES,
+    ):
+        self.ttl_rules = [(re.compile(pattern), ttl) for pattern, ttl in (ttl_rules or DEFAULT_TTL_RULES)]
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._entries: "OrderedDict[str, _CacheEntry]" = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+        self.revalidations = 0
+        self.evictions = 0
+
+    def ttl_for(self, url: str) -> Optional[float]:
+        """Get the TTL for a URL, or None if the endpoint isn't cacheable"""
+        path = urlparse(url).path
+        for pattern, ttl in self.ttl_rules:
+            if pattern.search(path):
+                return ttl
+        return None
+
+    @staticmethod
+    def make_key(url: str, headers: Optional[Dict] = None) -> str:
+        """Build a cache key from the fully-encoded URL and the caller's credentials"""
+        auth = (headers or {}).get("Authorization", "")
+        auth_hash = hashlib.sha256(auth.encode()).hexdigest()[:16]
+        return f"{auth_hash}:{url}"
+
+    def get(self, key: str) -> Optional[_CacheEntry]:
+        """Look up an entry (fresh or stale) and mark it recently used"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+            return entry
+
+    def is_fresh(self, entry: _CacheEntry) -> bool:
+        return entry.expires_at > time.monotonic()
+
+    def record_hit(self):
+        with self._lock:
+            self.hits += 1
+
+    def record_miss(self):
+        with self._lock:
+            self.misses += 1
+
+    def store(self, key: str, status_code: int, url: str, content: bytes, headers: Dict, ttl: float):
+        """Store a 200 response, evicting least recently used entries to stay in bounds"""
+        kept_headers = {name: headers[name] for name in _STORED_HEADERS if name in headers}
+        entry = _CacheEntry(
+            response=CachedResponse(status_code=status_code, url=url, content=content, headers=kept_headers),
+            expires_at=time.monotonic() + ttl
+        )
+        if entry.size > self.max_bytes:
+            return
+
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self._size -= previous.size
+            self._entries[key] = entry
+            self._size += entry.size
+
+            while len(self._entries) > self.max_entries or self._size > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self._size -= evicted.size
+                self.evictions += 1
+
+    def refresh(self, key: str, headers: Dict, ttl: float) -> Optional[CachedResponse]:
+        """Extend a stale entry after Canvas confirmed it with a 304"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            for name in ("ETag", "Last-Modified"):
+                if name in headers:
+                    entry.response.headers[name] = headers[name]
+            entry.expires_at = time.monotonic() + ttl
+            self.revalidations += 1
+            return entry.response
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._size = 0
+
+    def stats(self) -> Dict[str, Any]:
+        """Hit/miss counters and current occupancy"""
+        with self._lock:
+            lookups = self.hits + self.misses + self.revalidations
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "revalidations": self.revalidations,
+                "evictions": self.evictions,
+                "entries": len(self._entries),
+                "bytes": self._size,
+                "hit_rate": (self.hits + self.revalidations) / lookups if lookups else 0.0,
+            }
+
+
+_default_cache: Optional[ResponseCache] = None
+_default_cache_lock = threading.Lock()
+
+
+def get_default_cache() -> Optional[ResponseCache]:
+    """Get the process-wide response cache shared by all Canvas transports, or None when caching is off"""
+    global _default_cache
+    if not CANVAS_CACHE_ENABLED:
+        return None
+    with _default_cache_lock:
+        if _default_cache is None:
+            _default_cache = ResponseCache()
+        return _default_cache
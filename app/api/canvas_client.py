@@ -1,285 +1,150 @@
-import requests
-import datetime
-from typing import Dict, List, Optional, Any, Tuple
-from app.logger import logger
-from app.models.canvas_data import Course, Assignment, Module, File, Announcement
-from app.config import CANVAS_API_KEY, CANVAS_API_URL
+from typing import Dict, Iterator, List, Optional
+
+from app.config import CANVAS_MAX_CONCURRENCY, CANVAS_DEADLINE_SOURCE, CANVAS_DEADLINE_WINDOW_DAYS
+from app.api.async_canvas_client import AsyncCanvasClient
+from app.api.async_transport import AsyncCanvasTransport
+from app.utils.async_utils import iter_sync, run_sync
+
 
 class CanvasClient:
-    """Client for interacting with the Canvas LMS API"""
-    
-    def __init__(self, api_key: Optional[str] = None, api_url: Optional[str] = None):
-        self.api_key = api_key or CANVAS_API_KEY
-        self.api_url = api_url or CANVAS_API_URL
-        self.user_info = None
-    
+    """
+    Client for interacting with the Canvas LMS API from synchronous code
+
+    A blocking wrapper over AsyncCanvasClient: each call runs on the shared
+    background event loop, so both share the connection pool and the cache.
+    """
+
+    def __init__(self, api_key: Optional[str] = None, api_url: Optional[str] = None,
+                 transport: Optional[AsyncCanvasTransport] = None):
+        self.client = AsyncCanvasClient(api_key=api_key, api_url=api_url, transport=transport)
+
+    @property
+    def api_key(self) -> Optional[str]:
+        return self.client.api_key
+
+    @property
+    def api_url(self) -> str:
+        return self.client.api_url
+
+    @property
+    def user_info(self) -> Optional[Dict]:
+        return self.client.user_info
+
+    @property
+    def transport(self) -> AsyncCanvasTransport:
+        return self.client.transport
+
+    def cache_stats(self) -> Dict:
+        """Hit/miss counters of the shared response cache, if one is attached"""
+        return self.client.cache_stats()
+
     def authenticate_user(self, user_token: Optional[str] = None) -> bool:
         """
         Authenticate user with Canvas API
         Returns True if authentication is successful, False otherwise
         """
-        # If token is provided, use it instead of the default one
-        token = user_token if user_token else self.api_key
-        
-        if not token:
-            return False
-        
-        # Try to fetch user info to verify token
-        headers = {"Authorization": f"Bearer {token}"}
-        try:
-            response = requests.get(f"{self.api_url}/users/self", headers=headers)
-            if response.status_code == 200:
-                self.user_info = response.json()
-                return True
-            return False
-        except Exception as e:
-            logger.error(f"Authentication error: {e}")
-            return False
-    
+        return run_sync(self.client.authenticate_user(user_token))
+
+    def iter_active_courses(self, per_page: Optional[int] = None, prefetch: bool = False) -> Iterator[Dict]:
+        """
+        Lazily yield active courses for the authenticated user, page by page
+        Raises CanvasAPIError if Canvas rejects a page
+        """
+        return iter_sync(self.client.iter_active_courses(per_page=per_page, prefetch=prefetch))
+
     def load_active_courses(self) -> List[Dict]:
         """Fetch active courses for the authenticated user"""
-        headers = {"Authorization": f"Bearer {self.api_key}"}
-        try:
-            response = requests.get(
-                f"{self.api_url}/courses",
-                headers=headers,
-                params={"enrollment_state": "active", "include": ["term"]}
-            )
-            
-            if response.status_code == 200:
-                courses = response.json()
-                active_courses = [course for course in courses if not course.get("access_restricted_by_date")]
-                return active_courses
-            else:
-                logger.error(f"Error fetching courses: {response.status_code}, {response.text}")
-                return []
-        except Exception as e:
-            logger.error(f"Error loading courses: {e}")
-            return []
-    
+        return run_sync(self.client.load_active_courses())
+
     def get_course_details(self, course_id: int) -> Dict:
         """Get detailed information about a specific course"""
-        headers = {"Authorization": f"Bearer {self.api_key}"}
-        try:
-            response = requests.get(
-                f"{self.api_url}/courses/{course_id}",
-                headers=headers,
-                params={"include": ["syllabus_body", "term", "teachers"]}
-            )
-            
-            if response.status_code == 200:
-                course_details = response.json()
-                return course_details
-            else:
-                logger.error(f"Error fetching course details: {response.status_code}, {response.text}")
-                return {}
-        except Exception as e:
-            logger.error(f"Error getting course details: {e}")
-            return {}
-    
+        return run_sync(self.client.get_course_details(course_id))
+
+    def iter_course_assignments(self, course_id: int, per_page: Optional[int] = None,
+                                prefetch: bool = False) -> Iterator[Dict]:
+        """
+        Lazily yield assignment groups (with nested assignments) for a course
+        Raises CanvasAPIError if Canvas rejects a page
+        """
+        return iter_sync(self.client.iter_course_assignments(course_id, per_page=per_page, prefetch=prefetch))
+
     def get_course_assignments(self, course_id: int) -> List[Dict]:
         """Get assignments for a specific course"""
-        headers = {"Authorization": f"Bearer {self.api_key}"}
-        try:
-            response = requests.get(
-                f"{self.api_url}/courses/{course_id}/assignment_groups",
-                headers=headers,
-                params={
-                    "exclude_assignment_submission_types[]": "wiki_page",
-                    "exclude_response_fields[]": ["description", "rubric"],
-                    "include[]": ["assignments", "discussion_topic", "assessment_requests"]}
-                )
-            
-            if response.status_code == 200:
-                assignments = response.json()
-                return assignments
-            else:
-                logger.error(f"Error fetching assignments: {response.status_code}, {response.text}")
-                return []
-        except Exception as e:
-            logger.error(f"Error getting assignments: {e}")
-            return []
-    
+        return run_sync(self.client.get_course_assignments(course_id))
+
+    def iter_upcoming_assignments(self, course_id: int, per_page: Optional[int] = None,
+                                  prefetch: bool = False) -> Iterator[Dict]:
+        """
+        Lazily yield a course's upcoming assignments, nearest due date first
+
+        Canvas sorts the listing server-side, so the first N upcoming items can be
+        taken without downloading the rest:
+            itertools.islice(client.iter_upcoming_assignments(course_id, per_page=5), 5)
+        """
+        return iter_sync(self.client.iter_upcoming_assignments(course_id, per_page=per_page, prefetch=prefetch))
+
     def get_course_grades(self, course_id: int) -> Dict:
         """Get grades for a specific course"""
-        headers = {"Authorization": f"Bearer {self.api_key}"}
-        try:
-            response = requests.get(
-                f"{self.api_url}/courses/{course_id}/assignments",
-                headers=headers,
-                params={"include": ["submission"]}
-            )
-            
-            if response.status_code == 200:
-                assignments = response.json()
-                
-                # Also get the overall course grade
-                course_response = requests.get(
-                    f"{self.api_url}/courses/{course_id}",
-                    headers=headers,
-                    params={"include": ["total_scores"]}
-                )
-                
-                course_info = course_response.json() if course_response.status_code == 200 else {}
-                
-                grades_info = {
-                    "overall": course_info.get("enrollments", [{}])[0].get("computed_current_score", None),
-                    "assignments": []
-                }
-                
-                for assignment in assignments:
-                    submission = assignment.get("submission", {})
-                    grades_info["assignments"].append({
-                        "assignment_name": assignment["name"],
-                        "assignment_id": assignment["id"],
-                        "points_possible": assignment["points_possible"],
-                        "score": submission.get("score"),
-                        "submitted": submission.get("submitted_at") is not None,
-                        "graded": submission.get("grade") is not None
-                    })
-                
-                return grades_info
-            else:
-                logger.error(f"Error fetching grades: {response.status_code}, {response.text}")
-                return {}
-        except Exception as e:
-            logger.error(f"Error getting grades: {e}")
-            return {}
-    
-    def get_course_modules(self, course_id: int) -> List[Dict]:
+        return run_sync(self.client.get_course_grades(course_id))
+
+    def iter_course_modules(self, course_id: int, per_page: Optional[int] = None,
+                            prefetch: bool = False) -> Iterator[Dict]:
+        """
+        Lazily yield the modules of a course
+        Raises CanvasAPIError if Canvas rejects a page
+        """
+        return iter_sync(self.client.iter_course_modules(course_id, per_page=per_page, prefetch=prefetch))
+
+    def get_course_modules(self, course_id: int, max_workers: int = CANVAS_MAX_CONCURRENCY) -> List[Dict]:
         """Get modules and items for a specific course"""
-        headers = {"Authorization": f"Bearer {self.api_key}"}
-        try:
-            response = requests.get(
-                f"{self.api_url}/courses/{course_id}/modules",
-                headers=headers,
-                params={"include": ["items"]}
-            )
-            
-            if response.status_code == 200:
-                modules = response.json()
-                
-                # For each module, fetch its items
-                for module in modules:
-                    items_response = requests.get(
-                        f"{self.api_url}/courses/{course_id}/modules/{module['id']}/items",
-                        headers=headers
-                    )
-                    
-                    if items_response.status_code == 200:
-                        module["items"] = items_response.json()
-                    else:
-                        module["items"] = []
-                
-                return modules
-            else:
-                logger.error(f"Error fetching modules: {response.status_code}, {response.text}")
-                return []
-        except Exception as e:
-            logger.error(f"Error getting modules: {e}")
-            return []
-    
+        return run_sync(self.client.get_course_modules(course_id, max_workers=max_workers))
+
+    def iter_course_files(self, course_id: int, per_page: Optional[int] = None,
+                          prefetch: bool = False) -> Iterator[Dict]:
+        """
+        Lazily yield the files of a course
+        Raises CanvasAPIError if Canvas rejects a page
+        """
+        return iter_sync(self.client.iter_course_files(course_id, per_page=per_page, prefetch=prefetch))
+
     def get_course_files(self, course_id: int) -> List[Dict]:
         """Get files for a specific course"""
-        headers = {"Authorization": f"Bearer {self.api_key}"}
-        try:
-            response = requests.get(
-                f"{self.api_url}/courses/{course_id}/files",
-                headers=headers
-            )
-            
-            if response.status_code == 200:
-                files = response.json()
-                return files
-            else:
-                logger.error(f"Error fetching files: {response.status_code}, {response.text}")
-                return []
-        except Exception as e:
-            logger.error(f"Error getting files: {e}")
-            return []
-    
+        return run_sync(self.client.get_course_files(course_id))
+
+    def iter_course_announcements(self, course_id: int, per_page: Optional[int] = None,
+                                  prefetch: bool = False) -> Iterator[Dict]:
+        """
+        Lazily yield the announcements of a course
+        Raises CanvasAPIError if Canvas rejects a page
+        """
+        return iter_sync(self.client.iter_course_announcements(course_id, per_page=per_page, prefetch=prefetch))
+
     def get_course_announcements(self, course_id: int) -> List[Dict]:
         """Get announcements for a specific course"""
-        headers = {"Authorization": f"Bearer {self.api_key}"}
-        try:
-            response = requests.get(
-                f"{self.api_url}/courses/{course_id}/discussion_topics",
-                headers=headers,
-                params={"only_announcements": True}
-            )
-            
-            if response.status_code == 200:
-                announcements = response.json()
-                return announcements
-            else:
-                logger.error(f"Error fetching announcements: {response.status_code}, {response.text}")
-                return []
-        except Exception as e:
-            logger.error(f"Error getting announcements: {e}")
-            return []
-    
-    def get_upcoming_deadlines(self) -> List[Dict]:
-        """Get upcoming assignment deadlines across all active courses"""
-        try:
-            # Get all active courses
-            courses = self.load_active_courses()
-            upcoming_deadlines = []
-            
-            # Get current date with timezone awareness
-            now = datetime.datetime.now(datetime.timezone.utc)
-            
-            for course in courses:
-                course_id = course["id"]
-                # Get assignment groups which contain nested assignments
-                assignment_groups = self.get_course_assignments(course_id)
-                
-                for group in assignment_groups:
-                    # Extract assignments from each group
-                    assignments = group.get("assignments", [])
-                    
-                    for assignment in assignments:
-                        # Skip if no due date
-                        if not assignment.get("due_at"):
-                            continue
-                        
-                        # Parse the date with timezone awareness
-                        due_date_str = assignment["due_at"]
-                        # Make sure we handle the 'Z' timezone designator properly
-                        if due_date_str.endswith('Z'):
-                            due_date = datetime.datetime.fromisoformat(due_date_str.replace("Z", "+00:00"))
-                        else:
-                            # Add UTC timezone if missing
-                            try:
-                                due_date = datetime.datetime.fromisoformat(due_date_str)
-                                if due_date.tzinfo is None:
-                                    due_date = due_date.replace(tzinfo=datetime.timezone.utc)
-                            except ValueError:
-                                # Fall back to a simpler parsing method if ISO format fails
-                                try:
-                                    due_date = datetime.datetime.strptime(due_date_str, "%Y-%m-%dT%H:%M:%SZ")
-                                    due_date = due_date.replace(tzinfo=datetime.timezone.utc)
-                                except ValueError:
-                                    # Skip this assignment if we can't parse the date
-                                    continue
-                        
-                        # Check if assignment is upcoming (due in the future)
-                        if due_date > now:
-                            # Get submission status based on the assignment structure
-                            submission = assignment.get("has_submitted_submissions", False)
-                            
-                            upcoming_deadlines.append({
-                                "course_name": course["name"],
-                                "course_id": course_id,
-                                "assignment_name": assignment["name"],
-                                "assignment_id": assignment["id"],
-                                "due_date": assignment["due_at"],
-                                "points_possible": assignment.get("points_possible", 0),
-                                "submitted": submission
-                            })
-            
-            # Sort by due date
-            upcoming_deadlines.sort(key=lambda x: x["due_date"])
-            return upcoming_deadlines
-        except Exception as e:
-            logger.error(f"Error getting upcoming deadlines: {e}")
-            return []
+        return run_sync(self.client.get_course_announcements(course_id))
+
+    def iter_planner_items(self, start_date: str, end_date: str, per_page: Optional[int] = None,
+                           prefetch: bool = False) -> Iterator[Dict]:
+        """
+        Lazily yield the user's planner items between two ISO 8601 dates
+        Raises CanvasAPIError if Canvas rejects a page
+        """
+        return iter_sync(self.client.iter_planner_items(start_date, end_date, per_page=per_page, prefetch=prefetch))
+
+    def get_planner_deadlines(self, courses: Optional[List[Dict]] = None,
+                              window_days: int = CANVAS_DEADLINE_WINDOW_DAYS) -> List[Dict]:
+        """
+        Get upcoming deadlines from the user-scoped planner in one paginated listing
+        Raises on Canvas errors so that callers can fall back to scanning courses
+        """
+        return run_sync(self.client.get_planner_deadlines(courses, window_days=window_days))
+
+    def get_upcoming_deadlines(self, courses: Optional[List[Dict]] = None,
+                               max_workers: int = CANVAS_MAX_CONCURRENCY,
+                               source: str = CANVAS_DEADLINE_SOURCE) -> List[Dict]:
+        """Get upcoming assignment deadlines across all active courses, from the planner or a course scan"""
+        return run_sync(self.client.get_upcoming_deadlines(courses, max_workers=max_workers, source=source))
+
+    def scan_course_deadlines(self, courses: List[Dict], max_workers: int = CANVAS_MAX_CONCURRENCY) -> List[Dict]:
+        """Get upcoming deadlines by scanning every course's assignment groups, max_workers at a time"""
+        return run_sync(self.client.scan_course_deadlines(courses, max_workers=max_workers))
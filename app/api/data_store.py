@@ -0,0 +1,225 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Dict, Optional, Tuple
+
+from app.logger import logger
+from app.config import CANVAS_STORE_ENABLED, CANVAS_STORE_MAX_AGE, CANVAS_STORE_PATH
+
+# Canvas client methods whose results are kept; inputs such as the courses of deadlines are not part of the key,
+# since they come from the same user's data
+STORED_METHODS = frozenset({
+    "load_active_courses",
+    "get_upcoming_deadlines",
+    "get_course_details",
+    "get_course_assignments",
+    "get_course_grades",
+    "get_course_modules",
+    "get_course_files",
+    "get_course_announcements",
+})
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS canvas_data (
+    owner TEXT NOT NULL,
+    method TEXT NOT NULL,
+    args TEXT NOT NULL,
+    value TEXT NOT NULL,
+    digest TEXT NOT NULL,
+    version TEXT,
+    fetched_at REAL NOT NULL,
+    PRIMARY KEY (owner, method, args)
+)
+"""
+
+
+# How often rows older than the maximum age are deleted
+_PRUNE_INTERVAL = 3600
+
+
+@dataclass
+class StoredData:
+    value: Any
+    # Wall-clock time Canvas last confirmed the value
+    fetched_at: float
+
+    @property
+    def age(self) -> float:
+        return max(time.time() - self.fetched_at, 0.0)
+
+
+def data_version(value: Any) -> Optional[str]:
+    """The latest updated_at among the records of a value, which moves whenever Canvas changes one"""
+    records = value if isinstance(value, list) else [value]
+    stamps = [record["updated_at"] for record in records if isinstance(record, dict) and record.get("updated_at")]
+    return max(stamps) if stamps else None
+
+
+class CanvasStore:
+    """
+    SQLite store of Canvas data, keyed by user and by client method call
+
+    Lets a restarted app answer from the data it fetched before. Each row
+    keeps the latest updated_at of its records as its version and the time
+    Canvas last confirmed it; rewriting a row whose content did not change
+    only moves that time forward. A fetch that started before the stored row
+    was fetched cannot replace it with an older version, and rows older than
+    max_age are deleted.
+    """
+
+    def __init__(self, path: Path = CANVAS_STORE_PATH, max_age: float = CANVAS_STORE_MAX_AGE):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(str(self.path), check_same_thread=False, timeout=5)
+        # WAL lets other worker processes read while one writes
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute(_SCHEMA)
+        self._db.commit()
+        self.max_age = max_age
+        self.hits = 0
+        self.misses = 0
+        self.writes = 0
+        self._pruned_at = 0.0
+        self.prune()
+
+    @staticmethod
+    def _key(method: str, args: Tuple) -> str:
+        return json.dumps(list(args), default=str)
+
+    def get(self, owner: str, method: str, args: Tuple = ()) -> Optional[StoredData]:
+        try:
+            with self._lock:
+                row = self._db.execute(
+                    "SELECT value, fetched_at FROM canvas_data WHERE owner = ? AND method = ? AND args = ?",
+                    (owner, method, self._key(method, args))
+                ).fetchone()
+                if row is None:
+                    self.misses += 1
+                    return None
+                self.hits += 1
+            return StoredData(json.loads(row[0]), row[1])
+        except (sqlite3.Error, ValueError) as e:
+            logger.error(f"Error reading {method} from the Canvas store: {e}")
+            return None
+
+    def put(self, owner: str, method: str, args: Tuple, value: Any, fetched_at: Optional[float] = None) -> bool:
+        """
+        Store a value fetched from Canvas at fetched_at (default now);
+        returns True if it replaced what was stored
+        """
+        text = json.dumps(value, default=str)
+        digest = hashlib.sha256(text.encode()).hexdigest()
+        version = data_version(value)
+        key = self._key(method, args)
+        fetched_at = time.time() if fetched_at is None else fetched_at
+        try:
+            with self._lock:
+                row = self._db.execute(
+                    "SELECT digest, version, fetched_at FROM canvas_data "
+                    "WHERE owner = ? AND method = ? AND args = ?",
+                    (owner, method, key)
+                ).fetchone()
+                if row is not None and row[0] == digest:
+                    self._db.execute(
+                        "UPDATE canvas_data SET fetched_at = MAX(fetched_at, ?) "
+                        "WHERE owner = ? AND method = ? AND args = ?",
+                        (fetched_at, owner, method, key)
+                    )
+                    self._db.commit()
+                    return False
+                if row is not None and row[1] and version and version < row[1] and fetched_at <= row[2]:
+                    # A slower fetch that started earlier, e.g. a revalidation overtaken by the sync
+                    logger.info(f"Keeping stored {method}{tuple(args)} version {row[1]} over older {version}")
+                    return False
+                self._db.execute(
+                    "INSERT OR REPLACE INTO canvas_data (owner, method, args, value, digest, version, fetched_at) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    (owner, method, key, text, digest, version, fetched_at)
+                )
+                self._db.commit()
+                self.writes += 1
+            if time.time() - self._pruned_at > _PRUNE_INTERVAL:
+                self.prune()
+            return True
+        except sqlite3.Error as e:
+            logger.error(f"Error writing {method} to the Canvas store: {e}")
+            return False
+
+    def prune(self) -> int:
+        """Delete rows too old to be used; returns how many were deleted"""
+        try:
+            with self._lock:
+                self._pruned_at = time.time()
+                deleted = self._db.execute(
+                    "DELETE FROM canvas_data WHERE fetched_at < ?", (self._pruned_at - self.max_age,)
+                ).rowcount
+                self._db.commit()
+        except sqlite3.Error as e:
+            logger.error(f"Error pruning the Canvas store: {e}")
+            return 0
+        if deleted:
+            logger.info(f"Pruned {deleted} Canvas store entries older than {self.max_age:.0f}s")
+        return deleted
+
+    def clear(self, owner: Optional[str] = None):
+        with self._lock:
+            if owner is None:
+                self._db.execute("DELETE FROM canvas_data")
+            else:
+                self._db.execute("DELETE FROM canvas_data WHERE owner = ?", (owner,))
+            self._db.commit()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            rows, size = self._db.execute("SELECT COUNT(*), COALESCE(SUM(LENGTH(value)), 0) FROM canvas_data").fetchone()
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "writes": self.writes,
+                "entries": rows,
+                "bytes": size,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+            }
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+
+_default_store: Optional[CanvasStore] = None
+_default_store_pid: Optional[int] = None
+_default_store_lock = threading.Lock()
+
+
+def get_canvas_store() -> Optional[CanvasStore]:
+    """Get the process-wide Canvas store, or None if it is disabled or can't be opened"""
+    global _default_store, _default_store_pid
+    if not CANVAS_STORE_ENABLED:
+        return None
+    with _default_store_lock:
+        # SQLite connections must not be shared with forked worker processes
+        if _default_store is None or _default_store_pid != os.getpid():
+            try:
+                _default_store = CanvasStore()
+            except sqlite3.Error as e:
+                logger.error(f"Could not open the Canvas store at {CANVAS_STORE_PATH}: {e}")
+                return None
+            _default_store_pid = os.getpid()
+        return _default_store
+
+
+def close_canvas_store():
+    """Close the process-wide Canvas store, if this process opened it"""
+    global _default_store
+    with _default_store_lock:
+        if _default_store is not None and _default_store_pid == os.getpid():
+            _default_store.close()
+        _default_store = None
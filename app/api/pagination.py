@@ -0,0 +1,67 @@
+import asyncio
+from typing import AsyncIterator, Dict, List, Optional
+
+from app.api.transport import CanvasAPIError
+from app.config import CANVAS_PER_PAGE
+
+
+async def aiter_pages(
+    transport,
+    url: str,
+    headers: Optional[Dict] = None,
+    params: Optional[Dict] = None,
+    per_page: Optional[int] = None,
+    prefetch: bool = False,
+) -> AsyncIterator[List[Dict]]:
+    """
+    Lazily walk a paginated Canvas listing through an AsyncCanvasTransport, following Link: rel="next"
+
+    Pages are only requested as the caller consumes them, so stopping early
+    stops the downloads. With prefetch enabled the next page is requested as
+    a task while the caller is still processing the current one.
+
+    Raises CanvasAPIError if Canvas answers any page with a non-200 status.
+    """
+    params = dict(params or {})
+    params["per_page"] = per_page or CANVAS_PER_PAGE
+
+    pending: Optional[asyncio.Task] = None
+    try:
+        response = await transport.get(url, headers=headers, params=params)
+        while True:
+            if response.status_code != 200:
+                raise CanvasAPIError(response.status_code, str(response.url), response.text)
+
+            # The next link already carries per_page and the original query
+            next_url = response.links.get("next", {}).get("url")
+            if next_url and prefetch:
+                pending = asyncio.ensure_future(transport.get(next_url, headers=headers))
+
+            page = response.json()
+            yield page if isinstance(page, list) else [page]
+
+            if not next_url:
+                return
+            if pending is not None:
+                response, pending = await pending, None
+            else:
+                response = await transport.get(next_url, headers=headers)
+    finally:
+        # An abandoned prefetch is dropped
+        if pending is not None:
+            pending.cancel()
+
+
+async def aiter_records(
+    transport,
+    url: str,
+    headers: Optional[Dict] = None,
+    params: Optional[Dict] = None,
+    per_page: Optional[int] = None,
+    prefetch: bool = False,
+) -> AsyncIterator[Dict]:
+    """Yield the individual records of a paginated listing as pages arrive"""
+    async for page in aiter_pages(transport, url, headers=headers, params=params, per_page=per_page,
+                                  prefetch=prefetch):
+        for record in page:
+            yield record
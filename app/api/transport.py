@@ -0,0 +1,80 @@
+import random
+import re
+import time
+from typing import Dict, Optional
+from urllib.parse import urlsplit
+
+import requests
+
+from app.utils.metrics import (
+    CANVAS_RATE_LIMIT_REMAINING,
+    CANVAS_REQUEST_COST,
+    CANVAS_REQUEST_SECONDS,
+    CANVAS_RESPONSES,
+)
+
+# Status codes that are worth retrying: throttling and transient server errors
+RETRY_STATUSES = frozenset({429, 500, 502, 503, 504})
+
+
+class CanvasAPIError(Exception):
+    """Raised when Canvas answers a request with an unexpected status code"""
+
+    def __init__(self, status_code: int, url: str, text: str = ""):
+        self.status_code = status_code
+        self.url = url
+        self.text = text
+        super().__init__(f"{status_code}, {text}")
+
+
+def is_transient(response) -> bool:
+    """Check whether a response is a transient failure worth retrying"""
+    if response.status_code in RETRY_STATUSES:
+        return True
+    # Canvas signals throttling with a 403 rather than a 429
+    return response.status_code == 403 and "Rate Limit Exceeded" in response.text
+
+
+def backoff_delay(attempt: int, backoff_factor: float, backoff_max: float, response=None) -> float:
+    """Full-jitter exponential backoff, honouring Retry-After when present"""
+    if response is not None:
+        retry_after = response.headers.get("Retry-After")
+        if retry_after:
+            try:
+                return min(float(retry_after), backoff_max)
+            except ValueError:
+                pass
+    ceiling = min(backoff_max, backoff_factor * (2 ** attempt))
+    return random.uniform(0, ceiling)
+
+
+def prepare_url(url: str, params: Optional[Dict] = None) -> str:
+    """Encode query parameters into the URL the way requests sends them, which is also the cache key"""
+    if not params:
+        return url
+    return requests.Request("GET", url, params=params).prepare().url
+
+
+def endpoint_name(url: str) -> str:
+    """Canvas endpoint of a URL with ids folded, e.g. /courses/:id/modules, for grouping timings"""
+    path = urlsplit(url).path
+    path = re.sub(r"^.*?/api/v1", "", path)
+    return re.sub(r"/\d+(?=/|$)", "/:id", path) or "/"
+
+
+def record_response(endpoint: str, started: float, response=None):
+    """Update the Canvas metrics with the final response of a request, or None if it failed"""
+    CANVAS_REQUEST_SECONDS.labels(endpoint).observe(time.perf_counter() - started)
+    if response is None:
+        CANVAS_RESPONSES.labels(endpoint, "error").inc()
+        return
+    CANVAS_RESPONSES.labels(endpoint, response.status_code).inc()
+    try:
+        remaining = response.headers.get("X-Rate-Limit-Remaining")
+        if remaining is not None:
+            CANVAS_RATE_LIMIT_REMAINING.set(float(remaining))
+        cost = response.headers.get("X-Request-Cost")
+        if cost is not None:
+            CANVAS_REQUEST_COST.inc(float(cost))
+    except ValueError:
+        pass
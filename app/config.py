@@ -17,11 +17,99 @@ WORKSPACE_ROOT = PROJECT_ROOT / "workspace"
 CANVAS_API_KEY = os.getenv("CANVAS_API_KEY")
 CANVAS_API_URL = os.getenv("CANVAS_API_URL", "https://canvas.instructure.com/api/v1")
 
+# Canvas HTTP transport settings
+CANVAS_POOL_MAXSIZE = int(os.getenv("CANVAS_POOL_MAXSIZE", "16"))
+CANVAS_CONNECT_TIMEOUT = float(os.getenv("CANVAS_CONNECT_TIMEOUT", "5"))
+CANVAS_READ_TIMEOUT = float(os.getenv("CANVAS_READ_TIMEOUT", "30"))
+CANVAS_MAX_RETRIES = int(os.getenv("CANVAS_MAX_RETRIES", "3"))
+CANVAS_BACKOFF_FACTOR = float(os.getenv("CANVAS_BACKOFF_FACTOR", "0.5"))
+CANVAS_BACKOFF_MAX = float(os.getenv("CANVAS_BACKOFF_MAX", "8"))
+CANVAS_PER_PAGE = int(os.getenv("CANVAS_PER_PAGE", "50"))
+CANVAS_MAX_CONCURRENCY = int(os.getenv("CANVAS_MAX_CONCURRENCY", "6"))
+
+# Where upcoming deadlines come from: "planner" (one user-scoped listing) or "courses" (per-course scan)
+CANVAS_DEADLINE_SOURCE = os.getenv("CANVAS_DEADLINE_SOURCE", "planner").lower()
+CANVAS_DEADLINE_WINDOW_DAYS = int(os.getenv("CANVAS_DEADLINE_WINDOW_DAYS", "120"))
+
+# Canvas response cache settings
+CANVAS_CACHE_ENABLED = os.getenv("CANVAS_CACHE_ENABLED", "True").lower() == "true"
+CANVAS_CACHE_MAX_ENTRIES = int(os.getenv("CANVAS_CACHE_MAX_ENTRIES", "512"))
+CANVAS_CACHE_MAX_BYTES = int(os.getenv("CANVAS_CACHE_MAX_BYTES", str(32 * 1024 * 1024)))
+
 # OpenAI settings
 OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
 OPENAI_MODEL = os.getenv("OPENAI_MODEL")
 OPENAI_BASE_URL = os.getenv("OPENAI_BASE_URL")
 
+# Local classifier: answer formulaic queries without an LLM call when confident enough
+LOCAL_CLASSIFIER_ENABLED = os.getenv("LOCAL_CLASSIFIER_ENABLED", "True").lower() == "true"
+LOCAL_CLASSIFIER_THRESHOLD = float(os.getenv("LOCAL_CLASSIFIER_THRESHOLD", "0.8"))
+
+# Classification cache: reuse LLM classifications of repeated queries
+CLASSIFICATION_CACHE_ENABLED = os.getenv("CLASSIFICATION_CACHE_ENABLED", "True").lower() == "true"
+CLASSIFICATION_CACHE_MAX_ENTRIES = int(os.getenv("CLASSIFICATION_CACHE_MAX_ENTRIES", "1000"))
+CLASSIFICATION_CACHE_TTL = float(os.getenv("CLASSIFICATION_CACHE_TTL", str(24 * 3600)))
+CLASSIFICATION_CACHE_PERSIST = os.getenv("CLASSIFICATION_CACHE_PERSIST", "False").lower() == "true"
+
+# Answer cache: reuse generated responses for the same query over identical Canvas data
+ANSWER_CACHE_ENABLED = os.getenv("ANSWER_CACHE_ENABLED", "True").lower() == "true"
+ANSWER_CACHE_MAX_ENTRIES = int(os.getenv("ANSWER_CACHE_MAX_ENTRIES", "256"))
+ANSWER_CACHE_MAX_BYTES = int(os.getenv("ANSWER_CACHE_MAX_BYTES", str(4 * 1024 * 1024)))
+ANSWER_CACHE_TTL = float(os.getenv("ANSWER_CACHE_TTL", "900"))
+
+# Token budget for the response prompt (template, history and data), estimated offline
+PROMPT_TOKEN_BUDGET = int(os.getenv("PROMPT_TOKEN_BUDGET", "8000"))
+PROMPT_HISTORY_SHARE = float(os.getenv("PROMPT_HISTORY_SHARE", "0.25"))
+
+# Conversation memory: token cap for the history sent with each query
+MEMORY_TOKEN_BUDGET = int(os.getenv("MEMORY_TOKEN_BUDGET", "1000"))
+MEMORY_SUMMARY_SHARE = float(os.getenv("MEMORY_SUMMARY_SHARE", "0.3"))
+MEMORY_REPLY_CHARS = int(os.getenv("MEMORY_REPLY_CHARS", "600"))
+
+# Persistent Canvas data store: queries are answered from local data while it is refreshed in the background
+CANVAS_STORE_ENABLED = os.getenv("CANVAS_STORE_ENABLED", "True").lower() == "true"
+CANVAS_STORE_PATH = Path(os.getenv("CANVAS_STORE_PATH", str(WORKSPACE_ROOT / "canvas_store.sqlite3")))
+# Stored data older than this is refreshed from Canvas after it has been used
+CANVAS_STORE_REVALIDATE_AFTER = float(os.getenv("CANVAS_STORE_REVALIDATE_AFTER", "60"))
+# Stored data older than this is not used; the query waits for Canvas instead
+CANVAS_STORE_MAX_AGE = float(os.getenv("CANVAS_STORE_MAX_AGE", str(7 * 24 * 3600)))
+
+# Background sync: keeps the stored Canvas data of active users fresh so queries rarely wait on Canvas
+SYNC_ENABLED = os.getenv("SYNC_ENABLED", "True").lower() == "true"
+SYNC_INTERVAL = float(os.getenv("SYNC_INTERVAL", "300"))
+# Canvas requests per minute the sync may make in each process
+SYNC_REQUEST_BUDGET = int(os.getenv("SYNC_REQUEST_BUDGET", "60"))
+# Users whose session has not been used for this long are not synced
+SYNC_IDLE_AFTER = float(os.getenv("SYNC_IDLE_AFTER", str(15 * 60)))
+# Courses with an assignment due within this many hours are synced first
+SYNC_DUE_SOON_HOURS = float(os.getenv("SYNC_DUE_SOON_HOURS", "48"))
+
+# Query pipeline settings
+QUERY_FETCH_DEADLINE = float(os.getenv("QUERY_FETCH_DEADLINE", "20"))
+SPECULATIVE_PREFETCH = os.getenv("SPECULATIVE_PREFETCH", "True").lower() == "true"
+
+# Session agent pool: one agent (Canvas credentials and conversation) per browser session
+AGENT_POOL_MAX_SESSIONS = int(os.getenv("AGENT_POOL_MAX_SESSIONS", "100"))
+AGENT_POOL_IDLE_TIMEOUT = float(os.getenv("AGENT_POOL_IDLE_TIMEOUT", str(30 * 60)))
+AGENT_POOL_MAX_BYTES = int(os.getenv("AGENT_POOL_MAX_BYTES", str(64 * 1024 * 1024)))
+# Signs the session cookie; a random per-process key logs everyone out on restart
+FLASK_SECRET_KEY = os.getenv("FLASK_SECRET_KEY")
+
+# Serving: "desktop" runs the dev server and opens a browser, "headless" runs a production server
+SERVE_MODE = os.getenv("SERVE_MODE", "desktop").lower()
+SERVER_HOST = os.getenv("SERVER_HOST", "127.0.0.1")
+SERVER_PORT = int(os.getenv("SERVER_PORT", "5000"))
+SERVER_WORKERS = int(os.getenv("SERVER_WORKERS", "1"))
+SERVER_THREADS = int(os.getenv("SERVER_THREADS", "32"))
+# How long in-flight requests may take to finish after SIGTERM
+SHUTDOWN_DRAIN_TIMEOUT = float(os.getenv("SHUTDOWN_DRAIN_TIMEOUT", "30"))
+
+# HTTP cassettes: "record" saves Canvas and OpenAI traffic with credentials scrubbed, "replay" serves it back
+HTTP_CASSETTE_MODE = os.getenv("HTTP_CASSETTE_MODE", "off").lower()
+HTTP_CASSETTE_PATH = Path(os.getenv("HTTP_CASSETTE_PATH", str(WORKSPACE_ROOT / "cassettes" / "session.jsonl.gz")))
+# Replay with the "recorded" response timings or with "zero" latency
+HTTP_CASSETTE_TIMING = os.getenv("HTTP_CASSETTE_TIMING", "recorded").lower()
+
 # App settings
 DEBUG = os.getenv("DEBUG", "False").lower() == "true"
 LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO")
@@ -30,6 +30,7 @@ class Assignment:
     due_at: Optional[str]
     points_possible: float
     submission: Optional[Dict] = None
+    has_submitted_submissions: bool = False
     
     @classmethod
     def from_dict(cls, data: Dict) -> 'Assignment':
@@ -39,7 +40,8 @@ class Assignment:
             description=data.get("description", ""),
             due_at=data.get("due_at"),
             points_possible=data.get("points_possible", 0.0),
-            submission=data.get("submission")
+            submission=data.get("submission"),
+            has_submitted_submissions=data.get("has_submitted_submissions", False)
         )
 
 @dataclass
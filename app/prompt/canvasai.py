@@ -74,6 +74,10 @@ Follow these guidelines to make your response more appealing:
 8. Use emojis sparingly but effectively to add personality (e.g., 📚, ✅, ⏰, 📊)
 
 If you cannot answer based on the available data, politely explain what information might be needed.
+If the API DATA contains "missing_data", that information could not be retrieved from Canvas in time;
+answer with what is available and tell the student which parts are missing.
+If the API DATA contains "truncated_data", those sections were shortened to the most relevant items;
+do not assume the listed items are everything the student has.
 """
 
 # Error response templates
@@ -0,0 +1,179 @@
+import signal
+import threading
+import time
+from typing import Callable, Optional
+
+from werkzeug.serving import make_server
+from werkzeug.wsgi import ClosingIterator
+
+from app.logger import logger
+from app.config import SERVER_THREADS, SHUTDOWN_DRAIN_TIMEOUT
+
+try:
+    from gunicorn.app.base import BaseApplication
+except ImportError:  # gunicorn doesn't run on Windows
+    BaseApplication = None
+
+
+class RequestTracker:
+    """
+    WSGI middleware counting requests in flight, including streamed responses
+
+    A response counts until the server has sent its last chunk, so a drain
+    waits for streaming answers too. Once draining, the app reports itself
+    not ready so load balancers stop routing new requests to it.
+    """
+
+    def __init__(self, wsgi_app: Callable):
+        self.wsgi_app = wsgi_app
+        self.in_flight = 0
+        self.draining = False
+        self._idle = threading.Condition()
+
+    def __call__(self, environ, start_response):
+        with self._idle:
+            self.in_flight += 1
+        try:
+            response = self.wsgi_app(environ, start_response)
+        except BaseException:
+            self._finished()
+            raise
+        return ClosingIterator(response, self._finished)
+
+    def _finished(self):
+        with self._idle:
+            self.in_flight -= 1
+            self._idle.notify_all()
+
+    def drain(self, timeout: float = SHUTDOWN_DRAIN_TIMEOUT) -> bool:
+        """Stop reporting ready and wait for requests in flight; False if some were still running at the timeout"""
+        self.draining = True
+        deadline = time.monotonic() + timeout
+        with self._idle:
+            while self.in_flight > 0:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return False
+                self._idle.wait(remaining)
+        return True
+
+
+def request_tracker(app) -> Optional[RequestTracker]:
+    """The RequestTracker wrapping a Flask app, if there is one"""
+    wsgi_app = getattr(app, "wsgi_app", None)
+    return wsgi_app if isinstance(wsgi_app, RequestTracker) else None
+
+
+def drain_requests(app, timeout: float):
+    """Stop reporting the app ready and wait for its requests in flight, up to timeout"""
+    tracker = request_tracker(app)
+    if tracker is not None and not tracker.drain(timeout):
+        logger.warning(f"{tracker.in_flight} requests still running after {timeout:.0f}s, stopping anyway")
+
+
+if BaseApplication is not None:
+    class GunicornServer(BaseApplication):
+        """
+        Runs the app factory in gunicorn worker processes
+
+        Each worker has its own pools, sync and store, so each one drains its
+        requests and runs on_exit itself, from the worker hooks; the arbiter
+        process never loads the app.
+        """
+
+        def __init__(self, app_factory: Callable, options: dict, drain_timeout: float = SHUTDOWN_DRAIN_TIMEOUT,
+                     on_exit: Optional[Callable] = None):
+            self.app_factory = app_factory
+            self.options = options
+            self.drain_timeout = drain_timeout
+            self.on_exit = on_exit
+            self._stopped = False
+            super().__init__()
+
+        def load_config(self):
+            for key, value in self.options.items():
+                self.cfg.set(key, value)
+            self.cfg.set("post_worker_init", self.post_worker_init)
+            self.cfg.set("worker_int", self.worker_int)
+            self.cfg.set("worker_exit", self.worker_exit)
+
+        def load(self):
+            # Called in each worker after the fork, so every worker has its own pools and event loop
+            return self.app_factory()
+
+        def post_worker_init(self, worker):
+            """Report draining as soon as a graceful stop starts; gunicorn has no hook for SIGTERM"""
+            handle_exit = worker.handle_exit
+
+            def handle_term(sig, frame):
+                tracker = request_tracker(worker.wsgi)
+                if tracker is not None:
+                    tracker.draining = True
+                handle_exit(sig, frame)
+
+            signal.signal(signal.SIGTERM, handle_term)
+
+        def worker_int(self, worker):
+            """SIGINT/SIGQUIT exit the worker right after this hook, so its requests are drained here"""
+            self._stop(worker)
+
+        def worker_exit(self, server, worker):
+            """Runs in the worker process once it has stopped serving"""
+            self._stop(worker)
+
+        def _stop(self, worker):
+            if self._stopped:
+                return
+            self._stopped = True
+            drain_requests(getattr(worker, "wsgi", None), self.drain_timeout)
+            if self.on_exit:
+                self.on_exit()
+
+
+def run_headless(app_factory: Callable, host: str, port: int, workers: int = 1, threads: int = SERVER_THREADS,
+                 drain_timeout: float = SHUTDOWN_DRAIN_TIMEOUT, on_exit: Optional[Callable] = None):
+    """
+    Serve the app without a browser or console animation until SIGTERM/SIGINT
+
+    Uses gunicorn with threaded workers when it is installed; gunicorn stops
+    accepting on SIGTERM and lets workers finish within the drain timeout,
+    and each worker runs on_exit as it stops. Otherwise a threaded werkzeug
+    server is used in this process, with the same drain handled here.
+    """
+    if BaseApplication is not None:
+        logger.info(f"Serving on http://{host}:{port} with gunicorn ({workers} workers x {threads} threads)")
+        GunicornServer(app_factory, {
+            "bind": f"{host}:{port}",
+            "workers": workers,
+            "worker_class": "gthread",
+            "threads": threads,
+            "graceful_timeout": int(drain_timeout),
+            # Streamed answers keep a worker thread busy for the whole generation
+            "timeout": max(120, int(drain_timeout) * 2),
+            "accesslog": None,
+        }, drain_timeout=drain_timeout, on_exit=on_exit).run()
+        return
+
+    if workers > 1:
+        logger.warning("gunicorn is not installed; serving with a single threaded werkzeug process")
+    app = app_factory()
+    server = make_server(host, port, app, threaded=True)
+    stop = threading.Event()
+
+    def request_stop(sig, frame):
+        logger.info(f"Received signal {sig}, draining requests")
+        stop.set()
+
+    signal.signal(signal.SIGTERM, request_stop)
+    signal.signal(signal.SIGINT, request_stop)
+
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    logger.info(f"Serving on http://{host}:{port} with the werkzeug server")
+    while not stop.wait(1):
+        pass
+
+    drain_requests(app, drain_timeout)
+    server.shutdown()
+    if on_exit:
+        on_exit()
+    logger.info("Shutdown complete.")
@@ -0,0 +1,112 @@
+import hashlib
+import json
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+
+from app.config import ANSWER_CACHE_MAX_ENTRIES, ANSWER_CACHE_MAX_BYTES, ANSWER_CACHE_TTL
+from app.services.classification_cache import normalize_query
+
+# Fields that change between fetches without changing what the answer should say:
+# activity timestamps, read state, and file URLs carrying one-off verifier tokens
+VOLATILE_FIELDS = frozenset({
+    "updated_at", "last_activity_at", "last_reply_at", "read_state", "unread_count",
+    "subscribed", "url", "thumbnail_url", "preview_url",
+})
+
+
+def _strip_volatile(value: Any) -> Any:
+    if isinstance(value, dict):
+        return {k: _strip_volatile(v) for k, v in value.items() if k not in VOLATILE_FIELDS}
+    if isinstance(value, list):
+        return [_strip_volatile(v) for v in value]
+    return value
+
+
+def fingerprint_data(data: Dict) -> str:
+    """Deterministic hash of the Canvas data behind an answer, ignoring volatile fields"""
+    canonical = json.dumps(_strip_volatile(data), sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.sha256(canonical.encode()).hexdigest()
+
+
+class AnswerCache:
+    """
+    Size-bounded LRU cache of generated responses
+
+    Keys combine a per-user scope, the normalized query, a fingerprint of the
+    fetched Canvas data and a key for the recent conversation, so an answer is
+    only reused when the student asks the same thing over the same data.
+    """
+
+    def __init__(self, max_entries: int = ANSWER_CACHE_MAX_ENTRIES, max_bytes: int = ANSWER_CACHE_MAX_BYTES,
+                 ttl: float = ANSWER_CACHE_TTL):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @staticmethod
+    def make_key(scope: str, query: str, data: Dict, context_key: str) -> str:
+        parts = [scope, normalize_query(query), fingerprint_data(data), context_key]
+        return hashlib.sha256("\x1f".join(parts).encode()).hexdigest()
+
+    def get(self, key: str) -> Optional[str]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[1] < time.monotonic():
+                if entry is not None:
+                    self._remove(key)
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, key: str, answer: str):
+        size = len(answer.encode())
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (answer, time.monotonic() + self.ttl, size)
+            self._size += size
+            while len(self._entries) > self.max_entries or self._size > self.max_bytes:
+                oldest = next(iter(self._entries))
+                self._remove(oldest)
+                self.evictions += 1
+
+    def _remove(self, key: str):
+        _, _, size = self._entries.pop(key)
+        self._size -= size
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "entries": len(self._entries),
+                "bytes": self._size,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+            }
+
+
+_default_cache: Optional[AnswerCache] = None
+_default_cache_lock = threading.Lock()
+
+
+def get_answer_cache() -> AnswerCache:
+    """Get the process-wide answer cache"""
+    global _default_cache
+    with _default_cache_lock:
+        if _default_cache is None:
+            _default_cache = AnswerCache()
+        return _default_cache
@@ -0,0 +1,308 @@
+import asyncio
+import hashlib
+import json
+import threading
+import time
+import weakref
+from collections import Counter
+from contextlib import contextmanager
+from openai import AsyncOpenAI, DefaultAsyncHttpxClient
+from typing import AsyncIterator, Dict, Iterator, List, Optional, Tuple
+
+from app.logger import logger
+from app.config import (
+    OPENAI_API_KEY,
+    OPENAI_MODEL,
+    OPENAI_BASE_URL,
+    LOCAL_CLASSIFIER_ENABLED,
+    LOCAL_CLASSIFIER_THRESHOLD,
+    CLASSIFICATION_CACHE_ENABLED,
+    ANSWER_CACHE_ENABLED,
+    DEBUG,
+)
+from app.services.local_classifier import LocalQueryClassifier
+from app.services.course_index import get_course_index
+from app.services.classification_cache import get_classification_cache
+from app.services.answer_cache import get_answer_cache
+from app.services.projection import prepare_prompt_data, project_data
+from app.services.prompt_builder import PromptBuilder
+from app.prompt.canvasai import CLASSIFICATION_PROMPT, GENERATION_ERROR_RESPONSE
+from app.utils.cassette import async_httpx_transport
+from app.utils.metrics import LLM_ERRORS, LLM_IN_FLIGHT, LLM_REQUEST_SECONDS, LLM_TOKENS
+from app.utils.tracing import span
+
+# Classification used when the LLM can't be reached or its reply can't be parsed
+UNKNOWN_CLASSIFICATION = {
+    "query_type": "unknown",
+    "course": None,
+    "course_id": None,
+    "course_match_confidence": None,
+    "time_frame": None,
+    "specific_item": None,
+    "api_calls": ["load_active_courses"]
+}
+
+
+@contextmanager
+def model_call(purpose: str) -> Iterator[None]:
+    """Time a language model call as an openai span and in the metrics"""
+    started = time.perf_counter()
+    try:
+        with span("openai", purpose=purpose), LLM_IN_FLIGHT.track():
+            yield
+    except Exception:
+        LLM_ERRORS.labels(purpose).inc()
+        raise
+    finally:
+        LLM_REQUEST_SECONDS.labels(purpose).observe(time.perf_counter() - started)
+
+
+def record_usage(purpose: str, usage):
+    """Count the tokens a completion reports; streams only report them in their last chunk"""
+    if usage is None:
+        return
+    LLM_TOKENS.labels(purpose, "prompt").inc(usage.prompt_tokens or 0)
+    LLM_TOKENS.labels(purpose, "completion").inc(usage.completion_tokens or 0)
+
+
+# One client per event loop, shared by every service so sessions reuse its connection pool
+_clients: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, AsyncOpenAI]" = weakref.WeakKeyDictionary()
+_clients_lock = threading.Lock()
+
+
+def get_async_openai() -> AsyncOpenAI:
+    """Get the shared AsyncOpenAI client of the running event loop"""
+    loop = asyncio.get_running_loop()
+    with _clients_lock:
+        client = _clients.get(loop)
+        if client is None or client.is_closed():
+            transport = async_httpx_transport("openai")
+            http_client = DefaultAsyncHttpxClient(transport=transport) if transport is not None else None
+            client = AsyncOpenAI(api_key=OPENAI_API_KEY, base_url=OPENAI_BASE_URL, http_client=http_client)
+            _clients[loop] = client
+        return client
+
+
+async def close_async_openai():
+    """Close the shared client of the running event loop"""
+    with _clients_lock:
+        client = _clients.pop(asyncio.get_running_loop(), None)
+    if client is not None:
+        await client.close()
+
+
+class AsyncOpenAIService:
+    """
+    Service for interacting with OpenAI APIs, built on AsyncOpenAI
+
+    Formulaic queries are classified locally and repeated ones from the cache;
+    responses are assembled within the prompt budget and reused through the
+    answer cache. Only the requests are awaited, so a slow completion never
+    holds a thread. OpenAIService wraps it for synchronous callers.
+    """
+
+    def __init__(self):
+        self.local_classifier = LocalQueryClassifier() if LOCAL_CLASSIFIER_ENABLED else None
+        self.classification_cache = get_classification_cache() if CLASSIFICATION_CACHE_ENABLED else None
+        self.answer_cache = get_answer_cache() if ANSWER_CACHE_ENABLED else None
+        self.prompt_builder = PromptBuilder()
+        # How many classifications were answered locally vs. by the LLM
+        self.classification_counts = Counter()
+
+    def _classify_offline(self, query: str, courses: Optional[List[Dict]]) -> Optional[Dict]:
+        """Classification from the local rules or the cache, or None when the LLM is needed"""
+        # Formulaic queries are answered by the local rules without an LLM round trip
+        if self.local_classifier:
+            classification, confidence = self.local_classifier.classify(query, courses)
+            if confidence >= LOCAL_CLASSIFIER_THRESHOLD:
+                self.classification_counts["local"] += 1
+                logger.info(f"Query classified locally as: {classification.get('query_type')} (confidence {confidence:.2f})")
+                return classification
+            logger.debug(f"Local classifier unsure (confidence {confidence:.2f}), asking OpenAI")
+
+        # Repeated queries over the same course set reuse the earlier LLM classification
+        if self.classification_cache:
+            cached = self.classification_cache.get(query, courses)
+            if cached is not None:
+                self.classification_counts["cache"] += 1
+                logger.info(f"Query classification served from cache: {cached.get('query_type')}")
+                return cached
+
+        self.classification_counts["llm"] += 1
+        return None
+
+    def _classification_request(self, query: str, courses: Optional[List[Dict]]) -> Dict:
+        """Keyword arguments of the chat completion request that classifies a query"""
+        # Format available courses for the prompt if provided (cached per course set)
+        courses_text = get_course_index(courses).prompt_text if courses else ""
+
+        prompt = CLASSIFICATION_PROMPT.format(
+            query=query,
+            courses_text=courses_text
+        )
+        logger.debug("Sending classification request to OpenAI")
+        return {
+            "model": OPENAI_MODEL,
+            "messages": [
+                {"role": "system", "content": prompt},
+                {"role": "user", "content": query}
+            ],
+            "temperature": 0.1,  # Lower temperature for more predictable formatting
+            "max_tokens": 500,
+            "response_format": {"type": "json_object"}  # Force JSON response format
+        }
+
+    def _parse_classification(self, response_content: str, query: str, courses: Optional[List[Dict]]) -> Dict:
+        response_content = response_content.strip()
+        logger.debug(f"OpenAI JSON response: {response_content}")
+
+        try:
+            # Check if the response is wrapped in markdown code blocks
+            if response_content.startswith("```"):
+                # Extract the JSON content from within the markdown code block
+                lines = response_content.split('\n')
+                # Remove the first line (```json) and the last line (```)
+                if len(lines) > 2:
+                    json_content = '\n'.join(lines[1:-1])
+                    response_content = json_content
+
+            # Parse the classification result
+            classification = json.loads(response_content)
+            logger.info(f"Query classified as: {classification.get('query_type')}")
+
+            if self.classification_cache:
+                self.classification_cache.put(query, courses, classification)
+
+            # Log course matching result if available
+            if classification.get("course_id"):
+                logger.info(f"Course matched: {classification.get('course')} (ID: {classification.get('course_id')}, Confidence: {classification.get('course_match_confidence')})")
+
+            return classification
+        except json.JSONDecodeError as e:
+            # Fallback if JSON parsing fails
+            logger.error(f"Failed to parse OpenAI response as JSON: {e}\nResponse: {response_content}")
+            return dict(UNKNOWN_CLASSIFICATION)
+
+    def _answer_cache_key(self, context: str, data: Dict, query: str, scope: str,
+                          context_key: Optional[str]) -> Optional[str]:
+        if not self.answer_cache:
+            return None
+        if context_key is None:
+            context_key = hashlib.sha256(context.encode()).hexdigest()
+        return self.answer_cache.make_key(scope, query, data, context_key)
+
+    def _prepare_response(self, context: str, data: Dict, query: str, query_type: Optional[str],
+                          scope: str, context_key: Optional[str]) -> Tuple[Optional[str], Optional[str], List[Dict]]:
+        """
+        Returns the answer cache key, a cached answer if there is one, and
+        otherwise the chat messages for the response request
+        """
+        # Only the fields the model needs are sent, then fitted to the prompt token budget
+        if DEBUG:
+            # Also logs the savings over the raw indented dump
+            data, _, _ = prepare_prompt_data(data, query_type)
+        else:
+            data = project_data(data, query_type)
+
+        # The same question over identical Canvas data reuses the earlier answer; answers
+        # from partial data are not cached, so they aren't served once the data is complete
+        if data.get("missing_data"):
+            cache_key = None
+        else:
+            cache_key = self._answer_cache_key(context, data, query, scope, context_key)
+        if cache_key is not None:
+            cached = self.answer_cache.get(cache_key)
+            if cached is not None:
+                logger.info("Response served from answer cache")
+                return cache_key, cached, []
+
+        messages, _ = self.prompt_builder.build(context, data, query)
+        return cache_key, None, messages
+
+    def _response_request(self, messages: List[Dict], stream: bool = False) -> Dict:
+        request = {"model": OPENAI_MODEL, "messages": messages, "temperature": 0.5, "max_tokens": 1000}
+        if stream:
+            request["stream"] = True
+            # Ask for a final chunk with the token usage, for the metrics
+            request["stream_options"] = {"include_usage": True}
+        return request
+
+    def _store_answer(self, cache_key: Optional[str], answer: str):
+        if cache_key is not None and answer:
+            self.answer_cache.put(cache_key, answer)
+
+    @staticmethod
+    def _chunk_text(chunk, started: bool) -> str:
+        """Text of a streamed chunk; leading whitespace is dropped, matching the strip() of generate_response"""
+        if not chunk.choices:
+            return ""
+        text = chunk.choices[0].delta.content or ""
+        return text if started else text.lstrip()
+
+    @property
+    def openai(self) -> AsyncOpenAI:
+        return get_async_openai()
+
+    async def classify_query(self, query: str, courses: Optional[List[Dict]] = None) -> Dict:
+        """Classify a user query and match any mentioned course to the available courses"""
+        classification = self._classify_offline(query, courses)
+        if classification is not None:
+            return classification
+
+        try:
+            with model_call("classify"):
+                response = await self.openai.chat.completions.create(**self._classification_request(query, courses))
+            record_usage("classify", response.usage)
+            return self._parse_classification(response.choices[0].message.content, query, courses)
+        except Exception as e:
+            logger.error(f"OpenAI API error: {e}")
+            return dict(UNKNOWN_CLASSIFICATION)
+
+    async def generate_response(self, context: str, data: Dict, query: str, query_type: Optional[str] = None,
+                                scope: str = "default", context_key: Optional[str] = None) -> str:
+        """Generate a response based on the query, context, and data"""
+        cache_key, cached, messages = self._prepare_response(context, data, query, query_type, scope, context_key)
+        if cached is not None:
+            return cached
+
+        logger.debug("Sending response generation request to OpenAI")
+        try:
+            with model_call("generate"):
+                response = await self.openai.chat.completions.create(**self._response_request(messages))
+            record_usage("generate", response.usage)
+            logger.info("Response generated successfully")
+            answer = response.choices[0].message.content.strip()
+            self._store_answer(cache_key, answer)
+            return answer
+        except Exception as e:
+            logger.error(f"OpenAI API error during response generation: {e}")
+            return GENERATION_ERROR_RESPONSE
+
+    async def stream_response(self, context: str, data: Dict, query: str, query_type: Optional[str] = None,
+                              scope: str = "default", context_key: Optional[str] = None) -> AsyncIterator[str]:
+        """Streaming variant of generate_response; a cached answer is yielded as a single chunk"""
+        cache_key, cached, messages = self._prepare_response(context, data, query, query_type, scope, context_key)
+        if cached is not None:
+            yield cached
+            return
+
+        logger.debug("Sending streaming response generation request to OpenAI")
+        chunks = []
+        try:
+            # Only the wait for the response headers is timed; the generator yields after that
+            with model_call("stream"):
+                stream = await self.openai.chat.completions.create(**self._response_request(messages, stream=True))
+            async for chunk in stream:
+                record_usage("stream", getattr(chunk, "usage", None))
+                text = self._chunk_text(chunk, started=bool(chunks))
+                if text:
+                    chunks.append(text)
+                    yield text
+        except Exception as e:
+            logger.error(f"OpenAI API error during response streaming: {e}")
+            if not chunks:
+                yield GENERATION_ERROR_RESPONSE
+            return
+
+        logger.info("Response streamed successfully")
+        self._store_answer(cache_key, "".join(chunks).strip())
@@ -0,0 +1,176 @@
+import atexit
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+from app.logger import logger
+from app.config import (
+    WORKSPACE_ROOT,
+    CLASSIFICATION_CACHE_MAX_ENTRIES,
+    CLASSIFICATION_CACHE_TTL,
+    CLASSIFICATION_CACHE_PERSIST,
+)
+from app.services.course_index import course_set_fingerprint
+
+# Spellings of relative dates that should share a cache entry; abbreviations that are also words
+# ("sun", "sat", "mon", "wed") are left alone so unrelated questions never share a classification
+RELATIVE_DATE_TOKENS = {
+    "tmrw": "tomorrow", "tmr": "tomorrow", "tmrow": "tomorrow", "2morrow": "tomorrow", "tomorow": "tomorrow",
+    "2day": "today", "tday": "today", "tonite": "tonight", "2nite": "tonight",
+    "wk": "week", "wks": "weeks", "nxt": "next", "thurs": "thursday", "fri": "friday", "tues": "tuesday",
+}
+
+DEFAULT_CACHE_PATH = WORKSPACE_ROOT / "classification_cache.json"
+# Puts within this many seconds of the first unsaved one are written to disk together
+SAVE_DELAY = 5.0
+
+
+def normalize_query(query: str) -> str:
+    """Normalize case, whitespace, punctuation and relative-date spellings"""
+    # Words keep their apostrophes until after the mapping, so "we'd" is never read as "wed"
+    tokens = re.findall(r"[a-z0-9]+(?:'[a-z0-9]+)*", query.lower().replace("\u2019", "'"))
+    return " ".join(RELATIVE_DATE_TOKENS.get(token, token).replace("'", "") for token in tokens)
+
+
+class ClassificationCache:
+    """
+    LRU + TTL cache of query classifications
+
+    Keys combine the normalized query with a fingerprint of the active course
+    set, so a classification (which carries a course_id) is never reused once
+    the student's courses change. Optionally persisted as JSON so it survives
+    restarts; changes are written by a timer thread save_delay seconds after
+    the first unsaved one, so callers on the event loop never wait on disk.
+    """
+
+    def __init__(self, max_entries: int = CLASSIFICATION_CACHE_MAX_ENTRIES, ttl: float = CLASSIFICATION_CACHE_TTL,
+                 path: Optional[Path] = None, save_delay: float = SAVE_DELAY):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.path = path
+        self.save_delay = save_delay
+        self._save_timer: Optional[threading.Timer] = None
+        self._entries: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._save_lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.expired = 0
+
+        if self.path is not None:
+            self._load()
+
+    @staticmethod
+    def make_key(query: str, courses: Optional[List[Dict]]) -> str:
+        fingerprint = course_set_fingerprint(courses or [])
+        return hashlib.sha1(f"{fingerprint}:{normalize_query(query)}".encode()).hexdigest()
+
+    def get(self, query: str, courses: Optional[List[Dict]]) -> Optional[Dict]:
+        """Get a cached classification, or None on a miss"""
+        key = self.make_key(query, courses)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            if entry["stored_at"] + self.ttl < time.time():
+                del self._entries[key]
+                self.expired += 1
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return dict(entry["classification"])
+
+    def put(self, query: str, courses: Optional[List[Dict]], classification: Dict):
+        key = self.make_key(query, courses)
+        with self._lock:
+            self._entries[key] = {"classification": dict(classification), "stored_at": time.time()}
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        self._schedule_save()
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+        self._schedule_save()
+
+    def flush(self):
+        """Write unsaved changes to disk now"""
+        with self._lock:
+            timer, self._save_timer = self._save_timer, None
+        if timer is None:
+            return
+        timer.cancel()
+        self._save()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "expired": self.expired,
+                "entries": len(self._entries),
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+            }
+
+    def _load(self):
+        try:
+            stored = json.loads(self.path.read_text())
+        except FileNotFoundError:
+            return
+        except Exception as e:
+            logger.warning(f"Ignoring unreadable classification cache {self.path}: {e}")
+            return
+        now = time.time()
+        entries = sorted(stored.items(), key=lambda item: item[1].get("stored_at", 0))
+        with self._lock:
+            for key, entry in entries[-self.max_entries:]:
+                if entry.get("stored_at", 0) + self.ttl >= now:
+                    self._entries[key] = entry
+        logger.debug(f"Loaded {len(self._entries)} cached classifications from {self.path}")
+
+    def _schedule_save(self):
+        if self.path is None:
+            return
+        with self._lock:
+            if self._save_timer is not None:
+                return
+            self._save_timer = threading.Timer(self.save_delay, self.flush)
+            self._save_timer.daemon = True
+            self._save_timer.start()
+
+    def _save(self):
+        with self._save_lock:
+            with self._lock:
+                snapshot = dict(self._entries)
+            try:
+                self.path.parent.mkdir(parents=True, exist_ok=True)
+                tmp_path = self.path.with_suffix(".tmp")
+                tmp_path.write_text(json.dumps(snapshot))
+                # Atomic replace so a crash never leaves a half-written cache
+                os.replace(tmp_path, self.path)
+            except Exception as e:
+                logger.warning(f"Could not persist classification cache: {e}")
+
+
+_default_cache: Optional[ClassificationCache] = None
+_default_cache_lock = threading.Lock()
+
+
+def get_classification_cache() -> ClassificationCache:
+    """Get the process-wide classification cache"""
+    global _default_cache
+    with _default_cache_lock:
+        if _default_cache is None:
+            _default_cache = ClassificationCache(path=DEFAULT_CACHE_PATH if CLASSIFICATION_CACHE_PERSIST else None)
+            atexit.register(_default_cache.flush)
+        return _default_cache
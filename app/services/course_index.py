@@ -0,0 +1,196 @@
+import hashlib
+import re
+import threading
+from collections import OrderedDict, defaultdict
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Set
+
+# Words too common in course names to identify one
+NAME_STOPWORDS = frozenset({
+    "and", "the", "of", "to", "for", "in", "introduction", "intro", "course", "advanced",
+    "principles", "concepts", "fundamentals", "project", "management", "programming",
+})
+
+# Number of course sets (one per user, typically) whose index is kept
+INDEX_CACHE_SIZE = 32
+
+
+def normalize(text: str) -> str:
+    """Lowercase, drop punctuation and collapse whitespace"""
+    return " ".join(re.findall(r"[a-z0-9]+", text.lower()))
+
+
+def trigrams(text: str) -> Set[str]:
+    padded = f"  {text} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def significant_words(name: str) -> Set[str]:
+    return {word for word in normalize(name).split() if len(word) > 3 and word not in NAME_STOPWORDS}
+
+
+def acronyms(name: str) -> Set[str]:
+    """Acronyms a student might use, with and without the filler words ("sepm", "ml")"""
+    words = normalize(name).split()
+    found = set()
+    full = "".join(word[0] for word in words if not word.isdigit())
+    short = "".join(word[0] for word in words if word not in ("and", "the", "of", "to", "for", "in") and not word.isdigit())
+    for acronym in (full, short):
+        if len(acronym) >= 2:
+            found.add(acronym)
+    return found
+
+
+def course_set_fingerprint(courses: List[Dict]) -> str:
+    """Stable version of a course list; changes whenever a course is added, removed or renamed"""
+    digest = hashlib.sha1()
+    for course in sorted(courses, key=lambda c: str(c.get("id"))):
+        digest.update(f"{course.get('id')}|{course.get('name')}|{course.get('course_code')}\n".encode())
+    return digest.hexdigest()
+
+
+@dataclass
+class CourseMatch:
+    course: Dict
+    score: float
+    reason: str
+
+    @property
+    def confidence(self) -> str:
+        if self.score >= 0.85:
+            return "high"
+        if self.score >= 0.6:
+            return "medium"
+        return "low"
+
+
+class CourseIndex:
+    """
+    Precomputed lookup structures for resolving course mentions
+
+    Built once per course-set version: normalized names, course codes,
+    acronyms, distinctive name words and a trigram inverted index for fuzzy
+    matching, so a mention resolves without scanning or refetching courses.
+    """
+
+    def __init__(self, courses: List[Dict]):
+        self.courses = list(courses)
+        self.version = course_set_fingerprint(self.courses)
+        self._names: Dict[str, int] = {}
+        self._codes: Dict[str, int] = {}
+        self._code_patterns: List[tuple] = []
+        self._acronyms: Dict[str, List[int]] = defaultdict(list)
+        self._words: Dict[str, List[int]] = defaultdict(list)
+        self._trigrams: Dict[str, List[int]] = defaultdict(list)
+        self._trigram_counts: List[int] = []
+
+        for position, course in enumerate(self.courses):
+            name = normalize(course.get("name") or "")
+            self._names[name] = position
+            code = normalize(course.get("course_code") or "").replace(" ", "")
+            if code:
+                self._codes[code] = position
+                self._code_patterns.append((_code_pattern(code), position))
+            for acronym in acronyms(course.get("name") or ""):
+                self._acronyms[acronym].append(position)
+            for word in significant_words(course.get("name") or ""):
+                self._words[word].append(position)
+            grams = trigrams(name)
+            self._trigram_counts.append(len(grams))
+            for gram in grams:
+                self._trigrams[gram].append(position)
+
+        # Sent to the LLM classifier; built once per course set
+        self.prompt_text = "Available courses:\n" + "\n".join([
+            f"ID: {course.get('id', 'Unknown')}, Name: {course.get('name', 'Unknown')}"
+            for course in self.courses
+        ]) if self.courses else ""
+
+    def resolve(self, mention: str, limit: int = 3) -> List[CourseMatch]:
+        """Rank the courses a short mention ("algo", "COSC 2123", "ML") could refer to"""
+        text = normalize(mention)
+        if not text:
+            return []
+        compact = text.replace(" ", "")
+
+        if text in self._names:
+            return [CourseMatch(self.courses[self._names[text]], 1.0, "name")]
+        if compact in self._codes:
+            return [CourseMatch(self.courses[self._codes[compact]], 1.0, "code")]
+
+        scores: Dict[int, tuple] = {}
+        if compact in self._acronyms:
+            for position in self._acronyms[compact]:
+                scores[position] = (0.9 / len(self._acronyms[compact]), "acronym")
+
+        # Trigram Jaccard similarity through the inverted index
+        grams = trigrams(text)
+        shared: Dict[int, int] = defaultdict(int)
+        for gram in grams:
+            for position in self._trigrams.get(gram, ()):
+                shared[position] += 1
+        for position, count in shared.items():
+            similarity = count / (len(grams) + self._trigram_counts[position] - count)
+            # A mention that is a prefix of the name ("algo") is a strong hint
+            name = normalize(self.courses[position].get("name") or "")
+            if name.startswith(text) and len(text) >= 4:
+                similarity = max(similarity, 0.85)
+            elif f" {text} " in f" {name} ":
+                similarity = max(similarity, 0.8)
+            if similarity > scores.get(position, (0.0, ""))[0]:
+                scores[position] = (similarity, "fuzzy")
+
+        ranked = sorted(scores.items(), key=lambda item: item[1][0], reverse=True)[:limit]
+        return [CourseMatch(self.courses[position], score, reason) for position, (score, reason) in ranked]
+
+    def find_in_text(self, text: str) -> Optional[CourseMatch]:
+        """Find a course referred to anywhere in a full query by code, name, acronym or distinctive word"""
+        normalized = normalize(text)
+        for pattern, position in self._code_patterns:
+            if pattern.search(normalized):
+                return CourseMatch(self.courses[position], 1.0, "code")
+        padded = f" {normalized} "
+        for name, position in self._names.items():
+            if name and f" {name} " in padded:
+                return CourseMatch(self.courses[position], 1.0, "name")
+
+        tokens = set(normalized.split())
+        # Only written-in-capitals abbreviations count, so "is" or "it" never match an acronym
+        abbreviations = {token.lower() for token in re.findall(r"\b[A-Z]{2,6}\b", text)}
+        acronym_hits = {position for token in abbreviations for position in self._acronyms.get(token, ())}
+        if len(acronym_hits) == 1:
+            return CourseMatch(self.courses[acronym_hits.pop()], 0.9, "acronym")
+
+        word_hits = {position for token in tokens for position in self._words.get(token, ())}
+        if len(word_hits) == 1:
+            return CourseMatch(self.courses[word_hits.pop()], 0.75, "word")
+        return None
+
+
+def _code_pattern(code: str) -> re.Pattern:
+    """Match a course code with or without a space between letters and digits"""
+    parts = re.match(r"([a-z]+)(\d.*)", code)
+    if parts:
+        return re.compile(rf"\b{re.escape(parts.group(1))}\s?{re.escape(parts.group(2))}\b")
+    return re.compile(rf"\b{re.escape(code)}\b")
+
+
+_index_cache: "OrderedDict[str, CourseIndex]" = OrderedDict()
+_index_cache_lock = threading.Lock()
+
+
+def get_course_index(courses: List[Dict]) -> CourseIndex:
+    """Get the index for a course list, building it only when the course set has changed"""
+    version = course_set_fingerprint(courses)
+    with _index_cache_lock:
+        index = _index_cache.get(version)
+        if index is not None:
+            _index_cache.move_to_end(version)
+            return index
+
+    index = CourseIndex(courses)
+    with _index_cache_lock:
+        _index_cache[version] = index
+        while len(_index_cache) > INDEX_CACHE_SIZE:
+            _index_cache.popitem(last=False)
+    return index
@@ -0,0 +1,128 @@
+import re
+from typing import Dict, List, Optional, Tuple
+
+from app.logger import logger
+from app.services.course_index import get_course_index
+
+# Keyword rules per query type, checked against the lowercased query
+QUERY_TYPE_PATTERNS: Dict[str, List[str]] = {
+    "deadlines": [r"\bdue\b", r"\bdeadlines?\b", r"\bupcoming\b", r"\bto ?do\b", r"\bsubmit(ted)? by\b"],
+    "grades": [r"\bgrades?\b", r"\bscores?\b", r"\bmarks?\b", r"\bgpa\b", r"\bhow am i doing\b", r"\bresults?\b",
+               r"\bdid i pass\b"],
+    "announcements": [r"\bannouncements?\b", r"\bnews\b", r"\bnotices?\b", r"\bposted\b"],
+    "course_materials": [r"\bmodules?\b", r"\bfiles?\b", r"\bmaterials?\b", r"\bslides?\b",
+                         r"\blecture notes?\b", r"\breadings?\b", r"\bresources?\b", r"\bsyllabus\b"],
+    "assignments": [r"\bassignments?\b", r"\bhomework\b", r"\bquiz(zes)?\b", r"\bprojects?\b", r"\bessays?\b"],
+}
+
+# When several types match, the first in this list wins only if the rest are compatible with it
+COMPATIBLE_TYPES: Dict[str, Tuple[str, ...]] = {
+    "deadlines": ("assignments",),
+    "grades": ("assignments",),
+    "course_materials": (),
+    "announcements": (),
+    "assignments": (),
+}
+
+TIME_FRAME_PATTERNS = [
+    r"\btoday\b", r"\btonight\b", r"\btomorrow\b", r"\bthis week(end)?\b", r"\bnext week\b",
+    r"\bthis month\b", r"\bnext month\b", r"\bthis semester\b", r"\bby (monday|tuesday|wednesday|thursday|friday|saturday|sunday)\b",
+    r"\bon (monday|tuesday|wednesday|thursday|friday|saturday|sunday)\b",
+]
+
+# Suggested API calls per query type, matching what the LLM classifier reports
+API_CALLS: Dict[str, List[str]] = {
+    "deadlines": ["load_active_courses", "get_upcoming_deadlines"],
+    "grades": ["load_active_courses", "get_course_grades"],
+    "announcements": ["load_active_courses", "get_course_announcements"],
+    "course_materials": ["load_active_courses", "get_course_modules", "get_course_files"],
+    "assignments": ["load_active_courses", "get_course_assignments"],
+}
+
+# Phrases that introduce a course name ("my grade in <course>")
+COURSE_MENTION = re.compile(r"\b(?:in|for|about|from|of)\s+(?:my\s+|the\s+)?([a-z0-9][a-z0-9 &\-]{2,})", re.I)
+COURSE_CODE = re.compile(r"\b[a-z]{3,4}\s?\d{3,4}[a-z]?\b", re.I)
+# Abbreviations such as "ML" or "SEPM" usually stand for a course
+UPPERCASE_ABBREVIATION = re.compile(r"\b(?!I\b)[A-Z]{2,5}\b")
+
+_compiled_types = {query_type: [re.compile(p) for p in patterns] for query_type, patterns in QUERY_TYPE_PATTERNS.items()}
+_compiled_time_frames = [re.compile(p) for p in TIME_FRAME_PATTERNS]
+
+
+class LocalQueryClassifier:
+    """
+    Rule-based classifier for formulaic queries
+
+    Produces the same JSON shape as OpenAIService.classify_query together with
+    a confidence score, so the LLM only has to be asked when the rules are
+    unsure (no or conflicting keywords, or a course mention that can't be resolved).
+    """
+
+    def classify(self, query: str, courses: Optional[List[Dict]] = None) -> Tuple[Dict, float]:
+        """
+        Classify a query locally
+
+        Returns the classification and a confidence between 0 and 1.
+        """
+        text = " ".join(query.lower().split())
+
+        matched = [query_type for query_type, patterns in _compiled_types.items()
+                   if any(pattern.search(text) for pattern in patterns)]
+        query_type, type_confidence = self._resolve_type(matched)
+
+        course, course_confidence = self._match_course(query, courses or [])
+        time_frame = next((m.group(0) for m in (p.search(text) for p in _compiled_time_frames) if m), None)
+
+        classification = {
+            "query_type": query_type,
+            "course": course["name"] if course else None,
+            "course_id": course["id"] if course else None,
+            "course_match_confidence": course_confidence if course else None,
+            "time_frame": time_frame,
+            "specific_item": None,
+            "api_calls": API_CALLS.get(query_type, ["load_active_courses"]),
+        }
+
+        confidence = type_confidence
+        if course is None and self._mentions_course(text, query):
+            # A course seems to be named but we couldn't resolve it
+            confidence *= 0.4
+        elif course_confidence == "medium":
+            confidence *= 0.85
+
+        logger.debug(f"Local classification: {query_type} (confidence {confidence:.2f})")
+        return classification, confidence
+
+    def _resolve_type(self, matched: List[str]) -> Tuple[str, float]:
+        if not matched:
+            return "general", 0.2
+        if len(matched) == 1:
+            return matched[0], 0.95
+        primary = matched[0]
+        if all(other in COMPATIBLE_TYPES[primary] for other in matched[1:]):
+            return primary, 0.9
+        return primary, 0.4
+
+    def _match_course(self, query: str, courses: List[Dict]) -> Tuple[Optional[Dict], Optional[str]]:
+        """Match a course mentioned in the query using the shared course index"""
+        if not courses:
+            return None, None
+        index = get_course_index(courses)
+
+        match = index.find_in_text(query)
+        if match is None:
+            mention = COURSE_MENTION.search(query)
+            if mention:
+                matches = index.resolve(mention.group(1), limit=1)
+                match = matches[0] if matches else None
+        if match is None or match.confidence == "low":
+            return None, None
+        return match.course, match.confidence
+
+    def _mentions_course(self, text: str, query: str) -> bool:
+        if COURSE_CODE.search(text) or UPPERCASE_ABBREVIATION.search(query):
+            return True
+        mention = COURSE_MENTION.search(text)
+        # "due in two days" or "for this week" are time phrases, not courses
+        return bool(mention) and not any(p.search(mention.group(0)) for p in _compiled_time_frames) \
+            and not re.match(r"(the next|next|this|two|three|\d+)\b", mention.group(1))
@@ -0,0 +1,183 @@
+import html
+import json
+import re
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, Optional, Tuple
+
+from app.logger import logger
+from app.models.canvas_data import Announcement, Assignment, Course, File, Module
+
+# Fields sent to the model for each record type
+DEFAULT_FIELDS: Dict[str, Tuple[str, ...]] = {
+    "course": ("id", "name", "course_code"),
+    "course_details": ("id", "name", "course_code", "term", "teachers", "syllabus_body"),
+    "assignment": ("id", "name", "due_at", "points_possible", "has_submitted_submissions", "submission"),
+    "module": ("name", "position", "items"),
+    "file": ("display_name", "size", "url"),
+    "announcement": ("title", "posted_at", "author", "message"),
+    "deadline": ("course_name", "assignment_name", "due_date", "points_possible", "submitted"),
+    "grade": ("assignment_name", "points_possible", "score", "submitted", "graded"),
+}
+
+# Narrower field sets for query types that never need the heavier fields.
+# Anything not listed here (general questions) gets the defaults, syllabus included.
+QUERY_TYPE_FIELDS: Dict[str, Dict[str, Tuple[str, ...]]] = {
+    "deadlines": {"course_details": ("id", "name", "course_code")},
+    "upcoming": {"course_details": ("id", "name", "course_code")},
+    "assignments": {"course_details": ("id", "name", "course_code", "teachers")},
+    "grades": {"course_details": ("id", "name", "course_code")},
+    "announcements": {"course_details": ("id", "name", "course_code", "teachers")},
+    "course_materials": {"course_details": ("id", "name", "course_code", "term", "teachers")},
+    "modules": {"course_details": ("id", "name", "course_code", "term", "teachers")},
+}
+
+# Parts of the student's own submission that say whether and how an assignment was handed in
+SUBMISSION_FIELDS = ("workflow_state", "submitted_at", "late", "missing", "score", "grade")
+
+# Longest rich-text body kept, in characters after stripping HTML
+MAX_TEXT_CHARS = {"syllabus_body": 2000, "message": 600}
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough token count for English text and JSON (about four characters per token)"""
+    return (len(text) + 3) // 4
+
+
+def strip_html(text: str) -> str:
+    """Reduce Canvas rich-text HTML to plain text"""
+    text = re.sub(r"<(br|/p|/div|/li|/h\d)[^>]*>", "\n", text, flags=re.IGNORECASE)
+    text = html.unescape(re.sub(r"<[^>]+>", "", text))
+    return re.sub(r"\n\s*\n+", "\n", re.sub(r"[ \t]+", " ", text)).strip()
+
+
+def _clip(field: str, text: str) -> str:
+    text = strip_html(text)
+    limit = MAX_TEXT_CHARS.get(field)
+    if limit and len(text) > limit:
+        return text[:limit].rsplit(" ", 1)[0] + "..."
+    return text
+
+
+def _simplify(field: str, value: Any) -> Any:
+    """Collapse nested Canvas objects to the part the model reads"""
+    if field == "term" and isinstance(value, dict):
+        return value.get("name")
+    if field == "teachers" and isinstance(value, list):
+        return [teacher.get("display_name") for teacher in value if isinstance(teacher, dict)]
+    if field == "author" and isinstance(value, dict):
+        return value.get("display_name")
+    if field == "submission" and isinstance(value, dict):
+        return {key: value[key] for key in SUBMISSION_FIELDS if value.get(key) is not None}
+    if field == "items" and isinstance(value, list):
+        return [{"title": item.get("title"), "type": item.get("type")} for item in value if isinstance(item, dict)]
+    if field in MAX_TEXT_CHARS and isinstance(value, str):
+        return _clip(field, value)
+    return value
+
+
+def _project(model: Callable, record: Dict, fields: Tuple[str, ...]) -> Dict:
+    if not isinstance(record, dict):
+        return record
+    instance = model(record)
+    projected = {}
+    for field in fields:
+        value = instance.get(field) if isinstance(instance, dict) else getattr(instance, field, None)
+        value = _simplify(field, value)
+        if value not in (None, "", [], {}):
+            projected[field] = value
+    return projected
+
+
+def _project_list(model: Callable, records: Any, fields: Tuple[str, ...]) -> Any:
+    if not isinstance(records, list):
+        return records
+    return [_project(model, record, fields) for record in records]
+
+
+def _project_grades(grades: Any, fields: Tuple[str, ...]) -> Any:
+    if not isinstance(grades, dict):
+        return grades
+    projected = dict(grades)
+    projected["assignments"] = _project_list(dict, grades.get("assignments") or [], fields)
+    return projected
+
+
+def _project_assignment_groups(groups: Any, fields: Tuple[str, ...]) -> Any:
+    if not isinstance(groups, list):
+        return groups
+    projected = []
+    for group in groups:
+        if not isinstance(group, dict):
+            continue
+        entry = {"name": group.get("name")}
+        if group.get("group_weight"):
+            entry["group_weight"] = group["group_weight"]
+        entry["assignments"] = _project_list(Assignment.from_dict, group.get("assignments") or [], fields)
+        projected.append(entry)
+    return projected
+
+
+def project_data(data: Dict, query_type: Optional[str] = None) -> Dict:
+    """
+    Keep only the fields of the query data the model needs for this query type
+
+    Canvas records are read through the Canvas models so the kept fields
+    follow them; deadlines and grades are already summaries and are trimmed
+    as plain dicts. Other keys (course_id, missing_data) pass through.
+    """
+    fields = dict(DEFAULT_FIELDS)
+    fields.update(QUERY_TYPE_FIELDS.get(query_type or "", {}))
+
+    projectors = {
+        "courses": lambda value: _project_list(Course.from_dict, value, fields["course"]),
+        "course_details": lambda value: _project(Course.from_dict, value, fields["course_details"]),
+        "assignments": lambda value: _project_assignment_groups(value, fields["assignment"]),
+        "modules": lambda value: _project_list(Module.from_dict, value, fields["module"]),
+        "files": lambda value: _project_list(File.from_dict, value, fields["file"]),
+        "announcements": lambda value: _project_list(Announcement.from_dict, value, fields["announcement"]),
+        "upcoming_deadlines": lambda value: _project_list(dict, value, fields["deadline"]),
+        "grades": lambda value: _project_grades(value, fields["grade"]),
+    }
+    return {key: projectors[key](value) if key in projectors else value for key, value in data.items()}
+
+
+def serialize_data(data: Dict) -> str:
+    """Compact JSON for the prompt: no indentation or separator padding"""
+    return json.dumps(data, separators=(",", ":"), ensure_ascii=False, default=str)
+
+
+@dataclass
+class ProjectionReport:
+    raw_bytes: int
+    projected_bytes: int
+    raw_tokens: int
+    projected_tokens: int
+
+    @property
+    def saved_ratio(self) -> float:
+        return 1 - self.projected_bytes / self.raw_bytes if self.raw_bytes else 0.0
+
+
+def prepare_prompt_data(data: Dict, query_type: Optional[str] = None) -> Tuple[Dict, str, ProjectionReport]:
+    """
+    Project and serialize the query data for the response prompt
+
+    Returns the projected data, its serialized form and a report comparing it
+    with the previous indented dump of the raw data. Measuring the raw dump
+    costs more than the projection, so queries only call this when debugging;
+    otherwise they use project_data.
+    """
+    projected = project_data(data, query_type)
+    serialized = serialize_data(projected)
+    raw = json.dumps(data, indent=2, default=str)
+    report = ProjectionReport(
+        raw_bytes=len(raw.encode()),
+        projected_bytes=len(serialized.encode()),
+        raw_tokens=estimate_tokens(raw),
+        projected_tokens=estimate_tokens(serialized),
+    )
+    logger.debug(
+        f"Prompt data for {query_type or 'unknown'} query: {report.raw_bytes:,} -> {report.projected_bytes:,} bytes "
+        f"(~{report.raw_tokens:,} -> ~{report.projected_tokens:,} tokens, {report.saved_ratio:.0%} saved)"
+    )
+    return projected, serialized, report
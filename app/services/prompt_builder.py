@@ -0,0 +1,278 @@
+import datetime
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from app.logger import logger
+from app.config import PROMPT_TOKEN_BUDGET, PROMPT_HISTORY_SHARE
+from app.prompt.canvasai import RESPONSE_GENERATION_PROMPT
+from app.services.projection import estimate_tokens, serialize_data
+from app.utils.date_utils import parse_canvas_date
+
+# Sections that are never cut down: small, and the answer is meaningless without them
+PINNED_SECTIONS = frozenset({"course_id", "missing_data"})
+
+# Marker key telling the model which sections were cut to fit the budget
+TRUNCATED_KEY = "truncated_data"
+
+
+def _due_rank(due: Optional[str], now: datetime.datetime) -> Tuple:
+    """Upcoming items nearest first, then past items most recent first, undated last"""
+    date = parse_canvas_date(due)
+    if date is None:
+        return (2, 0)
+    if date >= now:
+        return (0, (date - now).total_seconds())
+    return (1, (now - date).total_seconds())
+
+
+def _newest_first(date_field: str) -> Callable[[List[Dict], datetime.datetime], List[Dict]]:
+    def rank(items: List[Dict], now: datetime.datetime) -> List[Dict]:
+        def key(item):
+            date = parse_canvas_date(item.get(date_field)) if isinstance(item, dict) else None
+            return (0, -date.timestamp()) if date else (1, 0)
+        return sorted(items, key=key)
+    return rank
+
+
+def _nearest_first(date_field: str) -> Callable[[List[Dict], datetime.datetime], List[Dict]]:
+    def rank(items: List[Dict], now: datetime.datetime) -> List[Dict]:
+        return sorted(items, key=lambda item: _due_rank(item.get(date_field) if isinstance(item, dict) else None, now))
+    return rank
+
+
+def _graded_first(items: List[Dict], now: datetime.datetime) -> List[Dict]:
+    return sorted(items, key=lambda item: 0 if isinstance(item, dict) and item.get("graded") else 1)
+
+
+# How the items of a list are ordered before the tail is cut off; lists inside a dict section are named section.field
+RANKERS: Dict[str, Callable[[List[Dict], datetime.datetime], List[Dict]]] = {
+    "upcoming_deadlines": _nearest_first("due_date"),
+    "announcements": _newest_first("posted_at"),
+    "grades.assignments": _graded_first,
+}
+
+
+@dataclass
+class SectionReport:
+    name: str
+    tokens: int
+    allocated: int
+    sent: int
+    items: Optional[int] = None
+    kept: Optional[int] = None
+
+
+@dataclass
+class BudgetReport:
+    budget: int
+    fixed: int
+    history: int
+    history_sent: int
+    sections: List[SectionReport] = field(default_factory=list)
+
+    @property
+    def total(self) -> int:
+        return self.fixed + self.history_sent + sum(section.sent for section in self.sections)
+
+    @property
+    def truncated(self) -> List[str]:
+        return [section.name for section in self.sections if section.sent < section.tokens]
+
+    def summary(self) -> str:
+        parts = [f"fixed {self.fixed}", f"history {self.history_sent}/{self.history}"]
+        for section in self.sections:
+            part = f"{section.name} {section.sent}/{section.tokens}"
+            if section.kept is not None and section.kept < section.items:
+                part += f" ({section.kept}/{section.items} items)"
+            parts.append(part)
+        return f"~{self.total}/{self.budget} tokens: " + ", ".join(parts)
+
+
+class PromptBuilder:
+    """
+    Assembles the response prompt within a token budget
+
+    Tokens are estimated offline. After the fixed template and the query, a
+    share of the budget goes to the conversation history and the rest is
+    split across the data sections: small sections are sent whole and the
+    remainder is shared among the large ones, which are cut down by ranking
+    their items (nearest deadlines, newest announcements first) and dropping
+    the tail.
+    """
+
+    def __init__(self, budget: int = PROMPT_TOKEN_BUDGET, history_share: float = PROMPT_HISTORY_SHARE,
+                 template: str = RESPONSE_GENERATION_PROMPT):
+        self.budget = budget
+        self.history_share = history_share
+        self.template = template
+
+    def build(self, context: str, data: Dict, query: str,
+              now: Optional[datetime.datetime] = None) -> Tuple[List[Dict], BudgetReport]:
+        """Build the chat messages for a response request and report how the budget was spent"""
+        now = now or datetime.datetime.now(datetime.timezone.utc)
+        fixed = estimate_tokens(self.template.format(context="", data_str="")) + estimate_tokens(query)
+        available = max(self.budget - fixed, 0)
+
+        data_tokens = estimate_tokens(serialize_data(data))
+        history_tokens = estimate_tokens(context)
+        # History gets its share, plus whatever the data does not need
+        history_budget = max(int(available * self.history_share), available - data_tokens)
+        context = _clip_history(context, history_budget)
+        history_sent = estimate_tokens(context)
+
+        fitted, sections = self._fit_data(data, available - history_sent, now)
+        report = BudgetReport(self.budget, fixed, history_tokens, history_sent, sections)
+
+        message = f"Prompt budget {report.summary()}"
+        if report.truncated:
+            logger.warning(message)
+        else:
+            logger.info(message)
+
+        prompt = self.template.format(context=context, data_str=serialize_data(fitted))
+        return [
+            {"role": "system", "content": prompt},
+            {"role": "user", "content": query}
+        ], report
+
+    def _fit_data(self, data: Dict, budget: int, now: datetime.datetime) -> Tuple[Dict, List[SectionReport]]:
+        sizes = {key: estimate_tokens(serialize_data({key: value})) for key, value in data.items()}
+        pinned = sum(size for key, size in sizes.items() if key in PINNED_SECTIONS)
+        allocations = _share(
+            {key: size for key, size in sizes.items() if key not in PINNED_SECTIONS},
+            max(budget - pinned, 0)
+        )
+
+        fitted: Dict[str, Any] = {}
+        reports: List[SectionReport] = []
+        truncated: Dict[str, str] = {}
+        for key, value in data.items():
+            allocated = allocations.get(key, sizes[key])
+            items = _count_items(key, value)
+            kept = items
+            if sizes[key] > allocated:
+                if key == "assignments" and isinstance(value, list):
+                    value, kept = _fit_assignment_groups(value, allocated, now)
+                else:
+                    value, kept = _fit_value(key, value, allocated, now)
+                if items is not None:
+                    truncated[key] = f"showing {kept} of {items} items"
+                else:
+                    truncated[key] = "shortened"
+            fitted[key] = value
+            reports.append(SectionReport(key, sizes[key], allocated,
+                                         estimate_tokens(serialize_data({key: value})), items, kept))
+
+        if truncated:
+            fitted[TRUNCATED_KEY] = truncated
+        return fitted, reports
+
+
+def _count_items(key: str, value: Any) -> Optional[int]:
+    if not isinstance(value, list):
+        return None
+    if key == "assignments":
+        return sum(len(group.get("assignments") or []) for group in value if isinstance(group, dict))
+    return len(value)
+
+
+def _share(sizes: Dict[str, int], budget: int) -> Dict[str, int]:
+    """Split a budget so sections under the fair share get all they need and the rest share the remainder"""
+    allocations: Dict[str, int] = {}
+    remaining = dict(sizes)
+    while remaining:
+        fair = budget // len(remaining)
+        small = {key: size for key, size in remaining.items() if size <= fair}
+        if not small:
+            for key in remaining:
+                allocations[key] = fair
+            break
+        for key, size in small.items():
+            allocations[key] = size
+            budget -= size
+            del remaining[key]
+    return allocations
+
+
+def _fit_value(key: str, value: Any, budget: int, now: datetime.datetime) -> Tuple[Any, Optional[int]]:
+    """Cut a section down to about `budget` tokens; returns the value and the number of items kept"""
+    if isinstance(value, list):
+        ranked = RANKERS[key](value, now) if key in RANKERS else value
+        kept = _take(ranked, budget)
+        return kept, len(kept)
+    if isinstance(value, dict):
+        return _fit_dict(key, value, budget, now), None
+    if isinstance(value, str):
+        return _clip_text(value, budget), None
+    return value, None
+
+
+def _take(items: List, budget: int) -> List:
+    """Longest prefix of items that fits the budget"""
+    kept, used = [], 2
+    for item in items:
+        cost = estimate_tokens(serialize_data(item)) + 1
+        if used + cost > budget:
+            break
+        kept.append(item)
+        used += cost
+    return kept
+
+
+def _fit_dict(key: str, value: Dict, budget: int, now: datetime.datetime) -> Dict:
+    """Shrink the largest fields of a dict section (a syllabus, a grade list) until it fits"""
+    fitted = dict(value)
+    sizes = {field_name: estimate_tokens(serialize_data(field_value)) for field_name, field_value in fitted.items()}
+    for field_name in sorted(sizes, key=sizes.get, reverse=True):
+        total = sum(sizes.values())
+        if total <= budget:
+            break
+        field_budget = max(sizes[field_name] - (total - budget), 0)
+        fitted[field_name], _ = _fit_value(f"{key}.{field_name}", fitted[field_name], field_budget, now)
+        sizes[field_name] = estimate_tokens(serialize_data(fitted[field_name]))
+    return fitted
+
+
+def _fit_assignment_groups(groups: List[Dict], budget: int, now: datetime.datetime) -> Tuple[List[Dict], int]:
+    """Keep the assignments due soonest across all groups, preserving the group structure"""
+    entries = [(position, assignment) for position, group in enumerate(groups)
+               for assignment in (group.get("assignments") or [])]
+    ranked = sorted(entries, key=lambda entry: _due_rank(entry[1].get("due_at"), now))
+
+    overhead = sum(estimate_tokens(serialize_data({k: v for k, v in group.items() if k != "assignments"})) + 4
+                   for group in groups)
+    kept_ids = {id(assignment) for assignment in _take([assignment for _, assignment in ranked], budget - overhead)}
+
+    fitted = []
+    for group in groups:
+        assignments = [a for a in (group.get("assignments") or []) if id(a) in kept_ids]
+        if assignments:
+            fitted.append(dict(group, assignments=assignments))
+    return fitted, len(kept_ids)
+
+
+def _clip_text(text: str, budget: int) -> str:
+    limit = max(budget * 4 - 3, 0)
+    if len(text) <= limit:
+        return text
+    return text[:limit].rsplit(" ", 1)[0] + "..."
+
+
+def _clip_history(context: str, budget: int) -> str:
+    """Drop the oldest lines of the conversation history, keeping the current query line"""
+    if estimate_tokens(context) <= budget:
+        return context
+    lines = context.splitlines()
+    kept: List[str] = []
+    used = 0
+    for line in reversed(lines):
+        cost = estimate_tokens(line) + 1
+        if used + cost > budget:
+            # Keep the end of a long reply rather than dropping the whole exchange
+            room = (budget - used - 1) * 4 - 3
+            if room > 80:
+                kept.append("..." + line[-room:])
+            break
+        kept.append(line)
+        used += cost
+    return "\n".join(reversed(kept))
@@ -0,0 +1,60 @@
+import asyncio
+import contextvars
+import os
+import threading
+from typing import AsyncIterator, Awaitable, Iterator, Optional, TypeVar
+
+T = TypeVar("T")
+
+_loop: Optional[asyncio.AbstractEventLoop] = None
+_loop_pid: Optional[int] = None
+_loop_lock = threading.Lock()
+
+
+def get_background_loop() -> asyncio.AbstractEventLoop:
+    """
+    Get the process-wide event loop that runs coroutines for synchronous callers
+
+    The loop lives in a daemon thread so connection pools bound to it stay
+    warm between calls, and every request thread shares the same loop. A
+    forked worker process gets a loop of its own, as threads don't survive
+    a fork.
+    """
+    global _loop, _loop_pid
+    with _loop_lock:
+        if _loop is None or _loop.is_closed() or _loop_pid != os.getpid():
+            _loop = asyncio.new_event_loop()
+            _loop_pid = os.getpid()
+            threading.Thread(target=_loop.run_forever, name="canvasai-event-loop", daemon=True).start()
+        return _loop
+
+
+async def _in_context(awaitable: Awaitable[T], context: contextvars.Context) -> T:
+    # Tasks on the loop thread start from its context; carry over the caller's (e.g. the request trace)
+    for var, value in context.items():
+        var.set(value)
+    return await awaitable
+
+
+def run_sync(coro: Awaitable[T]) -> T:
+    """Run a coroutine on the background loop and block until it finishes"""
+    context = contextvars.copy_context()
+    return asyncio.run_coroutine_threadsafe(_in_context(coro, context), get_background_loop()).result()
+
+
+def iter_sync(agen: AsyncIterator[T]) -> Iterator[T]:
+    """
+    Iterate an async generator from synchronous code, one item at a time
+
+    Closing the returned iterator early also closes the async generator.
+    """
+    loop = get_background_loop()
+    try:
+        while True:
+            try:
+                step = _in_context(agen.__anext__(), contextvars.copy_context())
+                yield asyncio.run_coroutine_threadsafe(step, loop).result()
+            except StopAsyncIteration:
+                return
+    finally:
+        asyncio.run_coroutine_threadsafe(agen.aclose(), loop).result()
@@ -0,0 +1,437 @@
+import asyncio
+import atexit
+import base64
+import datetime
+import gzip
+import hashlib
+import json
+import threading
+import time
+from collections import Counter, defaultdict, deque
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Deque, Dict, Iterator, List, Optional, Tuple
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+
+import httpx
+
+from app.logger import logger
+from app.config import (
+    CANVAS_API_KEY,
+    CANVAS_API_URL,
+    OPENAI_API_KEY,
+    OPENAI_BASE_URL,
+    OPENAI_MODEL,
+    HTTP_CASSETTE_MODE,
+    HTTP_CASSETTE_PATH,
+    HTTP_CASSETTE_TIMING,
+)
+
+SCRUBBED = "REDACTED"
+# Query parameters that carry credentials
+SECRET_PARAMS = frozenset({"access_token", "api_key", "key", "token"})
+# Response headers never written to a cassette
+DROPPED_HEADERS = frozenset({"set-cookie", "authorization"})
+
+MISSING_BODY = json.dumps({"errors": [{"message": "No recorded response in the cassette"}]}).encode()
+
+
+@dataclass
+class Interaction:
+    """One recorded request and its response"""
+    service: str
+    method: str
+    url: str
+    # call_kind() of the request body
+    kind: str
+    request_digest: str
+    request_bytes: int
+    status: int
+    headers: List[Tuple[str, str]]
+    body: bytes
+    # Seconds from sending the request to the response headers, and to the end of each body chunk
+    elapsed: float
+    chunks: List[Tuple[float, int]] = field(default_factory=list)
+
+    def key(self, loose: bool = False) -> str:
+        return match_key(self.service, self.method, self.url, self.kind, loose)
+
+    def body_chunks(self) -> Iterator[Tuple[float, bytes]]:
+        """The body in the chunks it arrived in, with the time each one was complete"""
+        start = 0
+        for at, end in self.chunks or [(self.elapsed, len(self.body))]:
+            yield at, self.body[start:end]
+            start = end
+
+    def to_dict(self) -> Dict:
+        entry = {
+            "type": "http",
+            "service": self.service,
+            "method": self.method,
+            "url": self.url,
+            "kind": self.kind,
+            "request_digest": self.request_digest,
+            "request_bytes": self.request_bytes,
+            "status": self.status,
+            "headers": self.headers,
+            "elapsed": round(self.elapsed, 6),
+            "chunks": [(round(at, 6), end) for at, end in self.chunks],
+        }
+        try:
+            entry["body"] = self.body.decode("utf-8")
+        except UnicodeDecodeError:
+            entry["body_b64"] = base64.b64encode(self.body).decode("ascii")
+        return entry
+
+    @classmethod
+    def from_dict(cls, entry: Dict) -> "Interaction":
+        if "body_b64" in entry:
+            body = base64.b64decode(entry["body_b64"])
+        else:
+            body = entry.get("body", "").encode("utf-8")
+        return cls(
+            service=entry["service"],
+            method=entry["method"],
+            url=entry["url"],
+            kind=entry["kind"],
+            request_digest=entry["request_digest"],
+            request_bytes=entry["request_bytes"],
+            status=entry["status"],
+            headers=[tuple(header) for header in entry["headers"]],
+            body=body,
+            elapsed=entry["elapsed"],
+            chunks=[tuple(chunk) for chunk in entry.get("chunks", [])],
+        )
+
+
+def scrub_url(url: str) -> str:
+    """Blank credential query parameters out of a URL"""
+    parts = urlsplit(url)
+    if not parts.query:
+        return url
+    params = [(name, SCRUBBED if name.lower() in SECRET_PARAMS else value)
+              for name, value in parse_qsl(parts.query, keep_blank_values=True)]
+    return urlunsplit(parts._replace(query=urlencode(params)))
+
+
+def call_kind(body: bytes) -> str:
+    """
+    The kind of call a request body makes, e.g. "stream" or "json_object"
+
+    Model calls are matched on this rather than on the prompt, since prompts
+    change between versions while the calls they make should not.
+    """
+    if not body:
+        return ""
+    try:
+        payload = json.loads(body)
+    except ValueError:
+        return ""
+    if not isinstance(payload, dict):
+        return ""
+    kinds = []
+    if payload.get("stream"):
+        kinds.append("stream")
+    response_format = payload.get("response_format")
+    if isinstance(response_format, dict) and response_format.get("type"):
+        kinds.append(response_format["type"])
+    return " ".join(kinds)
+
+
+def match_key(service: str, method: str, url: str, kind: str, loose: bool = False) -> str:
+    """
+    What a replayed request must share with a recorded one
+
+    The loose key keeps only the names of the query parameters, for requests
+    whose values change from day to day, like the date window of the planner.
+    """
+    url = scrub_url(url)
+    if loose:
+        parts = urlsplit(url)
+        names = sorted({name for name, _ in parse_qsl(parts.query, keep_blank_values=True)})
+        url = urlunsplit(parts._replace(query="&".join(names)))
+    return f"{service} {method.upper()} {url} {kind}".rstrip()
+
+
+def _digest(body: bytes) -> str:
+    return hashlib.sha256(body or b"").hexdigest()[:16]
+
+
+class Cassette:
+    """
+    Gzipped JSON Lines file of HTTP interactions with Canvas and OpenAI
+
+    In record mode every request the app sends is written with its response
+    and timings, along with markers for the agent operations that sent them.
+    Credentials are scrubbed: authorization headers are never stored, and
+    API keys and bearer tokens are replaced wherever they appear. In replay
+    mode requests are answered from the file with the recorded timings, or
+    immediately, and the traffic is counted so runs can be compared.
+    """
+
+    def __init__(self, path: Path, mode: str, timing: str = "recorded"):
+        self.path = Path(path)
+        self.mode = mode
+        self.realtime = timing == "recorded"
+        self.header: Dict = {}
+        self.events: List[Dict] = []
+        # Replayed traffic per service: requests, request_bytes, response_bytes, unmatched
+        self.stats: Dict[str, Counter] = defaultdict(Counter)
+        self._secrets = {secret for secret in (CANVAS_API_KEY, OPENAI_API_KEY) if secret}
+        self._unplayed: Dict[str, Deque[Interaction]] = defaultdict(deque)
+        self._unplayed_loose: Dict[str, Deque[Interaction]] = defaultdict(deque)
+        self._last: Dict[str, Interaction] = {}
+        self._file = None
+        self._lock = threading.Lock()
+        if mode == "replay":
+            self._load()
+
+    @property
+    def recording(self) -> bool:
+        return self.mode == "record"
+
+    def _load(self):
+        try:
+            with gzip.open(self.path, "rt", encoding="utf-8") as f:
+                for line in f:
+                    self._load_entry(json.loads(line))
+        except EOFError:
+            # A recording server that was killed leaves the file without its gzip trailer
+            logger.warning(f"Cassette {self.path} was not closed cleanly; replaying the entries before the cut")
+        logger.info(f"Loaded {sum(len(queue) for queue in self._unplayed.values())} interactions from {self.path}")
+
+    def _load_entry(self, entry: Dict):
+        if entry["type"] == "header":
+            # Appended recordings start with a header each; the first one describes the file
+            self.header = self.header or entry
+        elif entry["type"] == "event":
+            self.events.append(entry)
+        else:
+            interaction = Interaction.from_dict(entry)
+            self._unplayed[interaction.key()].append(interaction)
+            self._unplayed_loose[interaction.key(loose=True)].append(interaction)
+
+    def scrub(self, text: str) -> str:
+        for secret in self._secrets:
+            text = text.replace(secret, SCRUBBED)
+        return text
+
+    def _write(self, entry: Dict):
+        with self._lock:
+            if self._file is None:
+                self.path.parent.mkdir(parents=True, exist_ok=True)
+                self._file = gzip.open(self.path, "at", encoding="utf-8")
+                self._file.write(json.dumps({
+                    "type": "header",
+                    "version": 1,
+                    "recorded_at": datetime.datetime.now(datetime.timezone.utc).isoformat(),
+                    "canvas_api_url": CANVAS_API_URL,
+                    "openai_base_url": OPENAI_BASE_URL,
+                    "openai_model": OPENAI_MODEL,
+                }) + "\n")
+            self._file.write(json.dumps(entry) + "\n")
+            # Flush per entry so a killed server still leaves a readable cassette
+            self._file.flush()
+
+    def close(self):
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+    def record(self, service: str, method: str, url: str, request_headers, body: bytes, status: int,
+               headers: List[Tuple[str, str]], content: bytes, elapsed: float,
+               chunks: Optional[List[Tuple[float, int]]] = None):
+        """Write one interaction with its credentials scrubbed"""
+        authorization = request_headers.get("authorization") or request_headers.get("Authorization")
+        if authorization and " " in authorization:
+            # Per-session Canvas tokens are only known from the requests they sign
+            with self._lock:
+                self._secrets.add(authorization.split(" ", 1)[1])
+
+        scrubbed = self.scrub(content.decode("utf-8", "surrogateescape")).encode("utf-8", "surrogateescape")
+        if len(scrubbed) != len(content):
+            # Chunk boundaries no longer line up with the body; keep the total time only
+            chunks = [(chunks[-1][0] if chunks else elapsed, len(scrubbed))]
+        url = self.scrub(scrub_url(url))
+        interaction = Interaction(
+            service=service,
+            method=method.upper(),
+            url=url,
+            kind=call_kind(body),
+            request_digest=_digest(body),
+            request_bytes=len(body),
+            status=status,
+            headers=[(name, self.scrub(value)) for name, value in headers if name.lower() not in DROPPED_HEADERS],
+            body=scrubbed,
+            elapsed=elapsed,
+            chunks=chunks or [],
+        )
+        self._write(interaction.to_dict())
+
+    def record_event(self, kind: str, credentials: Optional[str] = None, **data):
+        """Mark an agent operation; the session is tagged with a hash of its credentials, never the token"""
+        session = hashlib.sha256((credentials or "").encode()).hexdigest()[:12]
+        self._write({"type": "event", "kind": kind, "session": session, "at": time.time(), **data})
+
+    def lookup(self, service: str, method: str, url: str, body: bytes) -> Optional[Interaction]:
+        """
+        The recorded interaction that answers a request
+
+        Recordings of the same request are played in order, preferring one with
+        the same body, then recordings that only differ in query values. Once
+        they run out the last one is repeated; None means the request was never
+        recorded.
+        """
+        kind = call_kind(body)
+        keys = (match_key(service, method, url, kind), match_key(service, method, url, kind, loose=True))
+        digest = _digest(body)
+        with self._lock:
+            interaction = None
+            for key, unplayed in zip(keys, (self._unplayed, self._unplayed_loose)):
+                queue = unplayed.get(key)
+                if queue:
+                    interaction = next((candidate for candidate in queue if candidate.request_digest == digest),
+                                       queue[0])
+                    break
+            if interaction is not None:
+                self._unplayed[interaction.key()].remove(interaction)
+                self._unplayed_loose[interaction.key(loose=True)].remove(interaction)
+                self._last[keys[1]] = interaction
+            else:
+                interaction = self._last.get(keys[1])
+
+            counts = self.stats[service]
+            counts["requests"] += 1
+            counts["request_bytes"] += len(body)
+            if interaction is None:
+                counts["unmatched"] += 1
+            else:
+                counts["response_bytes"] += len(interaction.body)
+        if interaction is None:
+            logger.warning(f"No recorded response for {method} {scrub_url(url)}")
+        return interaction
+
+    def remaining(self, started: float, at: float) -> float:
+        """Seconds to wait so a replayed event happens `at` seconds after `started`, as recorded"""
+        if not self.realtime:
+            return 0.0
+        return max(at - (time.perf_counter() - started), 0.0)
+
+
+class _Recorder:
+    """Collects a response body as it streams through, then writes the interaction"""
+
+    def __init__(self, cassette: Cassette, service: str, request: httpx.Request, body: bytes,
+                 response: httpx.Response, started: float):
+        self.cassette = cassette
+        self.service = service
+        self.request = request
+        self.body = body
+        self.response = response
+        self.started = started
+        self.elapsed = time.perf_counter() - started
+        self.parts: List[bytes] = []
+        self.chunks: List[Tuple[float, int]] = []
+        self.size = 0
+
+    def add(self, chunk: bytes):
+        self.parts.append(chunk)
+        self.size += len(chunk)
+        self.chunks.append((time.perf_counter() - self.started, self.size))
+
+    def finish(self):
+        self.cassette.record(self.service, self.request.method, str(self.request.url), self.request.headers,
+                             self.body, self.response.status_code, list(self.response.headers.items()),
+                             b"".join(self.parts), self.elapsed, self.chunks)
+
+
+class _AsyncRecordingStream(httpx.AsyncByteStream):
+    def __init__(self, stream, recorder: _Recorder):
+        self.stream = stream
+        self.recorder = recorder
+
+    async def __aiter__(self):
+        async for chunk in self.stream:
+            self.recorder.add(chunk)
+            yield chunk
+
+    async def aclose(self):
+        await self.stream.aclose()
+        self.recorder.finish()
+
+
+class _AsyncReplayStream(httpx.AsyncByteStream):
+    def __init__(self, cassette: Cassette, interaction: Interaction, started: float):
+        self.cassette = cassette
+        self.interaction = interaction
+        self.started = started
+
+    async def __aiter__(self):
+        for at, chunk in self.interaction.body_chunks():
+            await asyncio.sleep(self.cassette.remaining(self.started, at))
+            yield chunk
+
+
+def _missing_response() -> httpx.Response:
+    return httpx.Response(404, headers={"Content-Type": "application/json"}, content=MISSING_BODY)
+
+
+class AsyncCassetteTransport(httpx.AsyncBaseTransport):
+    """httpx transport that records to or replays from a cassette"""
+
+    def __init__(self, cassette: Cassette, service: str, transport: Optional[httpx.AsyncBaseTransport] = None):
+        self.cassette = cassette
+        self.service = service
+        self.transport = transport or httpx.AsyncHTTPTransport()
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        body = await request.aread()
+        started = time.perf_counter()
+        if self.cassette.mode == "replay":
+            interaction = self.cassette.lookup(self.service, request.method, str(request.url), body)
+            if interaction is None:
+                return _missing_response()
+            await asyncio.sleep(self.cassette.remaining(started, interaction.elapsed))
+            return httpx.Response(interaction.status, headers=interaction.headers,
+                                  stream=_AsyncReplayStream(self.cassette, interaction, started))
+
+        response = await self.transport.handle_async_request(request)
+        recorder = _Recorder(self.cassette, self.service, request, body, response, started)
+        return httpx.Response(response.status_code, headers=response.headers,
+                              stream=_AsyncRecordingStream(response.stream, recorder), extensions=response.extensions)
+
+    async def aclose(self):
+        await self.transport.aclose()
+
+
+_cassette: Optional[Cassette] = None
+_cassette_lock = threading.Lock()
+
+
+def get_cassette() -> Optional[Cassette]:
+    """The process-wide cassette, or None unless HTTP_CASSETTE_MODE is record or replay"""
+    global _cassette
+    if HTTP_CASSETTE_MODE not in ("record", "replay"):
+        return None
+    with _cassette_lock:
+        if _cassette is None:
+            _cassette = Cassette(HTTP_CASSETTE_PATH, HTTP_CASSETTE_MODE, HTTP_CASSETTE_TIMING)
+            atexit.register(_cassette.close)
+            logger.info(f"HTTP cassette {HTTP_CASSETTE_MODE} mode: {HTTP_CASSETTE_PATH}")
+        return _cassette
+
+
+def record_event(kind: str, credentials: Optional[str] = None, **data):
+    """Mark an agent operation in the cassette being recorded, if any"""
+    cassette = get_cassette()
+    if cassette is not None and cassette.recording:
+        cassette.record_event(kind, credentials, **data)
+
+
+def async_httpx_transport(service: str, **kwargs) -> Optional[httpx.AsyncBaseTransport]:
+    """An async httpx transport for `service` going through the cassette, or None for httpx's default"""
+    cassette = get_cassette()
+    if cassette is None:
+        return None
+    return AsyncCassetteTransport(cassette, service, httpx.AsyncHTTPTransport(**kwargs))
@@ -1,81 +1,98 @@
 import sys
 import threading
 import itertools
-import time
-from typing import Optional
+from typing import List, Optional
 
-from app.config import SHOW_LOGS
+from app.utils.tracing import Span, SpanSink, add_sink, remove_sink
 
-class LoadingAnimation:
+FRAMES = {
+    "dots": [".  ", ".. ", "..."],
+    "spinner": ["⠋", "⠙", "⠹", "⠸", "⠼", "⠴", "⠦", "⠧", "⠇", "⠏"],
+    "bar": ["|", "/", "-", "\\"],
+}
+
+
+class ConsoleSpinner(SpanSink):
     """
-    Displays a loading animation in the console while a task is running.
+    Shows the phase in progress on the console while a query runs
+
+    A tracing sink: spans opened with a `message` attribute are displayed
+    with an animation. One daemon thread draws all frames and sleeps while
+    no phase is running, so opening and closing a phase never waits on it.
     Usage:
-        with LoadingAnimation("Loading data..."):
+        enable_console_spinner()
+        with span("courses", message="Fetching course information"):
             # do some long task
-        # animation automatically stops when context exits
     """
-    
-    def __init__(self, message: str = "Processing", animation_type: str = "dots"):
-        self.message = message
-        self.animation_type = animation_type
-        self.is_running = False
-        self.animation_thread = None
-    
-    def __enter__(self):
-        self.start()
-        return self
-    
-    def __exit__(self, exc_type, exc_val, exc_tb):
-        self.stop()
-    
-    def start(self):
-        """Start the loading animation in a separate thread"""
-        self.is_running = True
-        self.animation_thread = threading.Thread(target=self._animate)
-        self.animation_thread.daemon = True
-        self.animation_thread.start()
-        
-    def stop(self):
-        """Stop the loading animation"""
-        self.is_running = False
-        if self.animation_thread:
-            self.animation_thread.join()
-        # Clear the animation line
-        sys.stdout.write("\r" + " " * (len(self.message) + 20) + "\r")
-        sys.stdout.flush()
-    
+
+    def __init__(self, animation_type: str = "spinner", interval: float = 0.1):
+        self.frames = FRAMES.get(animation_type, FRAMES["dots"])
+        self.interval = interval
+        self._active: List[Span] = []
+        self._shown = ""
+        self._changed = threading.Condition()
+        self._closed = False
+        self._thread: Optional[threading.Thread] = None
+
+    def on_start(self, span: Span):
+        if "message" not in span.attrs:
+            return
+        with self._changed:
+            self._active.append(span)
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._animate, daemon=True)
+                self._thread.start()
+            self._changed.notify()
+
+    def on_end(self, span: Span):
+        if "message" not in span.attrs:
+            return
+        with self._changed:
+            if span in self._active:
+                self._active.remove(span)
+            self._changed.notify()
+
+    def close(self):
+        with self._changed:
+            self._closed = True
+            self._changed.notify()
+
     def _animate(self):
-        """Animation loop that runs in a separate thread"""
-        if self.animation_type == "dots":
-            chars = itertools.cycle([".  ", ".. ", "..."])
-        elif self.animation_type == "spinner":
-            chars = itertools.cycle(["⠋", "⠙", "⠹", "⠸", "⠼", "⠴", "⠦", "⠧", "⠇", "⠏"])
-        elif self.animation_type == "bar":
-            chars = itertools.cycle(["|", "/", "-", "\\"])
-        else:  # Default to dots
-            chars = itertools.cycle([".  ", ".. ", "..."])
-            
-        while self.is_running:
-            char = next(chars)
-            # Display animation regardless of SHOW_LOGS setting
-            sys.stdout.write(f"\r{self.message} {char}")
-            sys.stdout.flush()
-            time.sleep(0.1)
-
-
-def timed_action(message: str, animation_type: str = "dots"):
-    """
-    Decorator to show loading animation during function execution
-    
-    Example:
-        @timed_action("Fetching data")
-        def fetch_data():
-            # do something that takes time
-    """
-    def decorator(func):
-        def wrapper(*args, **kwargs):
-            with LoadingAnimation(message, animation_type):
-                result = func(*args, **kwargs)
-            return result
-        return wrapper
-    return decorator
+        """Animation loop shared by every phase"""
+        frames = itertools.cycle(self.frames)
+        with self._changed:
+            while not self._closed:
+                if self._active:
+                    self._draw(f"{self._active[-1].attrs['message']} {next(frames)}")
+                    self._changed.wait(self.interval)
+                else:
+                    self._draw("")
+                    self._changed.wait()
+
+    def _draw(self, text: str):
+        # Display animation regardless of SHOW_LOGS setting
+        if text == self._shown:
+            return
+        sys.stdout.write("\r" + " " * len(self._shown) + "\r" + text)
+        sys.stdout.flush()
+        self._shown = text
+
+
+_spinner: Optional[ConsoleSpinner] = None
+
+
+def enable_console_spinner(animation_type: str = "spinner") -> ConsoleSpinner:
+    """Show traced phases on the console (desktop mode)"""
+    global _spinner
+    if _spinner is None:
+        _spinner = ConsoleSpinner(animation_type)
+        add_sink(_spinner)
+    return _spinner
+
+
+def disable_console_spinner():
+    global _spinner
+    if _spinner is not None:
+        remove_sink(_spinner)
+        _spinner.close()
+        _spinner = None
@@ -0,0 +1,263 @@
+import threading
+from bisect import bisect_left
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+
+# Latency buckets in seconds, from a cached Canvas page to a long generation
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+class _Child:
+    """The value of a metric for one combination of label values"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._value = 0.0
+        self._function: Optional[Callable[[], float]] = None
+
+    def inc(self, amount: float = 1.0):
+        with self._lock:
+            self._value += amount
+
+    def dec(self, amount: float = 1.0):
+        with self._lock:
+            self._value -= amount
+
+    def set(self, value: float):
+        with self._lock:
+            self._value = value
+
+    def set_function(self, function: Callable[[], float]):
+        """Read the value from `function` at scrape time, for state kept elsewhere"""
+        self._function = function
+
+    @contextmanager
+    def track(self) -> Iterator[None]:
+        """Count a block as in flight while it runs"""
+        self.inc()
+        try:
+            yield
+        finally:
+            self.dec()
+
+    def get(self) -> float:
+        if self._function is not None:
+            return float(self._function())
+        return self._value
+
+
+class _HistogramChild:
+    def __init__(self, buckets: Sequence[float]):
+        self._lock = threading.Lock()
+        self._buckets = buckets
+        # One count per bucket plus +Inf; made cumulative when rendered
+        self._counts = [0] * (len(buckets) + 1)
+        self._sum = 0.0
+
+    def observe(self, value: float):
+        index = bisect_left(self._buckets, value)
+        with self._lock:
+            self._counts[index] += 1
+            self._sum += value
+
+    def snapshot(self) -> Tuple[List[int], float]:
+        with self._lock:
+            return list(self._counts), self._sum
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, documentation: str, labels: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.label_names = tuple(labels)
+        self._children: Dict[Tuple[str, ...], object] = {}
+        self._lock = threading.Lock()
+
+    def labels(self, *values):
+        """The child for these label values, created on first use"""
+        key = tuple(str(value) for value in values)
+        child = self._children.get(key)
+        if child is None:
+            if len(key) != len(self.label_names):
+                raise ValueError(f"{self.name} expects labels {self.label_names}, got {key}")
+            with self._lock:
+                child = self._children.setdefault(key, self._new_child())
+        return child
+
+    def _new_child(self):
+        return _Child()
+
+    def _label_text(self, values: Tuple[str, ...], extra: str = "") -> str:
+        pairs = [f'{name}="{_escape(value)}"' for name, value in zip(self.label_names, values)]
+        if extra:
+            pairs.append(extra)
+        return "{" + ",".join(pairs) + "}" if pairs else ""
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        with self._lock:
+            children = sorted(self._children.items())
+        for values, child in children:
+            lines.extend(self._render_child(values, child))
+        return lines
+
+    def _render_child(self, values, child) -> List[str]:
+        return [f"{self.name}{self._label_text(values)} {_number(child.get())}"]
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, amount: float = 1.0):
+        self.labels().inc(amount)
+
+
+class Gauge(_Metric):
+    kind = "gauge"
+
+    def inc(self, amount: float = 1.0):
+        self.labels().inc(amount)
+
+    def dec(self, amount: float = 1.0):
+        self.labels().dec(amount)
+
+    def set(self, value: float):
+        self.labels().set(value)
+
+    def set_function(self, function: Callable[[], float]):
+        self.labels().set_function(function)
+
+    def track(self):
+        return self.labels().track()
+
+
+class Histogram(_Metric):
+    """Counts observations into fixed buckets; observing is a bisect and an increment under a lock"""
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labels: Sequence[str] = (),
+                 buckets: Sequence[float] = DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labels)
+        self.buckets = tuple(sorted(buckets))
+
+    def _new_child(self):
+        return _HistogramChild(self.buckets)
+
+    def observe(self, value: float):
+        self.labels().observe(value)
+
+    def _render_child(self, values, child) -> List[str]:
+        counts, total = child.snapshot()
+        lines = []
+        cumulative = 0
+        for bound, count in zip(self.buckets + (float("inf"),), counts):
+            cumulative += count
+            le = "+Inf" if bound == float("inf") else _number(bound)
+            bucket_labels = self._label_text(values, f'le="{le}"')
+            lines.append(f"{self.name}_bucket{bucket_labels} {cumulative}")
+        lines.append(f"{self.name}_sum{self._label_text(values)} {_number(total)}")
+        lines.append(f"{self.name}_count{self._label_text(values)} {cumulative}")
+        return lines
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _number(value: float) -> str:
+    if value == int(value) and abs(value) < 1e15:
+        return str(int(value))
+    return repr(float(value))
+
+
+class Registry:
+    """The metrics of this process, rendered in the Prometheus text format"""
+
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+        self._lock = threading.Lock()
+
+    def register(self, metric: _Metric) -> _Metric:
+        with self._lock:
+            if metric.name in self._metrics:
+                raise ValueError(f"Metric {metric.name} is already registered")
+            self._metrics[metric.name] = metric
+        return metric
+
+    def render(self) -> str:
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines = []
+        for metric in metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+# The content type of render()'s output
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+def counter(name: str, documentation: str, labels: Sequence[str] = ()) -> Counter:
+    return REGISTRY.register(Counter(name, documentation, labels))
+
+
+def gauge(name: str, documentation: str, labels: Sequence[str] = ()) -> Gauge:
+    return REGISTRY.register(Gauge(name, documentation, labels))
+
+
+def histogram(name: str, documentation: str, labels: Sequence[str] = (),
+              buckets: Sequence[float] = DEFAULT_BUCKETS) -> Histogram:
+    return REGISTRY.register(Histogram(name, documentation, labels, buckets))
+
+
+def render() -> str:
+    return REGISTRY.render()
+
+
+# Canvas API
+CANVAS_REQUEST_SECONDS = histogram(
+    "canvasai_canvas_request_duration_seconds", "Canvas API requests including retries, by endpoint", ["endpoint"])
+CANVAS_RESPONSES = counter(
+    "canvasai_canvas_responses_total", "Canvas API responses by endpoint and status code", ["endpoint", "status"])
+CANVAS_RATE_LIMIT_REMAINING = gauge(
+    "canvasai_canvas_rate_limit_remaining", "X-Rate-Limit-Remaining of the latest Canvas response")
+CANVAS_REQUEST_COST = counter(
+    "canvasai_canvas_request_cost_total", "Sum of the X-Request-Cost Canvas charged against the rate limit")
+CANVAS_IN_FLIGHT = gauge("canvasai_canvas_requests_in_flight", "Canvas API requests in flight")
+MODULE_ITEMS = counter(
+    "canvasai_canvas_module_items_total",
+    "Modules whose items Canvas inlined, or that needed a request for their items (inlined/fetched)", ["source"])
+
+# Language model
+LLM_REQUEST_SECONDS = histogram(
+    "canvasai_llm_request_duration_seconds",
+    "Language model calls by purpose; for streams, the wait for the response headers", ["purpose"])
+LLM_ERRORS = counter("canvasai_llm_errors_total", "Failed language model calls by purpose", ["purpose"])
+LLM_TOKENS = counter("canvasai_llm_tokens_total", "Tokens used by purpose and kind (prompt/completion)",
+                     ["purpose", "kind"])
+LLM_IN_FLIGHT = gauge("canvasai_llm_requests_in_flight", "Language model calls in flight")
+
+# Caches and web app, read from their own counters when scraped
+CACHE_LOOKUPS = counter("canvasai_cache_lookups_total", "Cache lookups by cache and result", ["cache", "result"])
+HTTP_REQUEST_SECONDS = histogram(
+    "canvasai_http_request_duration_seconds", "Web requests by route, until the last byte of a stream", ["route"])
+HTTP_IN_FLIGHT = gauge("canvasai_http_requests_in_flight", "Web requests in flight, including open streams")
+AGENT_SESSIONS = gauge("canvasai_agent_sessions", "Session agents in the pool")
+
+# Speculative prefetch
+PREFETCH_FETCHES = counter(
+    "canvasai_prefetch_fetches_total", "Speculative Canvas fetches by result (speculated/used/wasted)", ["result"])
+PREFETCH_WASTED_BYTES = counter(
+    "canvasai_prefetch_wasted_bytes_total", "Bytes of speculative fetches that finished but were not used")
+
+# Background sync
+SYNC_USERS = gauge("canvasai_sync_users", "Users whose Canvas data is kept in sync")
+SYNC_QUEUE_DEPTH = gauge("canvasai_sync_queue_depth", "Sync jobs that are due and waiting to run")
+SYNC_LAG_SECONDS = gauge("canvasai_sync_lag_seconds", "How long the most overdue sync job has been waiting")
+SYNC_JOBS = counter("canvasai_sync_jobs_total", "Sync jobs run by data key and result", ["key", "result"])
+SYNC_CANVAS_REQUESTS = counter("canvasai_sync_canvas_requests_total", "Canvas requests made by the sync")
+
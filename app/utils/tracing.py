@@ -0,0 +1,171 @@
+import contextvars
+import json
+import re
+import threading
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from typing import Dict, Iterator, List, Optional
+
+from app.logger import logger
+
+
+# Compared by identity: concurrent spans can share a name and attributes, as overlapping queries do
+@dataclass(eq=False)
+class Span:
+    name: str
+    start: float
+    end: Optional[float] = None
+    attrs: Dict = field(default_factory=dict)
+    children: List["Span"] = field(default_factory=list)
+
+    @property
+    def duration(self) -> float:
+        return (self.end if self.end is not None else time.perf_counter()) - self.start
+
+    def to_dict(self) -> Dict:
+        entry = {"name": self.name, "ms": round(self.duration * 1000, 1)}
+        entry.update(self.attrs)
+        if self.children:
+            entry["spans"] = [child.to_dict() for child in self.children]
+        return entry
+
+
+class Trace:
+    """
+    Spans recorded while handling one request
+
+    Spans nest through a context variable, so a span opened in an asyncio
+    task created inside another span becomes its child. Timings come from
+    the monotonic perf_counter clock.
+    """
+
+    def __init__(self, name: str):
+        self.root = Span(name, time.perf_counter())
+        self._lock = threading.Lock()
+
+    def add(self, parent: Span, child: Span):
+        with self._lock:
+            parent.children.append(child)
+
+    def finish(self):
+        self.root.end = time.perf_counter()
+
+    def totals(self) -> Dict[str, Dict]:
+        """Total time and count per span name; spans of the same name running concurrently add up"""
+        totals: Dict[str, Dict] = {}
+        with self._lock:
+            pending = list(self.root.children)
+            while pending:
+                span = pending.pop()
+                entry = totals.setdefault(span.name, {"ms": 0.0, "count": 0})
+                entry["ms"] += span.duration * 1000
+                entry["count"] += 1
+                pending.extend(span.children)
+        return totals
+
+    def server_timing(self) -> str:
+        """The spans as a Server-Timing header value, one metric per span name plus the total"""
+        metrics = []
+        for name, entry in self.totals().items():
+            metric = f"{_token(name)};dur={entry['ms']:.1f}"
+            if entry["count"] > 1:
+                metric += f';desc="{entry["count"]} calls"'
+            metrics.append(metric)
+        metrics.append(f"total;dur={self.root.duration * 1000:.1f}")
+        return ", ".join(metrics)
+
+    def to_dict(self) -> Dict:
+        with self._lock:
+            return self.root.to_dict()
+
+
+def _token(name: str) -> str:
+    return re.sub(r"[^A-Za-z0-9_.-]", "_", name)
+
+
+class SpanSink:
+    """Receives every span as it starts and ends, e.g. to show progress on the console"""
+
+    def on_start(self, span: Span):
+        pass
+
+    def on_end(self, span: Span):
+        pass
+
+
+_current_trace: contextvars.ContextVar[Optional[Trace]] = contextvars.ContextVar("trace", default=None)
+_current_span: contextvars.ContextVar[Optional[Span]] = contextvars.ContextVar("span", default=None)
+_sinks: List[SpanSink] = []
+
+
+def add_sink(sink: SpanSink):
+    _sinks.append(sink)
+
+
+def remove_sink(sink: SpanSink):
+    if sink in _sinks:
+        _sinks.remove(sink)
+
+
+def current_trace() -> Optional[Trace]:
+    return _current_trace.get()
+
+
+@contextmanager
+def span(name: str, **attrs) -> Iterator[Optional[Span]]:
+    """
+    Time a block as a span of the current trace
+
+    Outside a trace the span is only shown to the sinks; with neither a
+    trace nor a sink this costs a context variable lookup.
+    """
+    trace = _current_trace.get()
+    if trace is None and not _sinks:
+        yield None
+        return
+
+    current = Span(name, time.perf_counter(), attrs=attrs)
+    if trace is not None:
+        trace.add(_current_span.get() or trace.root, current)
+    token = _current_span.set(current)
+    for sink in _sinks:
+        sink.on_start(current)
+    try:
+        yield current
+    finally:
+        current.end = time.perf_counter()
+        _current_span.reset(token)
+        for sink in _sinks:
+            sink.on_end(current)
+
+
+def record_span(name: str, start: float, **attrs) -> Optional[Span]:
+    """
+    Add a span that started at `start` (perf_counter) and ends now
+
+    For work that can't be wrapped in span(), like an async generator that
+    yields in between: the current span must not change across a yield.
+    """
+    trace = _current_trace.get()
+    if trace is None:
+        return None
+    recorded = Span(name, start, time.perf_counter(), attrs)
+    trace.add(_current_span.get() or trace.root, recorded)
+    return recorded
+
+
+@contextmanager
+def start_trace(name: str, log: bool = True) -> Iterator[Trace]:
+    """Record the spans of a request; unless log is False, a structured timing line is logged when it ends"""
+    trace = Trace(name)
+    trace_token = _current_trace.set(trace)
+    span_token = _current_span.set(None)
+    try:
+        yield trace
+    finally:
+        trace.finish()
+        _current_span.reset(span_token)
+        _current_trace.reset(trace_token)
+        if log:
+            logger.info(f"Request timing {json.dumps(trace.to_dict(), default=str)}")
@@ -0,0 +1,8 @@
+"""
+Offline benchmarks for Canvas AI.
+
+Each benchmark runs against local stand-in servers so it can be executed
+without Canvas or OpenAI credentials, e.g.:
+
+    python -m benchmarks.bench_transport
+"""
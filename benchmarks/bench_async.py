@@ -0,0 +1,118 @@
+"""
+Throughput and latency of concurrent queries: blocking callers on a thread
+per query, as web request threads call the agent, versus queries gathered
+directly on one event loop.
+
+Both run the full query path (courses, classification, Canvas fetches,
+response generation) against the mock Canvas and mock OpenAI servers, with
+every cache disabled so each query pays its real round trips.
+
+    python -m benchmarks.bench_async --levels 1 8 32 --rounds 3
+"""
+import argparse
+import asyncio
+import contextlib
+import io
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from benchmarks.mock_canvas import MockCanvasData, MockCanvasServer
+from benchmarks.mock_openai import MockOpenAIServer
+
+QUERIES = ["What's due this week?", "What assignments do I have coming up?", "Any new announcements?"]
+
+
+def _percentile(samples, pct):
+    ordered = sorted(samples)
+    return ordered[min(int(round(pct / 100 * (len(ordered) - 1))), len(ordered) - 1)]
+
+
+def _report(label, level, elapsed, latencies):
+    print(f"  {label:<8} concurrency={level:<3} {len(latencies) / elapsed:7.1f} queries/s  "
+          f"p50={_percentile(latencies, 50) * 1000:7.1f}ms p95={_percentile(latencies, 95) * 1000:7.1f}ms")
+
+
+def _blocking_query(agent, query: str) -> float:
+    """A blocking caller, as a web request thread is; the pipeline itself runs on the shared background loop"""
+    start = time.perf_counter()
+    agent.process_query(query)
+    return time.perf_counter() - start
+
+
+async def _async_query(agent, query: str) -> float:
+    start = time.perf_counter()
+    await agent.aprocess_query(query)
+    return time.perf_counter() - start
+
+
+def run(levels, rounds: int, canvas_latency: float, first_token_latency: float, tokens: int):
+    with MockCanvasServer(MockCanvasData(n_courses=6), latency=canvas_latency) as canvas, \
+            MockOpenAIServer(first_token_latency, 0.0, tokens) as openai_server:
+        # Settings are read at import time, so point the app at the mock servers first
+        os.environ.update({
+            "CANVAS_API_URL": canvas.url,
+            "CANVAS_API_KEY": "test",
+            "OPENAI_BASE_URL": openai_server.url,
+            "OPENAI_API_KEY": "test",
+            "OPENAI_MODEL": "mock",
+            "CANVAS_CACHE_ENABLED": "False",
+            "LOCAL_CLASSIFIER_ENABLED": "False",
+            "CLASSIFICATION_CACHE_ENABLED": "False",
+            "ANSWER_CACHE_ENABLED": "False",
+            "CANVAS_STORE_ENABLED": "False",
+            "SHOW_LOGS": "False",
+        })
+        from app.agent.canvasai import CanvasAI
+        from app.services.async_openai_service import close_async_openai
+
+        print(f"canvas latency={canvas_latency * 1000:.0f}ms, model latency={first_token_latency * 1000:.0f}ms, "
+              f"{rounds} rounds per level")
+        # The console spinner writes to stdout; keep it out of the report
+        with contextlib.redirect_stdout(io.StringIO()):
+            results = []
+            for level in levels:
+                queries = [QUERIES[i % len(QUERIES)] for i in range(level * rounds)]
+
+                start = time.perf_counter()
+                threaded = []
+                agents = [CanvasAI() for _ in range(level)]
+                with ThreadPoolExecutor(max_workers=level) as executor:
+                    for round_start in range(0, len(queries), level):
+                        batch = queries[round_start:round_start + level]
+                        threaded += executor.map(_blocking_query, agents, batch)
+                results.append(("threads", level, time.perf_counter() - start, threaded))
+
+                async def gather_rounds():
+                    latencies = []
+                    agents = [CanvasAI() for _ in range(level)]
+                    for round_start in range(0, len(queries), level):
+                        batch = queries[round_start:round_start + level]
+                        latencies += await asyncio.gather(*(_async_query(agent, query)
+                                                            for agent, query in zip(agents, batch)))
+                    # Close the pools bound to this loop before asyncio.run() closes it
+                    await close_async_openai()
+                    await agents[0].canvas_client.transport.aclose()
+                    return latencies
+
+                start = time.perf_counter()
+                gathered = asyncio.run(gather_rounds())
+                results.append(("asyncio", level, time.perf_counter() - start, gathered))
+
+    for label, level, elapsed, latencies in results:
+        _report(label, level, elapsed, latencies)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--levels", type=int, nargs="+", default=[1, 8, 32])
+    parser.add_argument("--rounds", type=int, default=3)
+    parser.add_argument("--canvas-latency", type=float, default=0.05)
+    parser.add_argument("--first-token-latency", type=float, default=0.3)
+    parser.add_argument("--tokens", type=int, default=50)
+    args = parser.parse_args()
+    run(args.levels, args.rounds, args.canvas_latency, args.first_token_latency, args.tokens)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,69 @@
+"""
+Accuracy and latency of the local query classifier on a labeled query set.
+
+Reports how many queries the local classifier answers on its own (confidence
+at or above the threshold), how accurate those answers are, and lists the
+confident mistakes, which are the ones that skip the LLM wrongly.
+
+    python -m benchmarks.bench_classifier --threshold 0.8
+"""
+import argparse
+import json
+import statistics
+import time
+from pathlib import Path
+
+from app.config import LOCAL_CLASSIFIER_THRESHOLD
+from app.services.local_classifier import LocalQueryClassifier
+
+DATASET = Path(__file__).parent / "data" / "classifier_queries.json"
+
+
+def run(dataset: Path, threshold: float, repeat: int):
+    labeled = json.loads(dataset.read_text())
+    courses, queries = labeled["courses"], labeled["queries"]
+    classifier = LocalQueryClassifier()
+
+    latencies = []
+    answered = correct_answered = correct_overall = 0
+    mistakes = []
+    for example in queries:
+        for _ in range(repeat):
+            start = time.perf_counter()
+            classification, confidence = classifier.classify(example["query"], courses)
+            latencies.append(time.perf_counter() - start)
+
+        correct = (classification["query_type"] == example["query_type"]
+                   and classification["course_id"] == example["course_id"])
+        correct_overall += correct
+        if confidence >= threshold:
+            answered += 1
+            correct_answered += correct
+            if not correct:
+                mistakes.append((example, classification, confidence))
+
+    latencies.sort()
+    total = len(queries)
+    print(f"queries:             {total}")
+    print(f"answered locally:    {answered} ({answered / total:.0%}) at threshold {threshold}")
+    print(f"accuracy (answered): {correct_answered / answered:.0%}" if answered else "accuracy (answered): n/a")
+    print(f"accuracy (all):      {correct_overall / total:.0%}")
+    print(f"latency p50/p95:     {statistics.median(latencies) * 1e6:.0f}us / "
+          f"{latencies[int(0.95 * (len(latencies) - 1))] * 1e6:.0f}us")
+    for example, classification, confidence in mistakes:
+        print(f"  confident mistake: {example['query']!r} -> {classification['query_type']}/"
+              f"{classification['course_id']} (expected {example['query_type']}/{example['course_id']}, "
+              f"confidence {confidence:.2f})")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--dataset", type=Path, default=DATASET)
+    parser.add_argument("--threshold", type=float, default=LOCAL_CLASSIFIER_THRESHOLD)
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+    run(args.dataset, args.threshold, args.repeat)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,60 @@
+"""
+Build and lookup cost of the course index for growing course lists.
+
+    python -m benchmarks.bench_course_index --courses 10 100 1000
+"""
+import argparse
+import statistics
+import time
+
+from app.services.course_index import CourseIndex, get_course_index
+
+SUBJECTS = ["Algorithms and Analysis", "Database Concepts", "Machine Learning", "Web Programming",
+            "Software Engineering Project Management", "Introduction to Statistics", "Computer Networks",
+            "Operating Systems Principles", "Cloud Computing", "Data Visualisation"]
+MENTIONS = ["algo", "COSC2003", "machine learning", "SEPM", "statistics", "web prog", "networks", "unknown subject"]
+
+
+def make_courses(n_courses: int):
+    return [{
+        "id": 1000 + i,
+        "name": SUBJECTS[i % len(SUBJECTS)] + ("" if i < len(SUBJECTS) else f" {i // len(SUBJECTS) + 1}"),
+        "course_code": f"COSC{2000 + i}",
+    } for i in range(n_courses)]
+
+
+def run(course_counts, repeat: int):
+    print(f"{'courses':>7} {'build':>10} {'cached':>10} {'resolve p50':>12} {'resolve p95':>12}")
+    for n_courses in course_counts:
+        courses = make_courses(n_courses)
+
+        start = time.perf_counter()
+        CourseIndex(courses)
+        build = time.perf_counter() - start
+
+        get_course_index(courses)
+        start = time.perf_counter()
+        index = get_course_index(courses)
+        cached = time.perf_counter() - start
+
+        samples = []
+        for _ in range(repeat):
+            for mention in MENTIONS:
+                start = time.perf_counter()
+                index.resolve(mention)
+                samples.append(time.perf_counter() - start)
+        samples.sort()
+        print(f"{n_courses:>7} {build * 1000:>8.2f}ms {cached * 1000:>8.3f}ms "
+              f"{statistics.median(samples) * 1e6:>10.0f}us {samples[int(0.95 * (len(samples) - 1))] * 1e6:>10.0f}us")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--courses", type=int, nargs="+", default=[10, 100, 1000])
+    parser.add_argument("--repeat", type=int, default=50)
+    args = parser.parse_args()
+    run(args.courses, args.repeat)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,56 @@
+"""
+Latency of the per-course deadline scan vs. number of enrolled courses,
+fetching courses one at a time and with the bounded concurrent fan-out.
+
+    python -m benchmarks.bench_deadlines --latency 0.05 --courses 1 2 4 8 16
+"""
+import argparse
+import statistics
+import time
+
+from app.api.async_transport import AsyncCanvasTransport
+from app.api.canvas_client import CanvasClient
+from app.config import CANVAS_MAX_CONCURRENCY
+from app.utils.async_utils import run_sync
+from benchmarks.mock_canvas import MockCanvasData, MockCanvasServer
+
+
+def _time_call(func, repeat: int) -> float:
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        samples.append(time.perf_counter() - start)
+    return statistics.median(samples)
+
+
+def run(course_counts, latency: float, max_workers: int, repeat: int):
+    print(f"{'courses':>7} {'sequential':>12} {'concurrent':>12} {'speedup':>8}")
+    for n_courses in course_counts:
+        with MockCanvasServer(MockCanvasData(n_courses=n_courses), latency=latency) as server:
+            # No response cache, so every run pays for every course
+            client = CanvasClient(api_key="test", api_url=server.url, transport=AsyncCanvasTransport())
+            courses = client.load_active_courses()
+
+            sequential = _time_call(lambda: client.scan_course_deadlines(courses, max_workers=1), repeat)
+            concurrent = _time_call(lambda: client.scan_course_deadlines(courses, max_workers=max_workers), repeat)
+            assert client.scan_course_deadlines(courses, max_workers=1) == \
+                client.scan_course_deadlines(courses, max_workers=max_workers)
+
+            print(f"{n_courses:>7} {sequential * 1000:>10.1f}ms {concurrent * 1000:>10.1f}ms "
+                  f"{sequential / concurrent:>7.1f}x")
+            run_sync(client.transport.aclose())
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--courses", type=int, nargs="+", default=[1, 2, 4, 8, 16])
+    parser.add_argument("--latency", type=float, default=0.05, help="server think time per request (s)")
+    parser.add_argument("--max-workers", type=int, default=CANVAS_MAX_CONCURRENCY)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+    run(args.courses, args.latency, args.max_workers, args.repeat)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,199 @@
+"""
+Per-phase and end-to-end latency of CanvasAI.process_query for each query type.
+
+Runs fully offline: the app is pointed at the mock Canvas and mock OpenAI
+servers through CANVAS_API_URL and OPENAI_BASE_URL. Each query runs inside a
+trace, so phase timings come from the same spans the app logs in production.
+Canvas round trips and model calls are counted by the mock servers. Every cache
+is off unless --cache is given, so each query pays its real round trips.
+
+    python -m benchmarks.bench_pipeline --courses 8 --assignments 40 --rounds 20
+    python -m benchmarks.bench_pipeline --canvas-latency 0.1 --json pipeline.json
+"""
+import argparse
+import asyncio
+import contextlib
+import io
+import json
+import os
+import statistics
+import tempfile
+from typing import Dict, List, Optional
+
+from benchmarks.mock_canvas import MockCanvasData, MockCanvasServer
+from benchmarks.mock_openai import MockOpenAIServer
+
+# One representative query per query type, with the course it mentions (index into the mock courses)
+SCENARIOS = [
+    ("deadlines", "What's due this week?", None),
+    ("assignments", "What assignments do I have in {code}?", 0),
+    ("grades", "What is my grade in {code}?", 0),
+    ("course_materials", "Where are the lecture slides for {code}?", 1),
+    ("modules", "What modules does {code} have?", 1),
+    ("announcements", "Any new announcements in {code}?", 2),
+    ("unknown", "Tell me a joke", None),
+]
+
+# Spans reported for every query type, in pipeline order
+PHASES = ("courses", "classify", "resolve_course", "fetch", "generate", "canvas", "openai")
+
+
+def _percentile(samples, pct):
+    ordered = sorted(samples)
+    return ordered[min(int(round(pct / 100 * (len(ordered) - 1))), len(ordered) - 1)]
+
+
+def build_scenarios(data: MockCanvasData) -> List[Dict]:
+    """The benchmark queries and the classification the mock model returns for each"""
+    scenarios = []
+    for query_type, template, course_index in SCENARIOS:
+        course = data.courses[course_index % len(data.courses)] if course_index is not None else None
+        query = template.format(code=course["course_code"]) if course else template
+        scenarios.append({
+            "query_type": query_type,
+            "query": query,
+            "classification": {
+                "query_type": query_type,
+                "course": course["name"] if course else None,
+                "course_id": course["id"] if course else None,
+                "course_match_confidence": "high" if course else None,
+                "time_frame": "upcoming" if query_type == "deadlines" else None,
+                "specific_item": None,
+                "api_calls": ["load_active_courses"],
+            },
+        })
+    return scenarios
+
+
+def _summary(samples: List[float]) -> Dict[str, float]:
+    return {f"p{pct}": round(_percentile(samples, pct) * 1000, 1) for pct in (50, 95, 99)}
+
+
+async def _measure(agent, scenarios: List[Dict], rounds: int, warmup: int, canvas, openai_server) -> Dict:
+    from app.utils.tracing import start_trace
+
+    results = {}
+    for scenario in scenarios:
+        phases: Dict[str, List[float]] = {"total": []}
+        canvas_calls, model_calls = [], []
+        for round_number in range(warmup + rounds):
+            # Every round starts from the same empty conversation
+            agent.memory.clear()
+            canvas_before, model_before = canvas.total_requests, openai_server.requests
+            with start_trace(scenario["query_type"]) as trace:
+                await agent.aprocess_query(scenario["query"])
+            trace.finish()
+            if round_number < warmup:
+                continue
+
+            phases["total"].append(trace.root.duration)
+            for name, entry in trace.totals().items():
+                if name in PHASES:
+                    phases.setdefault(name, []).append(entry["ms"] / 1000)
+            canvas_calls.append(canvas.total_requests - canvas_before)
+            model_calls.append(openai_server.requests - model_before)
+
+        results[scenario["query_type"]] = {
+            "query": scenario["query"],
+            "canvas_calls": statistics.mean(canvas_calls),
+            "model_calls": statistics.mean(model_calls),
+            "phases": {name: _summary(samples) for name, samples in phases.items()},
+        }
+    return results
+
+
+def run(n_courses: int, assignments: int, modules: int, items: int, files: int, announcements: int,
+        max_per_page: int, canvas_latency: float, model_latency: float, tokens: int, rounds: int, warmup: int,
+        cache: bool, json_path: Optional[str]):
+    data = MockCanvasData(n_courses=n_courses, assignments_per_course=assignments, modules_per_course=modules,
+                          items_per_module=items, files_per_course=files, announcements_per_course=announcements)
+    scenarios = build_scenarios(data)
+    classifications = {scenario["query"]: scenario["classification"] for scenario in scenarios}
+
+    with MockCanvasServer(data, latency=canvas_latency, max_per_page=max_per_page) as canvas, \
+            MockOpenAIServer(model_latency, 0.0, tokens, classifications=classifications) as openai_server:
+        # Settings are read at import time, so point the app at the mock servers first
+        os.environ.update({
+            "CANVAS_API_URL": canvas.url,
+            "CANVAS_API_KEY": "test",
+            "OPENAI_BASE_URL": openai_server.url,
+            "OPENAI_API_KEY": "test",
+            "OPENAI_MODEL": "mock",
+            "CANVAS_CACHE_ENABLED": str(cache),
+            "CLASSIFICATION_CACHE_ENABLED": str(cache),
+            "ANSWER_CACHE_ENABLED": str(cache),
+            "CANVAS_STORE_ENABLED": str(cache),
+            "CANVAS_STORE_PATH": os.path.join(tempfile.mkdtemp(), "canvas_store.sqlite3"),
+            # Classify every query through the model so the classify phase is comparable across types
+            "LOCAL_CLASSIFIER_ENABLED": "False",
+            "SHOW_LOGS": "False",
+        })
+        from app.agent.canvasai import CanvasAI
+        from app.services.async_openai_service import close_async_openai
+
+        async def measure():
+            agent = CanvasAI()
+            if not await agent.aauthenticate_user():
+                raise RuntimeError("authentication against the mock Canvas server failed")
+            try:
+                return await _measure(agent, scenarios, rounds, warmup, canvas, openai_server)
+            finally:
+                # Close the pools bound to this loop before asyncio.run() closes it
+                await close_async_openai()
+                await agent.canvas_client.transport.aclose()
+
+        # The console spinner writes to stdout; keep it out of the report
+        with contextlib.redirect_stdout(io.StringIO()):
+            results = asyncio.run(measure())
+
+    settings = {
+        "courses": n_courses, "assignments": assignments, "modules": modules, "items": items, "files": files,
+        "announcements": announcements, "max_per_page": max_per_page, "canvas_latency": canvas_latency,
+        "model_latency": model_latency, "tokens": tokens, "rounds": rounds, "cache": cache,
+    }
+    _report(settings, results)
+    if json_path:
+        with open(json_path, "w") as f:
+            json.dump({"settings": settings, "query_types": results}, f, indent=2)
+        print(f"\nResults written to {json_path}")
+    return results
+
+
+def _report(settings: Dict, results: Dict):
+    print(f"{settings['courses']} courses x {settings['assignments']} assignments / {settings['modules']} modules / "
+          f"{settings['files']} files, canvas latency={settings['canvas_latency'] * 1000:.0f}ms, "
+          f"model latency={settings['model_latency'] * 1000:.0f}ms, {settings['rounds']} rounds, "
+          f"caches {'on' if settings['cache'] else 'off'}")
+    for query_type, result in results.items():
+        print(f"\n{query_type}: \"{result['query']}\"  "
+              f"canvas calls={result['canvas_calls']:.1f}  model calls={result['model_calls']:.1f}")
+        print(f"  {'phase':<16} {'p50':>9} {'p95':>9} {'p99':>9}")
+        for name in ("total",) + PHASES:
+            if name in result["phases"]:
+                summary = result["phases"][name]
+                print(f"  {name:<16} {summary['p50']:7.1f}ms {summary['p95']:7.1f}ms {summary['p99']:7.1f}ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--courses", type=int, default=6)
+    parser.add_argument("--assignments", type=int, default=20, help="assignments per course")
+    parser.add_argument("--modules", type=int, default=6, help="modules per course")
+    parser.add_argument("--items", type=int, default=8, help="items per module")
+    parser.add_argument("--files", type=int, default=20, help="files per course")
+    parser.add_argument("--announcements", type=int, default=6, help="announcements per course")
+    parser.add_argument("--max-per-page", type=int, default=100, help="page size cap of the mock Canvas server")
+    parser.add_argument("--canvas-latency", type=float, default=0.05)
+    parser.add_argument("--model-latency", type=float, default=0.3)
+    parser.add_argument("--tokens", type=int, default=50)
+    parser.add_argument("--rounds", type=int, default=10)
+    parser.add_argument("--warmup", type=int, default=1, help="unmeasured rounds per query type")
+    parser.add_argument("--cache", action="store_true", help="leave the Canvas, classification and answer caches and the Canvas store on")
+    parser.add_argument("--json", dest="json_path", help="also write the results to this JSON file")
+    args = parser.parse_args()
+    run(args.courses, args.assignments, args.modules, args.items, args.files, args.announcements, args.max_per_page,
+        args.canvas_latency, args.model_latency, args.tokens, args.rounds, args.warmup, args.cache, args.json_path)
+
+
+if __name__ == "__main__":
+    main()
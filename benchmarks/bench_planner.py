@@ -0,0 +1,56 @@
+"""
+Upcoming deadlines from the planner listing vs. the concurrent per-course scan.
+
+    python -m benchmarks.bench_planner --latency 0.05 --courses 2 4 8 16
+"""
+import argparse
+import statistics
+import time
+
+from app.api.async_transport import AsyncCanvasTransport
+from app.api.canvas_client import CanvasClient
+from app.utils.async_utils import run_sync
+from benchmarks.mock_canvas import MockCanvasData, MockCanvasServer
+
+
+def _measure(server: MockCanvasServer, func, repeat: int):
+    samples = []
+    server.reset_stats()
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        samples.append(time.perf_counter() - start)
+    return statistics.median(samples), server.total_requests / repeat, result
+
+
+def run(course_counts, latency: float, repeat: int):
+    print(f"{'courses':>7} {'scan':>10} {'calls':>6} {'planner':>10} {'calls':>6} {'same':>5}")
+    for n_courses in course_counts:
+        with MockCanvasServer(MockCanvasData(n_courses=n_courses), latency=latency) as server:
+            # No response cache, so both sources hit the server every time
+            client = CanvasClient(api_key="test", api_url=server.url, transport=AsyncCanvasTransport())
+            courses = client.load_active_courses()
+
+            scan_time, scan_calls, scanned = _measure(
+                server, lambda: client.scan_course_deadlines(courses), repeat)
+            planner_time, planner_calls, planned = _measure(
+                server, lambda: client.get_planner_deadlines(courses), repeat)
+
+            same = [(d["assignment_id"], d["due_date"]) for d in scanned] == \
+                [(d["assignment_id"], d["due_date"]) for d in planned]
+            print(f"{n_courses:>7} {scan_time * 1000:>8.1f}ms {scan_calls:>6.0f} "
+                  f"{planner_time * 1000:>8.1f}ms {planner_calls:>6.0f} {str(same):>5}")
+            run_sync(client.transport.aclose())
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--courses", type=int, nargs="+", default=[2, 4, 8, 16])
+    parser.add_argument("--latency", type=float, default=0.05, help="server think time per request (s)")
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+    run(args.courses, args.latency, args.repeat)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,55 @@
+"""
+Size of the data payload sent to the response model, raw indented dump vs
+projected compact serialization, for each query type.
+
+Fetches the data each query type needs from the mock Canvas server through
+the fetch planner, the same way a real query does.
+
+    python -m benchmarks.bench_projection --courses 6
+"""
+import argparse
+import asyncio
+import time
+
+from app.agent.fetch_planner import AsyncFetchPlanner
+from app.api.async_canvas_client import AsyncCanvasClient
+from app.api.async_transport import AsyncCanvasTransport
+from app.services.projection import prepare_prompt_data
+from benchmarks.mock_canvas import MockCanvasData, MockCanvasServer
+
+QUERY_TYPES = ["deadlines", "assignments", "grades", "course_materials", "announcements", "general"]
+
+
+async def run(n_courses: int):
+    with MockCanvasServer(MockCanvasData(n_courses=n_courses)) as server:
+        client = AsyncCanvasClient(api_key="test", api_url=server.url, transport=AsyncCanvasTransport())
+        planner = AsyncFetchPlanner(client)
+        courses = await client.load_active_courses()
+        course_id = courses[0]["id"]
+
+        print(f"{'query type':<17} {'raw bytes':>10} {'sent bytes':>10} {'raw tok':>8} {'sent tok':>8} "
+              f"{'saved':>6} {'project':>8}")
+        for query_type in QUERY_TYPES:
+            data = {"courses": courses}
+            include_deadlines = query_type in ("deadlines", "general")
+            await planner.execute(planner.plan(query_type, course_id, include_deadlines), data)
+            data["course_id"] = course_id
+
+            start = time.perf_counter()
+            _, _, report = prepare_prompt_data(data, query_type)
+            elapsed = time.perf_counter() - start
+            print(f"{query_type:<17} {report.raw_bytes:>10,} {report.projected_bytes:>10,} "
+                  f"{report.raw_tokens:>8,} {report.projected_tokens:>8,} {report.saved_ratio:>6.0%} "
+                  f"{elapsed * 1000:>6.2f}ms")
+        await client.transport.aclose()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--courses", type=int, default=6)
+    args = parser.parse_args()
+    asyncio.run(run(args.courses))
+
+
+if __name__ == "__main__":
+    main()
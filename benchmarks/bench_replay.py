@@ -0,0 +1,177 @@
+"""
+Replay a recorded HTTP cassette through the current code and compare its traffic with the recording.
+
+Record production-shaped traffic by running the app with the cassette in record mode; Canvas and
+OpenAI requests are written with their credentials scrubbed, along with the queries that sent them:
+
+    HTTP_CASSETTE_MODE=record HTTP_CASSETTE_PATH=cassettes/week1.jsonl.gz python main.py --serve
+
+Then replay it offline. Every recorded operation is run again, in order, with one agent per recorded
+session, and each request is answered from the cassette with the recorded timings or zero latency:
+
+    python -m benchmarks.bench_replay cassettes/week1.jsonl.gz --timing zero --save replay.json
+    python -m benchmarks.bench_replay cassettes/week1.jsonl.gz --baseline replay.json
+
+Exits with status 1 when the replay makes more Canvas round trips than the recording, or than the
+--baseline results of an earlier replay.
+"""
+import argparse
+import asyncio
+import contextlib
+import gzip
+import io
+import json
+import os
+import sys
+import tempfile
+import time
+from collections import Counter, defaultdict
+from typing import Dict, List, Tuple
+
+COUNTERS = ("requests", "request_bytes", "response_bytes", "unmatched")
+
+
+def _percentile(samples, pct):
+    ordered = sorted(samples)
+    return ordered[min(int(round(pct / 100 * (len(ordered) - 1))), len(ordered) - 1)]
+
+
+def read_recording(path: str) -> Tuple[Dict, List[Dict], Dict[str, Counter]]:
+    """
+    The header, operations and per-service traffic of a cassette
+
+    Read without the app so its settings can be pointed at the recording before they are imported.
+    """
+    header, events, traffic = {}, [], defaultdict(Counter)
+    try:
+        with gzip.open(path, "rt", encoding="utf-8") as f:
+            for line in f:
+                entry = json.loads(line)
+                if entry["type"] == "header":
+                    header = header or entry
+                elif entry["type"] == "event":
+                    events.append(entry)
+                else:
+                    counts = traffic[entry["service"]]
+                    counts["requests"] += 1
+                    counts["request_bytes"] += entry["request_bytes"]
+                    body = entry.get("body")
+                    counts["response_bytes"] += len(body.encode("utf-8")) if body is not None else \
+                        len(entry["body_b64"]) * 3 // 4
+    except EOFError:
+        pass
+    return header, events, traffic
+
+
+async def _replay(events: List[Dict]) -> Dict[str, List[float]]:
+    from app.agent.canvasai import CanvasAI
+    from app.services.async_openai_service import close_async_openai
+
+    agents: Dict[str, CanvasAI] = {}
+    timings: Dict[str, List[float]] = defaultdict(list)
+    try:
+        for event in events:
+            agent = agents.get(event["session"])
+            if agent is None:
+                agent = agents[event["session"]] = CanvasAI(api_key=f"replay-{event['session']}")
+            start = time.perf_counter()
+            if event["kind"] == "authenticate":
+                await agent.aauthenticate_user()
+            elif event["kind"] == "courses":
+                await agent.aload_active_courses()
+            elif event["kind"] == "query":
+                await agent.aprocess_query(event["query"])
+            elif event["kind"] == "stream":
+                async for _ in agent.astream_query(event["query"]):
+                    pass
+            timings[event["kind"]].append(time.perf_counter() - start)
+    finally:
+        # Close the pools bound to this loop before asyncio.run() closes it
+        for agent in agents.values():
+            await agent.fetch_planner.wait_revalidation()
+        await close_async_openai()
+        if agents:
+            await next(iter(agents.values())).canvas_client.transport.aclose()
+    return timings
+
+
+def run(path: str, timing: str, baseline_path: str = None, save_path: str = None) -> bool:
+    header, events, recorded = read_recording(path)
+    if not header:
+        raise SystemExit(f"{path} is not a cassette")
+
+    # Settings are read at import time, so point the app at the recording first
+    os.environ.update({
+        "HTTP_CASSETTE_MODE": "replay",
+        "HTTP_CASSETTE_PATH": path,
+        "HTTP_CASSETTE_TIMING": timing,
+        "CANVAS_API_URL": header["canvas_api_url"],
+        "CANVAS_API_KEY": "replay",
+        "OPENAI_BASE_URL": header.get("openai_base_url") or "https://api.openai.com/v1",
+        "OPENAI_API_KEY": "replay",
+        "OPENAI_MODEL": header.get("openai_model") or "replay",
+        "CLASSIFICATION_CACHE_PERSIST": "False",
+        # Start from an empty store so every recorded fetch is made again
+        "CANVAS_STORE_PATH": os.path.join(tempfile.mkdtemp(), "canvas_store.sqlite3"),
+        "SHOW_LOGS": "False",
+    })
+    from app.utils.cassette import get_cassette
+
+    start = time.perf_counter()
+    # The console spinner writes to stdout; keep it out of the report
+    with contextlib.redirect_stdout(io.StringIO()):
+        timings = asyncio.run(_replay(events))
+    elapsed = time.perf_counter() - start
+    replayed = get_cassette().stats
+
+    print(f"{path}: {len(events)} operations recorded {header.get('recorded_at', '?')}, "
+          f"replayed in {elapsed:.2f}s ({timing} timing)")
+    for kind, samples in timings.items():
+        print(f"  {kind:<13} x{len(samples):<4} p50={_percentile(samples, 50) * 1000:8.1f}ms "
+              f"p95={_percentile(samples, 95) * 1000:8.1f}ms")
+
+    if baseline_path:
+        with open(baseline_path) as f:
+            reference, reference_label = json.load(f)["traffic"], "baseline"
+    else:
+        reference, reference_label = recorded, "recorded"
+
+    print(f"\n  {'service':<8} {'counter':<15} {reference_label:>12} {'replayed':>12}")
+    for service in sorted(set(reference) | set(replayed)):
+        for counter in COUNTERS:
+            before = reference.get(service, {}).get(counter, 0)
+            after = replayed.get(service, {}).get(counter, 0)
+            print(f"  {service:<8} {counter:<15} {before:>12} {after:>12}")
+
+    if save_path:
+        with open(save_path, "w") as f:
+            json.dump({"cassette": path, "timing": timing, "elapsed": elapsed,
+                       "traffic": {service: dict(counts) for service, counts in replayed.items()},
+                       "operations": {kind: {"count": len(samples), "p50": _percentile(samples, 50),
+                                             "p95": _percentile(samples, 95)}
+                                      for kind, samples in timings.items()}}, f, indent=2)
+        print(f"\nResults written to {save_path}")
+
+    reference_trips = reference.get("canvas", {}).get("requests", 0)
+    replayed_trips = replayed.get("canvas", {}).get("requests", 0)
+    if replayed_trips > reference_trips:
+        print(f"\nFAIL: {replayed_trips} Canvas round trips, {replayed_trips - reference_trips} more than "
+              f"the {reference_label} {reference_trips}")
+        return False
+    return True
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("cassette")
+    parser.add_argument("--timing", choices=["recorded", "zero"], default="recorded",
+                        help="answer with the recorded response timings or immediately")
+    parser.add_argument("--baseline", help="compare with the --save results of an earlier replay")
+    parser.add_argument("--save", help="write the replay results to this JSON file")
+    args = parser.parse_args()
+    if not run(args.cassette, args.timing, args.baseline, args.save):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,125 @@
+"""
+Throughput of the desktop dev server versus the headless production server.
+
+Starts the app in a subprocess against the mock Canvas and mock OpenAI
+servers, once on the Flask dev server the desktop mode uses and once per
+gunicorn worker count given, then sends /api/query requests from
+concurrent clients, each with its own session.
+
+    python -m benchmarks.bench_serve --clients 32 --requests 8 --workers 1 4
+"""
+import argparse
+import os
+import socket
+import subprocess
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+from benchmarks.mock_canvas import MockCanvasData, MockCanvasServer
+from benchmarks.mock_openai import MockOpenAIServer
+
+QUERIES = ["What's due this week?", "What assignments do I have coming up?", "Any new announcements?"]
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# The desktop mode's server: Flask's development server in this process
+DEV_SERVER = "import main; main.initialize_agent(); main.app.run(port={port}, debug=False, use_reloader=False)"
+
+
+def _percentile(samples, pct):
+    ordered = sorted(samples)
+    return ordered[min(int(round(pct / 100 * (len(ordered) - 1))), len(ordered) - 1)]
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def _wait_ready(base_url: str, process: subprocess.Popen, timeout: float = 30):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError("server exited during startup")
+        try:
+            # The dev server has no /readyz; any answer from / means it is up
+            requests.get(f"{base_url}/", timeout=1)
+            return
+        except requests.ConnectionError:
+            time.sleep(0.2)
+    raise RuntimeError("server did not start")
+
+
+def _client(base_url: str, n_requests: int, offset: int):
+    http = requests.Session()
+    latencies = []
+    for i in range(n_requests):
+        start = time.perf_counter()
+        response = http.post(f"{base_url}/api/query", json={"query": QUERIES[(offset + i) % len(QUERIES)]})
+        response.raise_for_status()
+        latencies.append(time.perf_counter() - start)
+    return latencies
+
+
+def _measure(label: str, command, env, clients: int, n_requests: int):
+    port = _free_port()
+    command = [part.format(port=port) for part in command]
+    process = subprocess.Popen(command, env=env, cwd=ROOT, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    base_url = f"http://127.0.0.1:{port}"
+    try:
+        _wait_ready(base_url, process)
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=clients) as executor:
+            results = list(executor.map(lambda offset: _client(base_url, n_requests, offset), range(clients)))
+        elapsed = time.perf_counter() - start
+    finally:
+        process.terminate()
+        process.wait(30)
+
+    latencies = [latency for client in results for latency in client]
+    print(f"  {label:<22} {len(latencies) / elapsed:7.1f} queries/s  "
+          f"p50={_percentile(latencies, 50) * 1000:7.1f}ms p95={_percentile(latencies, 95) * 1000:7.1f}ms")
+
+
+def run(clients: int, n_requests: int, workers, threads: int, canvas_latency: float, model_latency: float):
+    with MockCanvasServer(MockCanvasData(n_courses=6), latency=canvas_latency) as canvas, \
+            MockOpenAIServer(model_latency, 0.0, 50) as openai_server:
+        env = dict(
+            os.environ,
+            CANVAS_API_URL=canvas.url,
+            CANVAS_API_KEY="test",
+            OPENAI_BASE_URL=openai_server.url,
+            OPENAI_API_KEY="test",
+            OPENAI_MODEL="mock",
+            ANSWER_CACHE_ENABLED="False",
+            CANVAS_STORE_ENABLED="False",
+            SHOW_LOGS="False",
+            FLASK_SECRET_KEY="bench",
+        )
+        print(f"{clients} clients x {n_requests} queries, canvas latency={canvas_latency * 1000:.0f}ms, "
+              f"model latency={model_latency * 1000:.0f}ms")
+        _measure("dev server", [sys.executable, "-c", DEV_SERVER], env, clients, n_requests)
+        for count in workers:
+            command = [sys.executable, "main.py", "--serve", "--port", "{port}",
+                       "--workers", str(count), "--threads", str(threads)]
+            _measure(f"gunicorn {count}x{threads} threads", command, env, clients, n_requests)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--clients", type=int, default=32)
+    parser.add_argument("--requests", type=int, default=8)
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 4])
+    parser.add_argument("--threads", type=int, default=32)
+    parser.add_argument("--canvas-latency", type=float, default=0.02)
+    parser.add_argument("--model-latency", type=float, default=0.2)
+    args = parser.parse_args()
+    run(args.clients, args.requests, args.workers, args.threads, args.canvas_latency, args.model_latency)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,119 @@
+"""
+Time to first byte of the blocking /api/query endpoint vs the streaming
+/api/query/stream endpoint.
+
+Runs the Flask app against the mock Canvas and mock OpenAI servers. The
+blocking endpoint sends nothing until the whole answer is generated; the
+streaming one sends progress events straight away and the first answer
+token as soon as the model produces it.
+
+    python -m benchmarks.bench_streaming --queries 10 --first-token-latency 0.4 --tokens 200
+"""
+import argparse
+import contextlib
+import io
+import logging
+import os
+import statistics
+import threading
+import time
+
+import requests
+
+from benchmarks.mock_canvas import MockCanvasData, MockCanvasServer
+from benchmarks.mock_openai import MockOpenAIServer
+
+QUERIES = ["What's due this week?", "What assignments do I have coming up?"]
+
+# Keeps the session cookie, so every query runs on the same session agent
+http = requests.Session()
+
+
+def _percentile(samples, pct):
+    ordered = sorted(samples)
+    return ordered[min(int(round(pct / 100 * (len(ordered) - 1))), len(ordered) - 1)]
+
+
+def _report(label, samples):
+    print(f"  {label:<14} p50={_percentile(samples, 50) * 1000:8.1f}ms p95={_percentile(samples, 95) * 1000:8.1f}ms")
+
+
+def _blocking(base_url: str, query: str):
+    start = time.perf_counter()
+    response = http.post(f"{base_url}/api/query", json={"query": query}, stream=True)
+    first_byte = None
+    for _ in response.iter_content(chunk_size=None):
+        if first_byte is None:
+            first_byte = time.perf_counter() - start
+    total = time.perf_counter() - start
+    return first_byte, first_byte, total
+
+
+def _streaming(base_url: str, query: str):
+    start = time.perf_counter()
+    response = http.post(f"{base_url}/api/query/stream", json={"query": query}, stream=True)
+    first_byte = first_token = None
+    for chunk in response.iter_content(chunk_size=None):
+        if first_byte is None:
+            first_byte = time.perf_counter() - start
+        if first_token is None and b"event: token" in chunk:
+            first_token = time.perf_counter() - start
+    total = time.perf_counter() - start
+    return first_byte, first_token, total
+
+
+def run(n_queries: int, first_token_latency: float, token_interval: float, tokens: int, canvas_latency: float):
+    with MockCanvasServer(MockCanvasData(n_courses=6), latency=canvas_latency) as canvas, \
+            MockOpenAIServer(first_token_latency, token_interval, tokens) as openai_server:
+        # Settings are read at import time, so point the app at the mock servers first
+        os.environ.update({
+            "CANVAS_API_URL": canvas.url,
+            "CANVAS_API_KEY": "test",
+            "OPENAI_BASE_URL": openai_server.url,
+            "OPENAI_API_KEY": "test",
+            "OPENAI_MODEL": "mock",
+            "ANSWER_CACHE_ENABLED": "False",
+            "CANVAS_STORE_ENABLED": "False",
+            "SHOW_LOGS": "False",
+        })
+        from werkzeug.serving import make_server
+        import main
+
+        logging.getLogger("werkzeug").setLevel(logging.ERROR)
+        http_server = make_server("127.0.0.1", 0, main.app, threaded=True)
+        threading.Thread(target=http_server.serve_forever, daemon=True).start()
+        base_url = f"http://127.0.0.1:{http_server.server_port}"
+
+        results = {}
+        # The console spinner writes to stdout; keep it out of the report
+        with contextlib.redirect_stdout(io.StringIO()):
+            main.initialize_agent()
+            for label, call in (("blocking", _blocking), ("streaming", _streaming)):
+                samples = [call(base_url, QUERIES[i % len(QUERIES)]) for i in range(n_queries)]
+                results[label] = samples
+        http_server.shutdown()
+
+    print(f"first token latency={first_token_latency * 1000:.0f}ms, {tokens} tokens at "
+          f"{token_interval * 1000:.0f}ms, canvas latency={canvas_latency * 1000:.0f}ms")
+    for label, samples in results.items():
+        print(label)
+        _report("first byte", [sample[0] for sample in samples])
+        _report("first token", [sample[1] for sample in samples])
+        _report("complete", [sample[2] for sample in samples])
+    print(f"mean first-token speedup: "
+          f"{statistics.mean(s[1] for s in results['blocking']) / statistics.mean(s[1] for s in results['streaming']):.1f}x")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--queries", type=int, default=10)
+    parser.add_argument("--first-token-latency", type=float, default=0.4)
+    parser.add_argument("--token-interval", type=float, default=0.01)
+    parser.add_argument("--tokens", type=int, default=200)
+    parser.add_argument("--canvas-latency", type=float, default=0.02)
+    args = parser.parse_args()
+    run(args.queries, args.first_token_latency, args.token_interval, args.tokens, args.canvas_latency)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,69 @@
+"""
+Per-call latency of Canvas requests: bare requests.get vs the pooled transport.
+
+Every bare call opens a new connection and pays the emulated handshake cost;
+the pooled transport pays it once per connection in the pool.
+
+    python -m benchmarks.bench_transport --calls 200 --connect-latency 0.02
+"""
+import argparse
+import statistics
+import time
+
+import requests
+
+from app.api.async_transport import AsyncCanvasTransport
+from app.api.canvas_client import CanvasClient
+from app.utils.async_utils import run_sync
+from benchmarks.mock_canvas import MockCanvasServer
+
+
+def _percentile(samples, pct):
+    ordered = sorted(samples)
+    index = min(int(round(pct / 100 * (len(ordered) - 1))), len(ordered) - 1)
+    return ordered[index]
+
+
+def _report(label, samples, connections):
+    print(
+        f"{label:<18} mean={statistics.mean(samples) * 1000:7.2f}ms "
+        f"p50={_percentile(samples, 50) * 1000:7.2f}ms "
+        f"p95={_percentile(samples, 95) * 1000:7.2f}ms "
+        f"connections={connections}"
+    )
+
+
+def run(calls: int, latency: float, connect_latency: float):
+    with MockCanvasServer(latency=latency, connect_latency=connect_latency) as server:
+        headers = {"Authorization": "Bearer test"}
+
+        samples = []
+        for _ in range(calls):
+            start = time.perf_counter()
+            requests.get(f"{server.url}/courses", headers=headers).json()
+            samples.append(time.perf_counter() - start)
+        _report("bare requests.get", samples, server.connections)
+
+        server.reset_stats()
+        transport = AsyncCanvasTransport()
+        client = CanvasClient(api_key="test", api_url=server.url, transport=transport)
+        samples = []
+        for _ in range(calls):
+            start = time.perf_counter()
+            client.load_active_courses()
+            samples.append(time.perf_counter() - start)
+        _report("pooled transport", samples, server.connections)
+        run_sync(transport.aclose())
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--calls", type=int, default=200)
+    parser.add_argument("--latency", type=float, default=0.0, help="server think time per request (s)")
+    parser.add_argument("--connect-latency", type=float, default=0.01, help="emulated handshake cost (s)")
+    args = parser.parse_args()
+    run(args.calls, args.latency, args.connect_latency)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,394 @@
+"""
+A local stand-in for the Canvas REST API.
+
+Generates a deterministic set of courses, assignments, modules, files and
+announcements, serves them over HTTP/1.1 keep-alive, paginates listings the
+way Canvas does and can inject per-request latency.
+"""
+import datetime
+import hashlib
+import json
+import re
+import socket
+import threading
+import time
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Dict, List, Optional, Tuple
+from urllib.parse import parse_qs, urlencode, urlparse
+
+API_PREFIX = "/api/v1"
+
+# Canvas throttles with a leaky bucket: each request costs a little and the bucket refills over time
+RATE_LIMIT_BUCKET = 700.0
+RATE_LIMIT_REFILL = 10.0
+REQUEST_COST = 1.0
+
+
+class MockCanvasData:
+    """Deterministic Canvas-shaped fixtures"""
+
+    def __init__(
+        self,
+        n_courses: int = 4,
+        assignments_per_course: int = 12,
+        modules_per_course: int = 6,
+        items_per_module: int = 8,
+        files_per_course: int = 20,
+        announcements_per_course: int = 6,
+    ):
+        now = datetime.datetime.now(datetime.timezone.utc).replace(microsecond=0)
+        self.user = {"id": 1, "name": "Test Student", "short_name": "Test"}
+        self.courses: List[Dict] = []
+        self.assignments: Dict[int, List[Dict]] = {}
+        self.modules: Dict[int, List[Dict]] = {}
+        self.module_items: Dict[Tuple[int, int], List[Dict]] = {}
+        self.files: Dict[int, List[Dict]] = {}
+        self.announcements: Dict[int, List[Dict]] = {}
+
+        for c in range(n_courses):
+            course_id = 1000 + c
+            code = f"COSC{2000 + c}"
+            self.courses.append({
+                "id": course_id,
+                "name": f"{code} Course Number {c + 1}",
+                "course_code": code,
+                "workflow_state": "available",
+                "term": {"id": 1, "name": "Semester 2"},
+            })
+
+            assignments = []
+            for a in range(assignments_per_course):
+                # Spread due dates from two weeks ago to four weeks ahead
+                due = now + datetime.timedelta(days=(a * 3) - 14, hours=c)
+                assignments.append({
+                    "id": course_id * 100 + a,
+                    "course_id": course_id,
+                    "name": f"{code} Assignment {a + 1}",
+                    "description": "<p>" + "Lorem ipsum dolor sit amet. " * 20 + "</p>",
+                    "due_at": due.strftime("%Y-%m-%dT%H:%M:%SZ"),
+                    "points_possible": 10.0 + a,
+                    "has_submitted_submissions": a % 3 == 0,
+                    "assignment_group_id": course_id * 10 + (a % 2),
+                    "html_url": f"https://canvas.example.edu/courses/{course_id}/assignments/{course_id * 100 + a}",
+                    "submission": {
+                        "score": 7.0 + (a % 3) if a % 3 == 0 else None,
+                        "grade": str(7 + (a % 3)) if a % 3 == 0 else None,
+                        "submitted_at": due.strftime("%Y-%m-%dT%H:%M:%SZ") if a % 3 == 0 else None,
+                    },
+                })
+            self.assignments[course_id] = assignments
+
+            modules = []
+            for m in range(modules_per_course):
+                module_id = course_id * 100 + m
+                items = [{
+                    "id": module_id * 100 + i,
+                    "module_id": module_id,
+                    "title": f"Week {m + 1} item {i + 1}",
+                    "type": "File" if i % 2 else "Page",
+                    "position": i + 1,
+                    "html_url": f"https://canvas.example.edu/courses/{course_id}/modules/items/{module_id * 100 + i}",
+                } for i in range(items_per_module)]
+                self.module_items[(course_id, module_id)] = items
+                modules.append({
+                    "id": module_id,
+                    "name": f"Week {m + 1}",
+                    "position": m + 1,
+                    "items_count": len(items),
+                })
+            self.modules[course_id] = modules
+
+            self.files[course_id] = [{
+                "id": course_id * 1000 + f,
+                "filename": f"lecture_{f + 1}.pdf",
+                "display_name": f"Lecture {f + 1}.pdf",
+                "url": f"https://canvas.example.edu/files/{course_id * 1000 + f}/download?verifier=abcdef{f}",
+                "thumbnail_url": None,
+                "size": 250_000 + f * 1000,
+                "content-type": "application/pdf",
+                "updated_at": (now - datetime.timedelta(days=f)).strftime("%Y-%m-%dT%H:%M:%SZ"),
+            } for f in range(files_per_course)]
+
+            self.announcements[course_id] = [{
+                "id": course_id * 10000 + n,
+                "title": f"{code} announcement {n + 1}",
+                "message": "<p>" + "Please read the updated notes. " * 15 + "</p>",
+                "posted_at": (now - datetime.timedelta(days=n * 2)).strftime("%Y-%m-%dT%H:%M:%SZ"),
+                "author": {"id": 7, "display_name": "Dr Lecturer"},
+            } for n in range(announcements_per_course)]
+
+    def course_detail(self, course_id: int) -> Optional[Dict]:
+        for course in self.courses:
+            if course["id"] == course_id:
+                detail = dict(course)
+                detail["syllabus_body"] = "<h2>Syllabus</h2>" + "<p>Weekly topics and assessment.</p>" * 30
+                detail["teachers"] = [{"id": 7, "display_name": "Dr Lecturer"}]
+                detail["enrollments"] = [{"type": "student", "computed_current_score": 78.5}]
+                return detail
+        return None
+
+    def assignment_groups(self, course_id: int) -> List[Dict]:
+        groups = {}
+        for assignment in self.assignments.get(course_id, []):
+            group_id = assignment["assignment_group_id"]
+            group = groups.setdefault(group_id, {
+                "id": group_id,
+                "name": "Assignments" if group_id % 2 == 0 else "Quizzes",
+                "assignments": [],
+            })
+            item = {k: v for k, v in assignment.items() if k not in ("description", "submission")}
+            group["assignments"].append(item)
+        return list(groups.values())
+
+    def planner_items(self) -> List[Dict]:
+        """Planner items for every course, ordered by date like Canvas"""
+        items = []
+        for course in self.courses:
+            for assignment in self.assignments[course["id"]]:
+                items.append({
+                    "context_type": "Course",
+                    "course_id": course["id"],
+                    "context_name": course["course_code"],
+                    "plannable_id": assignment["id"],
+                    "plannable_type": "assignment",
+                    "plannable_date": assignment["due_at"],
+                    "submissions": {"submitted": assignment["has_submitted_submissions"], "graded": False},
+                    "plannable": {
+                        "id": assignment["id"],
+                        "title": assignment["name"],
+                        "due_at": assignment["due_at"],
+                        "points_possible": assignment["points_possible"],
+                    },
+                })
+            for announcement in self.announcements[course["id"]]:
+                items.append({
+                    "context_type": "Course",
+                    "course_id": course["id"],
+                    "plannable_id": announcement["id"],
+                    "plannable_type": "announcement",
+                    "plannable_date": announcement["posted_at"],
+                    "submissions": False,
+                    "plannable": {"id": announcement["id"], "title": announcement["title"]},
+                })
+        return sorted(items, key=lambda item: item["plannable_date"])
+
+
+class MockCanvasServer:
+    """
+    Threaded HTTP server that answers Canvas API routes from MockCanvasData.
+
+    Usage:
+        with MockCanvasServer(latency=0.02) as server:
+            client = CanvasClient(api_key="test", api_url=server.url)
+    """
+
+    def __init__(self, data: Optional[MockCanvasData] = None, latency: float = 0.0,
+                 connect_latency: float = 0.0, default_per_page: int = 10, max_per_page: int = 100,
+                 inline_items_limit: int = 10, host: str = "127.0.0.1", port: int = 0):
+        self.data = data or MockCanvasData()
+        self.latency = latency
+        # Emulates the TCP+TLS handshake cost paid by every new connection
+        self.connect_latency = connect_latency
+        self.default_per_page = default_per_page
+        self.max_per_page = max_per_page
+        # Canvas only inlines module items when a module is small enough
+        self.inline_items_limit = inline_items_limit
+        self.request_counts: Counter = Counter()
+        self.connections = 0
+        self.bytes_sent = 0
+        self.not_modified = 0
+        self._bucket = RATE_LIMIT_BUCKET
+        self._bucket_updated = time.monotonic()
+        self._lock = threading.Lock()
+        self._routes: List[Tuple[re.Pattern, Callable]] = [
+            (re.compile(r"^/users/self$"), self._user_self),
+            (re.compile(r"^/courses$"), self._courses),
+            (re.compile(r"^/courses/(\d+)$"), self._course),
+            (re.compile(r"^/courses/(\d+)/assignment_groups$"), self._assignment_groups),
+            (re.compile(r"^/courses/(\d+)/assignments$"), self._assignments),
+            (re.compile(r"^/courses/(\d+)/modules$"), self._modules),
+            (re.compile(r"^/courses/(\d+)/modules/(\d+)/items$"), self._module_items),
+            (re.compile(r"^/courses/(\d+)/files$"), self._files),
+            (re.compile(r"^/courses/(\d+)/discussion_topics$"), self._announcements),
+            (re.compile(r"^/planner/items$"), self._planner_items),
+        ]
+        self._server = ThreadingHTTPServer((host, port), self._make_handler())
+        self._server.daemon_threads = True
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}{API_PREFIX}"
+
+    @property
+    def total_requests(self) -> int:
+        return sum(self.request_counts.values())
+
+    def reset_stats(self):
+        with self._lock:
+            self.request_counts.clear()
+            self.connections = 0
+            self.bytes_sent = 0
+            self.not_modified = 0
+
+    def _charge(self) -> float:
+        """Take a request's cost from the rate limit bucket; the remaining headroom"""
+        with self._lock:
+            now = time.monotonic()
+            refilled = self._bucket + (now - self._bucket_updated) * RATE_LIMIT_REFILL
+            self._bucket = max(min(refilled, RATE_LIMIT_BUCKET) - REQUEST_COST, 0.0)
+            self._bucket_updated = now
+            return self._bucket
+
+    def start(self) -> "MockCanvasServer":
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.stop()
+
+    # Route handlers return (status, payload)
+
+    def _user_self(self, query):
+        return 200, self.data.user
+
+    def _courses(self, query):
+        return 200, self.data.courses
+
+    def _course(self, query, course_id):
+        detail = self.data.course_detail(int(course_id))
+        return (200, detail) if detail else (404, {"errors": [{"message": "The specified resource does not exist."}]})
+
+    def _assignment_groups(self, query, course_id):
+        return 200, self.data.assignment_groups(int(course_id))
+
+    def _assignments(self, query, course_id):
+        assignments = self.data.assignments.get(int(course_id), [])
+        if query.get("bucket") == ["upcoming"]:
+            now = datetime.datetime.now(datetime.timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ")
+            assignments = [a for a in assignments if a["due_at"] and a["due_at"] > now]
+        if query.get("order_by") == ["due_at"]:
+            assignments = sorted(assignments, key=lambda a: a["due_at"] or "")
+        return 200, assignments
+
+    def _modules(self, query, course_id):
+        course_id = int(course_id)
+        include = query.get("include[]", []) + query.get("include", [])
+        modules = []
+        for module in self.data.modules.get(course_id, []):
+            module = dict(module)
+            if "items" in include and module["items_count"] <= self.inline_items_limit:
+                module["items"] = self.data.module_items[(course_id, module["id"])]
+            modules.append(module)
+        return 200, modules
+
+    def _module_items(self, query, course_id, module_id):
+        return 200, self.data.module_items.get((int(course_id), int(module_id)), [])
+
+    def _files(self, query, course_id):
+        return 200, self.data.files.get(int(course_id), [])
+
+    def _announcements(self, query, course_id):
+        return 200, self.data.announcements.get(int(course_id), [])
+
+    def _planner_items(self, query):
+        start = query.get("start_date", [""])[0]
+        end = query.get("end_date", ["9999"])[0]
+        return 200, [item for item in self.data.planner_items() if start <= item["plannable_date"] <= end]
+
+    def _route(self, path: str):
+        for pattern, handler in self._routes:
+            match = pattern.match(path)
+            if match:
+                return pattern.pattern, handler, match.groups()
+        return None, None, ()
+
+    def _make_handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def setup(self):
+                super().setup()
+                # Headers and body are written separately; avoid delayed-ACK stalls
+                self.connection.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+                with server._lock:
+                    server.connections += 1
+                if server.connect_latency:
+                    time.sleep(server.connect_latency)
+
+            def log_message(self, format, *args):
+                pass
+
+            def do_GET(self):
+                parsed = urlparse(self.path)
+                path = parsed.path[len(API_PREFIX):] if parsed.path.startswith(API_PREFIX) else parsed.path
+                query = parse_qs(parsed.query)
+                route, handler, args = server._route(path)
+                with server._lock:
+                    server.request_counts[route or path] += 1
+                if server.latency:
+                    time.sleep(server.latency)
+                if handler is None:
+                    return self._send(404, {"errors": [{"message": "Not found"}]})
+                status, payload = handler(query, *args)
+                headers = {}
+                if isinstance(payload, list):
+                    payload, headers = server._paginate(parsed, query, payload)
+                self._send(status, payload, headers)
+
+            def _send(self, status, payload, headers=None):
+                body = json.dumps(payload).encode()
+                headers = dict(headers or {})
+                if status == 200:
+                    etag = '"' + hashlib.sha1(body).hexdigest() + '"'
+                    headers["ETag"] = etag
+                    if self.headers.get("If-None-Match") == etag:
+                        with server._lock:
+                            server.not_modified += 1
+                        status, body = 304, b""
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json; charset=utf-8")
+                self.send_header("Content-Length", str(len(body)))
+                self.send_header("X-Request-Cost", str(REQUEST_COST))
+                self.send_header("X-Rate-Limit-Remaining", f"{server._charge():.1f}")
+                for name, value in headers.items():
+                    self.send_header(name, value)
+                self.end_headers()
+                self.wfile.write(body)
+                with server._lock:
+                    server.bytes_sent += len(body)
+
+        return Handler
+
+    def _paginate(self, parsed, query: Dict, records: List) -> Tuple[List, Dict]:
+        """Slice a listing into a page and build the Canvas Link header"""
+        per_page = min(int(query.get("per_page", [self.default_per_page])[0]), self.max_per_page)
+        page = max(int(query.get("page", ["1"])[0]), 1)
+        last = max((len(records) + per_page - 1) // per_page, 1)
+        start = (page - 1) * per_page
+
+        def link(page_number: int, rel: str) -> str:
+            params = {k: v for k, v in query.items() if k not in ("page", "per_page")}
+            params["page"] = [str(page_number)]
+            params["per_page"] = [str(per_page)]
+            host, port = self._server.server_address[:2]
+            return f'<http://{host}:{port}{parsed.path}?{urlencode(params, doseq=True)}>; rel="{rel}"'
+
+        links = [link(page, "current"), link(1, "first"), link(last, "last")]
+        if page < last:
+            links.append(link(page + 1, "next"))
+        if page > 1:
+            links.append(link(page - 1, "prev"))
+        return records[start:start + per_page], {"Link": ",".join(links)}
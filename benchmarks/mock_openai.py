@@ -0,0 +1,171 @@
+"""
+A local stand-in for the OpenAI chat completions API.
+
+Answers classification requests (JSON mode) with the classification given for
+the query, or a fixed default, and response requests with a canned answer, either in one body or streamed as
+Server-Sent Events chunks. Emulates model latency as a time to first token
+plus a per-token generation interval.
+"""
+import json
+import socket
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Optional
+
+DEFAULT_CLASSIFICATION = {
+    "query_type": "deadlines",
+    "course": None,
+    "course_id": None,
+    "course_match_confidence": None,
+    "time_frame": "upcoming",
+    "specific_item": None,
+    "api_calls": ["load_active_courses", "get_upcoming_deadlines"],
+}
+
+
+def make_answer(n_tokens: int) -> List[str]:
+    """A canned answer split into roughly token-sized pieces"""
+    words = ("Here are your upcoming deadlines . The **Algorithms** assignment is due on Friday , "
+             "followed by the database quiz next week .").split()
+    return [("" if i == 0 else " ") + words[i % len(words)] for i in range(n_tokens)]
+
+
+class MockOpenAIServer:
+    """
+    Threaded HTTP server for /v1/chat/completions.
+
+    Usage:
+        with MockOpenAIServer(first_token_latency=0.4, token_interval=0.01) as server:
+            client = OpenAI(api_key="test", base_url=server.url)
+    """
+
+    def __init__(self, first_token_latency: float = 0.4, token_interval: float = 0.01, answer_tokens: int = 200,
+                 classification: Optional[Dict] = None, classifications: Optional[Dict[str, Dict]] = None,
+                 host: str = "127.0.0.1", port: int = 0):
+        self.first_token_latency = first_token_latency
+        self.token_interval = token_interval
+        self.answer_tokens = answer_tokens
+        self.classification = classification or DEFAULT_CLASSIFICATION
+        # Classification per user query; other queries get the default
+        self.classifications = classifications or {}
+        self.requests = 0
+        self.streamed = 0
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer((host, port), self._make_handler())
+        self._server.daemon_threads = True
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}/v1"
+
+    def start(self) -> "MockOpenAIServer":
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.stop()
+
+    def _make_handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def setup(self):
+                super().setup()
+                self.connection.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+
+            def log_message(self, format, *args):
+                pass
+
+            def do_POST(self):
+                body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+                with server._lock:
+                    server.requests += 1
+                    server.streamed += bool(body.get("stream"))
+
+                messages = body.get("messages", [])
+                if body.get("response_format", {}).get("type") == "json_object":
+                    time.sleep(server.first_token_latency)
+                    query = messages[-1].get("content", "") if messages else ""
+                    content = json.dumps(server.classifications.get(query, server.classification))
+                    return self._send_json(_completion(content, _usage(messages, len(content) // 4)))
+
+                tokens = make_answer(server.answer_tokens)
+                usage = _usage(messages, len(tokens))
+                if not body.get("stream"):
+                    time.sleep(server.first_token_latency + server.token_interval * len(tokens))
+                    return self._send_json(_completion("".join(tokens), usage))
+
+                self.send_response(200)
+                self.send_header("Content-Type", "text/event-stream")
+                self.send_header("Transfer-Encoding", "chunked")
+                self.end_headers()
+                time.sleep(server.first_token_latency)
+                for token in tokens:
+                    self._write_chunk(_chunk({"content": token}))
+                    time.sleep(server.token_interval)
+                self._write_chunk(_chunk({}, finish_reason="stop"))
+                if body.get("stream_options", {}).get("include_usage"):
+                    self._write_chunk(f"data: {json.dumps(dict(_chunk_payload([]), usage=usage))}\n\n")
+                self._write_chunk("data: [DONE]\n\n")
+                self.wfile.write(b"0\r\n\r\n")
+
+            def _write_chunk(self, text: str):
+                data = text.encode()
+                self.wfile.write(f"{len(data):x}\r\n".encode() + data + b"\r\n")
+                self.wfile.flush()
+
+            def _send_json(self, payload: Dict):
+                data = json.dumps(payload).encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+        return Handler
+
+
+def _usage(messages, completion_tokens: int) -> Dict:
+    # Roughly four characters per token, like the prompt estimates
+    prompt_tokens = sum(len(str(message.get("content", ""))) for message in messages) // 4
+    return {"prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens,
+            "total_tokens": prompt_tokens + completion_tokens}
+
+
+def _completion(content: str, usage: Dict) -> Dict:
+    return {
+        "id": "chatcmpl-mock",
+        "object": "chat.completion",
+        "created": int(time.time()),
+        "model": "mock",
+        "choices": [{"index": 0, "message": {"role": "assistant", "content": content}, "finish_reason": "stop"}],
+        "usage": usage,
+    }
+
+
+def _chunk_payload(choices: List[Dict]) -> Dict:
+    return {
+        "id": "chatcmpl-mock",
+        "object": "chat.completion.chunk",
+        "created": int(time.time()),
+        "model": "mock",
+        "choices": choices,
+    }
+
+
+def _chunk(delta: Dict, finish_reason: Optional[str] = None) -> str:
+    payload = _chunk_payload([{"index": 0, "delta": delta, "finish_reason": finish_reason}])
+    return f"data: {json.dumps(payload)}\n\n"
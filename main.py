@@ -1,32 +1,69 @@
 # Updated main.py
 from os import system
+import argparse
+import functools
 import os
 import signal
 import sys
 import webbrowser
 import threading
 import time
-from flask import Flask, render_template, request, jsonify
+import json
+import uuid
+from flask import Flask, Response, render_template, request, jsonify, make_response, session, stream_with_context
 import atexit
 
 from app.logger import logger
-from app.agent.canvasai import CanvasAI
-from app.config import SHOW_LOGS
+from app.agent.pool import AgentPool
+from app.agent.sync import SyncScheduler
+from app.server import RequestTracker, run_headless
+from app.api.cache import get_default_cache
+from app.api.data_store import close_canvas_store
+from app.services.answer_cache import get_answer_cache
+from app.services.classification_cache import get_classification_cache
+from app.utils import metrics
+from app.utils.loading_utils import enable_console_spinner
+from app.utils.tracing import start_trace
+from app.config import (
+    CANVAS_API_KEY,
+    CANVAS_STORE_ENABLED,
+    FLASK_SECRET_KEY,
+    SHOW_LOGS,
+    SERVE_MODE,
+    SERVER_HOST,
+    SERVER_PORT,
+    SERVER_WORKERS,
+    SERVER_THREADS,
+    SHUTDOWN_DRAIN_TIMEOUT,
+    SYNC_ENABLED,
+)
 
 # Global variable to track exit request
 exit_requested = False
-agent = None
+# One agent per browser session, created on first use
+agents = None
+# Keeps the stored Canvas data of active sessions fresh
+sync_scheduler = None
+# Headless servers must not be stoppable from the web page
+headless = False
 app = Flask(__name__, 
             static_folder="static",
             template_folder="templates")
+app.secret_key = FLASK_SECRET_KEY or os.urandom(32)
+# Counts requests in flight so SIGTERM can wait for them
+requests_in_flight = RequestTracker(app.wsgi_app)
+app.wsgi_app = requests_in_flight
 
 def cleanup():
     """Perform cleanup operations before exit"""
     logger.info("Performing cleanup operations...")
-    # Add any specific cleanup needed for the agent
-    if agent:
-        # Close any open connections or resources
-        pass
+    if sync_scheduler is not None:
+        sync_scheduler.stop()
+        logger.info(f"Background sync at exit: {sync_scheduler.stats()}")
+    # After the sync, which writes to it
+    close_canvas_store()
+    if agents is not None:
+        logger.info(f"Session agents at exit: {agents.stats()}")
     logger.info("Cleanup complete")
 
 def signal_handler(sig, frame):
@@ -43,18 +80,101 @@ def open_browser():
     time.sleep(1)
     webbrowser.open('http://127.0.0.1:5000')
 
+def traced(name: str):
+    """Trace a view; the timings of its spans are returned in the Server-Timing header"""
+    def decorator(view):
+        @functools.wraps(view)
+        def wrapper(*args, **kwargs):
+            with start_trace(name) as trace:
+                response = make_response(view(*args, **kwargs))
+            metrics.HTTP_REQUEST_SECONDS.labels(name).observe(trace.root.duration)
+            response.headers["Server-Timing"] = trace.server_timing()
+            return response
+        return wrapper
+    return decorator
+
+def register_metrics():
+    """Read the web app, pool and cache counters into the metrics when scraped"""
+    metrics.HTTP_IN_FLIGHT.set_function(lambda: requests_in_flight.in_flight)
+    metrics.AGENT_SESSIONS.set_function(lambda: len(agents) if agents is not None else 0)
+    caches = {
+        "canvas": get_default_cache,
+        "classification": get_classification_cache,
+        "answer": get_answer_cache,
+    }
+    for cache_name, get_cache in caches.items():
+        metrics.CACHE_LOOKUPS.labels(cache_name, "hit").set_function(cache_counter(get_cache, "hits"))
+        metrics.CACHE_LOOKUPS.labels(cache_name, "miss").set_function(cache_counter(get_cache, "misses"))
+    metrics.CACHE_LOOKUPS.labels("canvas", "revalidated").set_function(cache_counter(caches["canvas"], "revalidations"))
+
+def cache_counter(get_cache, counter: str):
+    """Reads one counter of a cache's stats(); a disabled cache counts nothing"""
+    def read():
+        cache = get_cache()
+        return cache.stats()[counter] if cache is not None else 0
+    return read
+
+register_metrics()
+
+@app.before_request
+def reject_while_draining():
+    """Turn new requests away once shutdown has started; health checks still answer"""
+    if requests_in_flight.draining and request.path not in ("/healthz", "/readyz", "/api/metrics"):
+        return jsonify({"error": "Server is shutting down"}), 503
+
+@app.route('/healthz')
+def healthz():
+    """Liveness: the process is up and answering"""
+    return jsonify({"status": "ok"})
+
+@app.route('/api/metrics')
+def metrics_endpoint():
+    """Metrics of this process in the Prometheus text format"""
+    return Response(metrics.render(), content_type=metrics.CONTENT_TYPE)
+
+@app.route('/readyz')
+def readyz():
+    """Readiness: the agent pool is set up and the server is not draining"""
+    if agents is None or requests_in_flight.draining:
+        return jsonify({"status": "not ready"}), 503
+    return jsonify({"status": "ready", "sessions": len(agents), "in_flight": requests_in_flight.in_flight})
+
+def session_id() -> str:
+    """Identify the browser session, issuing an id on first contact"""
+    if "sid" not in session:
+        session["sid"] = uuid.uuid4().hex
+    return session["sid"]
+
+def session_agent():
+    """
+    The agent of the current session
+
+    Sessions without their own Canvas token are given an agent with the
+    configured one. Tokens are never put in the cookie, so a session that
+    signed in with its own token has to sign in again once its agent has
+    been evicted. Returns None if there is no usable agent.
+    """
+    if agents is None:
+        return None
+    sid = session_id()
+    if session.get("own_token") or not CANVAS_API_KEY:
+        return agents.get(sid)
+    return agents.get_or_create(sid)
+
+NO_SESSION_ERROR = "No Canvas session. Sign in with your Canvas access token."
+
 @app.route('/')
 def home():
     """Render the main chat interface"""
     return render_template('index.html')
 
 @app.route('/api/query', methods=['POST'])
+@traced("query")
 def process_query():
     """API endpoint to process queries"""
-    global agent
-    
+    agent = session_agent()
     if not agent:
-        return jsonify({"error": "Agent not initialized"}), 500
+        return jsonify({"error": NO_SESSION_ERROR}), 401
         
     data = request.json
     query = data.get('query', '')
@@ -64,19 +184,57 @@ def process_query():
         
     try:
         logger.info(f"Processing query: {query}")
-        response = agent.process_query(query)
-        return jsonify({"response": response})
+        return jsonify(agent.answer_query(query))
     except Exception as e:
         logger.error(f"Error processing query: {e}")
         return jsonify({"error": str(e)}), 500
 
+def sse_event(event: dict) -> str:
+    """Format an agent event as a Server-Sent Events message"""
+    return f"event: {event['type']}\ndata: {json.dumps(event)}\n\n"
+
+def traced_events(events):
+    """
+    Format agent events as SSE while tracing them; the headers of a stream
+    are sent before any work is done, so its timings are only logged
+    """
+    with start_trace("stream") as trace:
+        for event in events:
+            yield sse_event(event)
+    metrics.HTTP_REQUEST_SECONDS.labels("stream").observe(trace.root.duration)
+
+@app.route('/api/query/stream', methods=['POST'])
+def stream_query():
+    """API endpoint to process queries, streaming progress and the answer as Server-Sent Events"""
+    agent = session_agent()
+    if not agent:
+        return jsonify({"error": NO_SESSION_ERROR}), 401
+        
+    data = request.json
+    query = data.get('query', '')
+    
+    if not query.strip():
+        return jsonify({"error": "Empty query provided"}), 400
+    
+    logger.info(f"Streaming query: {query}")
+    events = traced_events(agent.stream_query(query))
+    return Response(
+        stream_with_context(events),
+        mimetype="text/event-stream",
+        headers={
+            "Cache-Control": "no-cache",
+            # Stop reverse proxies from buffering the stream
+            "X-Accel-Buffering": "no",
+        }
+    )
+
 @app.route('/api/courses', methods=['GET'])
+@traced("courses")
 def get_courses():
     """API endpoint to get user's courses"""
-    global agent
-    
+    agent = session_agent()
     if not agent:
-        return jsonify({"error": "Agent not initialized"}), 500
+        return jsonify({"error": NO_SESSION_ERROR}), 401
         
     try:
         courses = agent.load_active_courses()
@@ -85,11 +243,40 @@ def get_courses():
         logger.error(f"Error loading courses: {e}")
         return jsonify({"error": str(e)}), 500
 
+@app.route('/api/session', methods=['POST'])
+@traced("session")
+def start_session():
+    """API endpoint to sign the current session in with its own Canvas access token"""
+    if agents is None:
+        return jsonify({"error": "Agent pool not initialized"}), 500
+    
+    token = (request.json or {}).get('canvas_token', '').strip()
+    if not token:
+        return jsonify({"error": "No Canvas token provided"}), 400
+    
+    agent = agents.create(session_id(), token)
+    if not agent:
+        return jsonify({"error": "Canvas rejected the access token"}), 401
+    session["own_token"] = True
+    user_info = agent.canvas_client.user_info or {}
+    return jsonify({"status": "authenticated", "user": user_info.get("name")})
+
+@app.route('/api/session', methods=['DELETE'])
+def end_session():
+    """API endpoint to drop the current session's agent and conversation"""
+    if agents is not None and "sid" in session:
+        agents.remove(session["sid"])
+    session.clear()
+    return jsonify({"status": "signed out"})
+
 @app.route('/api/shutdown', methods=['POST'])
 def shutdown():
     """API endpoint to gracefully shut down the application"""
     global exit_requested
     
+    if headless:
+        return jsonify({"error": "Shutdown is disabled in headless mode"}), 403
+    
     logger.info("Shutdown requested via API")
     
     # Function to shut down the server
@@ -110,14 +297,23 @@ def shutdown():
     return jsonify({"status": "Shutting down..."}), 200
 
 def initialize_agent():
-    """Initialize the Canvas AI agent and authenticate"""
-    global agent
+    """Create the session agent pool and check the configured Canvas credentials"""
+    global agents, sync_scheduler
+    
+    logger.info("Initializing Canvas AI agent pool")
+    agents = AgentPool()
     
-    logger.info("Initializing Canvas AI agent")
-    agent = CanvasAI()
+    # The sync refreshes the Canvas store, so it has nothing to do without one
+    if SYNC_ENABLED and CANVAS_STORE_ENABLED:
+        sync_scheduler = SyncScheduler(agents)
+        sync_scheduler.start()
+    
+    if not CANVAS_API_KEY:
+        logger.info("No Canvas API key configured; each session signs in with its own token")
+        return True
     
     logger.info("Authenticating with Canvas")
-    auth_result = agent.authenticate_user()
+    auth_result = agents.factory(None).authenticate_user()
     
     if not auth_result:
         logger.error("Authentication failed")
@@ -126,6 +322,37 @@ def initialize_agent():
     logger.info("Authentication successful")
     return True
 
+def create_app(serve_headless: bool = True) -> Flask:
+    """
+    WSGI app factory for production servers, e.g.
+    gunicorn -k gthread --threads 32 "main:create_app()"
+    """
+    global headless
+    headless = serve_headless
+    if agents is None and not initialize_agent():
+        raise RuntimeError("Canvas authentication failed. Please check your Canvas API key.")
+    return app
+
+def serve(host: str, port: int, workers: int, threads: int):
+    """Run the headless production server until SIGTERM"""
+    global headless
+    headless = True
+    if workers > 1 and not FLASK_SECRET_KEY:
+        # Workers fork from this process, so they share the random key generated at import
+        logger.warning("FLASK_SECRET_KEY is not set; sessions will not survive a restart")
+    run_headless(create_app, host, port, workers=workers, threads=threads,
+                 drain_timeout=SHUTDOWN_DRAIN_TIMEOUT, on_exit=cleanup)
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Canvas Academic Assistant")
+    parser.add_argument("--serve", action="store_const", const="headless", dest="mode", default=SERVE_MODE,
+                        help="run headless behind a production server instead of opening a browser")
+    parser.add_argument("--host", default=SERVER_HOST)
+    parser.add_argument("--port", type=int, default=SERVER_PORT)
+    parser.add_argument("--workers", type=int, default=SERVER_WORKERS)
+    parser.add_argument("--threads", type=int, default=SERVER_THREADS)
+    return parser.parse_args(argv)
+
 def main():
     try:
         # Setup signal handlers
@@ -137,6 +364,9 @@ def main():
         # Register the cleanup function to be called on exit
         atexit.register(cleanup)
         
+        # Show each phase of a query on the console
+        enable_console_spinner()
+        
         # Initialize the agent
         if not initialize_agent():
             print("Authentication failed. Please check your Canvas API key.")
@@ -166,6 +396,11 @@ def main():
         raise
 
 if __name__ == "__main__":
+    args = parse_args()
+    if args.mode == "headless":
+        serve(args.host, args.port, args.workers, args.threads)
+        sys.exit(0)
+    
     try:
         # Clear the terminal at startup for better visibility
         if sys.platform.startswith('win'):
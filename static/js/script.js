@@ -73,11 +73,46 @@ document.addEventListener('DOMContentLoaded', function() {
         }
     });
 
+    // Function to sign this browser session in with its own Canvas access token
+    function signIn() {
+        const token = window.prompt('Enter your Canvas access token to sign in:');
+        if (!token) {
+            return Promise.resolve(false);
+        }
+        return fetch('/api/session', {
+            method: 'POST',
+            headers: {
+                'Content-Type': 'application/json'
+            },
+            body: JSON.stringify({ canvas_token: token })
+        })
+        .then(response => response.json().then(data => ({ ok: response.ok, data })))
+        .then(({ ok, data }) => {
+            if (!ok) {
+                addMessage(`Error: ${data.error}`, 'assistant');
+                return false;
+            }
+            loadCourses();
+            return true;
+        });
+    }
+
     // Function to load courses
     function loadCourses() {
         fetch('/api/courses')
-            .then(response => response.json())
+            .then(response => {
+                // No Canvas session for this browser yet
+                if (response.status === 401) {
+                    courseList.innerHTML = '<div class="course-item"><i class="fas fa-sign-in-alt"></i> Not signed in</div>';
+                    signIn();
+                    return null;
+                }
+                return response.json();
+            })
             .then(data => {
+                if (!data) {
+                    return;
+                }
                 if (data.error) {
                     courseList.innerHTML = `<div class="course-item"><i class="fas fa-exclamation-circle"></i> Error: ${data.error}</div>`;
                     return;
@@ -117,9 +152,97 @@ document.addEventListener('DOMContentLoaded', function() {
             });
     }
 
-    // Function to send message to backend
+    // Function to send message to backend, rendering the answer as it streams in
     function sendMessage(message) {
-        fetch('/api/query', {
+        fetch('/api/query/stream', {
+            method: 'POST',
+            headers: {
+                'Content-Type': 'application/json'
+            },
+            body: JSON.stringify({ query: message })
+        })
+        .then(response => {
+            if (response.status === 401) {
+                removeTypingIndicator();
+                return signIn().then(signedIn => {
+                    if (signedIn) {
+                        showTypingIndicator();
+                        sendMessage(message);
+                    }
+                });
+            }
+            // Fall back to the blocking endpoint if streaming is unavailable
+            if (!response.ok || !response.body) {
+                return sendMessageBlocking(message);
+            }
+            return readEventStream(response.body.getReader());
+        })
+        .catch(error => {
+            console.error('Error sending message:', error);
+            removeTypingIndicator();
+            addMessage('Sorry, there was an error processing your request.', 'assistant');
+        });
+    }
+
+    // Function to read Server-Sent Events from the streaming endpoint
+    function readEventStream(reader) {
+        const decoder = new TextDecoder();
+        let buffer = '';
+        let answer = '';
+        let messageElement = null;
+
+        function handleEvent(event) {
+            if (event.type === 'progress') {
+                updateTypingIndicator(event.message);
+            } else if (event.type === 'token') {
+                if (!messageElement) {
+                    removeTypingIndicator();
+                    messageElement = addMessage('', 'assistant');
+                }
+                answer += event.text;
+                renderStreamingMessage(messageElement, answer, true);
+            } else if (event.type === 'done') {
+                if (messageElement) {
+                    renderStreamingMessage(messageElement, answer, false);
+                } else {
+                    removeTypingIndicator();
+                }
+            } else if (event.type === 'error') {
+                removeTypingIndicator();
+                addMessage(event.message, 'assistant');
+            }
+        }
+
+        function pump() {
+            return reader.read().then(({ done, value }) => {
+                if (done) {
+                    removeTypingIndicator();
+                    if (messageElement) {
+                        renderStreamingMessage(messageElement, answer, false);
+                    }
+                    return;
+                }
+                buffer += decoder.decode(value, { stream: true });
+
+                // Events are separated by a blank line; keep any partial event for the next chunk
+                const blocks = buffer.split('\n\n');
+                buffer = blocks.pop();
+                blocks.forEach(block => {
+                    const dataLine = block.split('\n').find(line => line.startsWith('data: '));
+                    if (dataLine) {
+                        handleEvent(JSON.parse(dataLine.slice(6)));
+                    }
+                });
+                return pump();
+            });
+        }
+
+        return pump();
+    }
+
+    // Function to send message to the blocking endpoint
+    function sendMessageBlocking(message) {
+        return fetch('/api/query', {
             method: 'POST',
             headers: {
                 'Content-Type': 'application/json'
@@ -137,22 +260,11 @@ document.addEventListener('DOMContentLoaded', function() {
             }
             
             addMessage(data.response, 'assistant');
-        })
-        .catch(error => {
-            console.error('Error sending message:', error);
-            removeTypingIndicator();
-            addMessage('Sorry, there was an error processing your request.', 'assistant');
         });
     }
 
-    // Function to add message to chat with timestamp
-    function addMessage(message, sender) {
-        const messageElement = document.createElement('div');
-        messageElement.className = `message ${sender}-message`;
-        
-        const messageContent = document.createElement('div');
-        messageContent.className = 'message-content';
-        
+    // Function to convert markdown-like formatting to HTML
+    function formatMessage(message, sender) {
         // Process markdown-like formatting for assistant messages
         if (sender === 'assistant') {
             // Convert markdown headings
@@ -180,8 +292,25 @@ document.addEventListener('DOMContentLoaded', function() {
             // For user messages, just handle line breaks
             message = message.replace(/\n/g, '<br>');
         }
+        return message;
+    }
+
+    // Function to re-render a message while its text is still streaming in
+    function renderStreamingMessage(messageElement, message, streaming) {
+        const messageContent = messageElement.querySelector('.message-content');
+        const cursor = streaming ? '<span class="cursor-blink">▌</span>' : '';
+        messageContent.innerHTML = `<p>${formatMessage(message, 'assistant')}${cursor}</p>`;
+        chatMessages.scrollTop = chatMessages.scrollHeight;
+    }
+
+    // Function to add message to chat with timestamp
+    function addMessage(message, sender) {
+        const messageElement = document.createElement('div');
+        messageElement.className = `message ${sender}-message`;
         
-        messageContent.innerHTML = `<p>${message}</p>`;
+        const messageContent = document.createElement('div');
+        messageContent.className = 'message-content';
+        messageContent.innerHTML = `<p>${formatMessage(message, sender)}</p>`;
         
         // Add timestamp
         const timestamp = document.createElement('div');
@@ -197,6 +326,7 @@ document.addEventListener('DOMContentLoaded', function() {
         
         // Scroll to bottom
         chatMessages.scrollTop = chatMessages.scrollHeight;
+        return messageElement;
     }
 
     // Function to show typing indicator
@@ -214,6 +344,21 @@ document.addEventListener('DOMContentLoaded', function() {
         chatMessages.scrollTop = chatMessages.scrollHeight;
     }
 
+    // Function to show the current processing phase next to the typing indicator
+    function updateTypingIndicator(status) {
+        const typingIndicator = document.getElementById('typing-indicator');
+        if (!typingIndicator) return;
+        
+        let label = typingIndicator.querySelector('.typing-status');
+        if (!label) {
+            label = document.createElement('div');
+            label.className = 'typing-status';
+            typingIndicator.appendChild(label);
+        }
+        label.textContent = status;
+        chatMessages.scrollTop = chatMessages.scrollHeight;
+    }
+
     // Function to remove typing indicator
     function removeTypingIndicator() {
         const typingIndicator = document.getElementById('typing-indicator');
@@ -0,0 +1,60 @@
+from app.services.answer_cache import AnswerCache, fingerprint_data
+from app.services.async_openai_service import AsyncOpenAIService
+from app.services.classification_cache import normalize_query
+
+FILES = [{"id": 1, "display_name": "Week 1 slides", "url": "https://canvas.example.edu/files/1?verifier=abc"}]
+
+
+def test_fingerprint_ignores_volatile_fields():
+    refetched = [dict(FILES[0], url="https://canvas.example.edu/files/1?verifier=xyz", updated_at="2026-10-02")]
+
+    assert fingerprint_data({"files": FILES}) == fingerprint_data({"files": refetched})
+
+
+def test_fingerprint_changes_with_the_data():
+    renamed = [dict(FILES[0], display_name="Week 1 slides (updated)")]
+
+    assert fingerprint_data({"files": FILES}) != fingerprint_data({"files": renamed})
+
+
+def test_partial_data_has_its_own_fingerprint():
+    partial = {"files": FILES, "missing_data": {"modules": "not retrieved within 8.0s"}}
+
+    assert fingerprint_data(partial) != fingerprint_data({"files": FILES})
+
+
+def test_answers_from_partial_data_are_not_cached():
+    service = AsyncOpenAIService()
+    service.answer_cache = AnswerCache()
+    partial = {"files": FILES, "missing_data": {"modules": "not retrieved within 8.0s"}}
+
+    cache_key, cached, messages = service._prepare_response("", partial, "Where are the slides?", "course_materials",
+                                                            "user-1", "")
+    service._store_answer(cache_key, "The modules could not be loaded.")
+
+    assert cache_key is None and cached is None and messages
+    assert service.answer_cache.stats()["entries"] == 0
+
+
+def test_answers_from_complete_data_are_reused():
+    service = AsyncOpenAIService()
+    service.answer_cache = AnswerCache()
+    data = {"files": FILES}
+
+    cache_key, _, _ = service._prepare_response("", data, "Where are the slides?", "course_materials", "user-1", "")
+    service._store_answer(cache_key, "Week 1 slides are in Files.")
+    _, cached, messages = service._prepare_response("", data, "where are the slides", "course_materials", "user-1", "")
+
+    assert cached == "Week 1 slides are in Files."
+    assert messages == []
+
+
+def test_normalize_query_maps_relative_date_spellings():
+    assert normalize_query("What's due TMRW?") == normalize_query("whats due tomorrow")
+    assert normalize_query("due thurs") == "due thursday"
+
+
+def test_normalize_query_leaves_ambiguous_words_alone():
+    assert normalize_query("Which readings cover the sun") == "which readings cover the sun"
+    assert "wednesday" not in normalize_query("what did we'd say about the lab")
+    assert normalize_query("what's due wed") != normalize_query("what's due wednesday")
@@ -0,0 +1,76 @@
+import time
+
+import pytest
+
+from app.api.data_store import CanvasStore
+
+OWNER = "https://canvas.example.edu/api/v1|1"
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = CanvasStore(tmp_path / "canvas.db", max_age=3600)
+    yield store
+    store.close()
+
+
+def _files(version):
+    return [{"id": 1, "display_name": f"Slides {version}", "updated_at": f"2026-10-0{version}T00:00:00Z"}]
+
+
+def test_put_then_get_returns_the_value_and_fetch_time(store):
+    assert store.put(OWNER, "get_course_files", (1000,), _files(1), fetched_at=100.0)
+
+    stored = store.get(OWNER, "get_course_files", (1000,))
+    assert stored.value == _files(1)
+    assert stored.fetched_at == 100.0
+    assert store.get(OWNER, "get_course_files", (1001,)) is None
+
+
+def test_unchanged_content_only_moves_the_fetch_time_forward(store):
+    store.put(OWNER, "get_course_files", (1000,), _files(1), fetched_at=time.time() - 60)
+    now = time.time()
+
+    assert not store.put(OWNER, "get_course_files", (1000,), _files(1), fetched_at=now)
+    assert store.get(OWNER, "get_course_files", (1000,)).fetched_at == now
+    assert store.stats()["writes"] == 1
+
+
+def test_older_version_from_an_earlier_fetch_is_not_stored(store):
+    now = time.time()
+    store.put(OWNER, "get_course_files", (1000,), _files(2), fetched_at=now)
+
+    # A revalidation that started before the stored fetch, returning older data
+    assert not store.put(OWNER, "get_course_files", (1000,), _files(1), fetched_at=now - 5)
+    assert store.get(OWNER, "get_course_files", (1000,)).value == _files(2)
+
+
+def test_older_version_from_a_later_fetch_is_stored(store):
+    now = time.time()
+    store.put(OWNER, "get_course_files", (1000,), _files(2), fetched_at=now - 5)
+
+    # Canvas itself went back, e.g. an edit was reverted
+    assert store.put(OWNER, "get_course_files", (1000,), _files(1), fetched_at=now)
+    assert store.get(OWNER, "get_course_files", (1000,)).value == _files(1)
+
+
+def test_empty_result_replaces_stored_data(store):
+    store.put(OWNER, "get_course_announcements", (1000,), [{"id": 1, "title": "Welcome"}])
+
+    assert store.put(OWNER, "get_course_announcements", (1000,), [])
+    assert store.get(OWNER, "get_course_announcements", (1000,)).value == []
+
+
+def test_prune_deletes_rows_older_than_max_age(store):
+    store.put(OWNER, "get_course_files", (1000,), _files(1), fetched_at=time.time() - 7200)
+    store.put(OWNER, "get_course_files", (1001,), _files(1))
+
+    assert store.prune() == 1
+    assert store.get(OWNER, "get_course_files", (1000,)) is None
+    assert store.get(OWNER, "get_course_files", (1001,)) is not None
+
+
+def test_owners_do_not_share_rows(store):
+    store.put(OWNER, "load_active_courses", (), [{"id": 1000}])
+
+    assert store.get("https://canvas.example.edu/api/v1|2", "load_active_courses") is None
@@ -0,0 +1,144 @@
+import asyncio
+import datetime
+import time
+from collections import Counter
+
+import pytest
+
+from app.agent.fetch_planner import COURSES_TASK, DEADLINES_TASK, AsyncFetchPlanner, FetchTask, data_age
+from app.api.data_store import CanvasStore
+from app.api.transport import CanvasAPIError
+
+OWNER = "https://canvas.example.edu/api/v1|1"
+FILES_TASK = FetchTask("files", "get_course_files", (1000,))
+
+
+class _Client:
+    api_url = "https://canvas.example.edu/api/v1"
+    user_info = {"id": 1}
+
+    def __init__(self, delay=0.0, fail=False):
+        self.delay = delay
+        self.fail = fail
+        self.calls = Counter()
+
+    async def get_course_files(self, course_id):
+        self.calls["get_course_files"] += 1
+        await asyncio.sleep(self.delay)
+        if self.fail:
+            raise CanvasAPIError(503, f"{self.api_url}/courses/{course_id}/files", "unavailable")
+        return [{"id": 1, "display_name": "Slides"}]
+
+    async def get_upcoming_deadlines(self, courses):
+        self.calls["get_upcoming_deadlines"] += 1
+        return []
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = CanvasStore(tmp_path / "canvas.db")
+    yield store
+    store.close()
+
+
+def test_data_age_is_taken_from_the_data_each_query_used(store):
+    store.put(OWNER, FILES_TASK.method, FILES_TASK.args, [{"id": 1}], fetched_at=time.time() - 600)
+    planner = AsyncFetchPlanner(_Client(), store=store, revalidate_after=60)
+
+    async def run():
+        data, fetched_at = {}, {}
+        await planner.execute([FILES_TASK], data, fetched_at=fetched_at)
+        # The stale row is refreshed in the background; the answer still used the stored data
+        await planner.wait_revalidation()
+        return data, fetched_at
+
+    data, fetched_at = asyncio.run(run())
+
+    assert data["files"] == [{"id": 1}]
+    assert 599 <= data_age(fetched_at)["files"] <= 610
+    assert store.get(OWNER, FILES_TASK.method, FILES_TASK.args).age < 5
+
+
+def test_a_sync_refresh_does_not_change_an_earlier_answer_s_data_age(store):
+    store.put(OWNER, FILES_TASK.method, FILES_TASK.args, [{"id": 1}], fetched_at=time.time() - 600)
+    planner = AsyncFetchPlanner(_Client(), store=store, revalidate_after=3600)
+
+    async def run():
+        first, second = {}, {}
+        await planner.execute([FILES_TASK], {}, fetched_at=first)
+        # The background sync refreshes the same data before the next query
+        await planner.refresh(FILES_TASK)
+        await planner.execute([FILES_TASK], {}, fetched_at=second)
+        return first, second
+
+    first, second = asyncio.run(run())
+
+    assert data_age(first)["files"] >= 599
+    assert data_age(second)["files"] < 5
+
+
+def test_failed_fetch_is_reported_missing_and_not_stored(store):
+    planner = AsyncFetchPlanner(_Client(fail=True), store=store)
+    data, fetched_at = {}, {}
+
+    missing = asyncio.run(planner.execute([FILES_TASK], data, fetched_at=fetched_at))
+
+    assert missing["files"].startswith("failed")
+    assert data["missing_data"] == missing
+    assert "files" not in data and fetched_at == {}
+    assert store.get(OWNER, FILES_TASK.method, FILES_TASK.args) is None
+
+
+def test_fetches_past_the_deadline_are_reported_missing():
+    planner = AsyncFetchPlanner(_Client(delay=1.0), deadline=0.05)
+    data = {}
+
+    missing = asyncio.run(planner.execute([FILES_TASK], data))
+
+    assert "not retrieved" in missing["files"]
+    assert "files" not in data
+
+
+def test_speculative_fetch_is_used_instead_of_fetching_again():
+    client = _Client()
+    planner = AsyncFetchPlanner(client)
+
+    async def run():
+        speculation = planner.speculate("where are the slides for COSC2000", [
+            {"id": 1000, "name": "Algorithms", "course_code": "COSC2000"}])
+        data = {}
+        await planner.execute([FILES_TASK], data, prefetched=speculation)
+        return data
+
+    data = asyncio.run(run())
+
+    assert data["files"] == [{"id": 1, "display_name": "Slides"}]
+    assert client.calls["get_course_files"] == 1
+    assert planner.prefetch_stats.snapshot()["used"] == 1
+
+
+def test_stored_deadlines_that_have_passed_are_dropped(store):
+    now = datetime.datetime.now(datetime.timezone.utc)
+    passed = {"assignment_name": "Quiz 1", "due_date": (now - datetime.timedelta(hours=1)).isoformat()}
+    upcoming = {"assignment_name": "Quiz 2", "due_date": (now + datetime.timedelta(hours=1)).isoformat()}
+    store.put(OWNER, DEADLINES_TASK.method, DEADLINES_TASK.args, [passed, upcoming])
+    client = _Client()
+    planner = AsyncFetchPlanner(client, store=store)
+    data = {"courses": []}
+
+    asyncio.run(planner.execute([DEADLINES_TASK], data))
+
+    assert data["upcoming_deadlines"] == [upcoming]
+    assert client.calls["get_upcoming_deadlines"] == 0
+
+
+def test_fetch_returns_the_value_with_its_fetch_time(store):
+    class _Courses(_Client):
+        async def load_active_courses(self):
+            return [{"id": 1000}]
+
+    before = time.time()
+    fetched = asyncio.run(AsyncFetchPlanner(_Courses(), store=store).fetch(COURSES_TASK))
+
+    assert fetched.value == [{"id": 1000}]
+    assert fetched.fetched_at >= before
@@ -0,0 +1,102 @@
+import asyncio
+
+import pytest
+
+from app.api.async_transport import AsyncCanvasTransport
+from app.api.cache import ResponseCache
+from app.api.pagination import aiter_pages, aiter_records
+from app.api.transport import CanvasAPIError
+from benchmarks.mock_canvas import MockCanvasData, MockCanvasServer
+
+
+@pytest.fixture(scope="module")
+def server():
+    with MockCanvasServer(MockCanvasData(n_courses=25)) as server:
+        yield server
+
+
+def _collect(agen_factory, limit=None):
+    async def run():
+        records = []
+        async for record in agen_factory(AsyncCanvasTransport(max_retries=0)):
+            records.append(record)
+            if limit is not None and len(records) == limit:
+                break
+        return records
+    return asyncio.run(run())
+
+
+def test_follows_next_links_across_pages(server):
+    server.reset_stats()
+    pages = _collect(lambda transport: aiter_pages(transport, f"{server.url}/courses", per_page=10))
+
+    assert [len(page) for page in pages] == [10, 10, 5]
+    assert [course["id"] for page in pages for course in page] == [course["id"] for course in server.data.courses]
+    assert server.total_requests == 3
+
+
+class _RecordingTransport:
+    def __init__(self, transport):
+        self.transport = transport
+        self.urls = []
+
+    async def get(self, url, headers=None, params=None):
+        response = await self.transport.get(url, headers=headers, params=params)
+        self.urls.append(str(response.url))
+        return response
+
+
+def test_next_links_keep_the_original_query(server):
+    recording = None
+
+    def pages(transport):
+        nonlocal recording
+        recording = _RecordingTransport(transport)
+        return aiter_records(recording, f"{server.url}/courses", params={"include": ["term"]}, per_page=7)
+
+    courses = _collect(pages)
+
+    assert len(courses) == 25
+    assert len(recording.urls) == 4
+    assert all("include=term" in url and "per_page=7" in url for url in recording.urls)
+
+
+def test_stopping_early_stops_the_downloads(server):
+    server.reset_stats()
+    courses = _collect(lambda transport: aiter_records(transport, f"{server.url}/courses", per_page=10), limit=5)
+
+    assert len(courses) == 5
+    assert server.total_requests == 1
+
+
+def test_prefetch_yields_the_same_records(server):
+    plain = _collect(lambda transport: aiter_records(transport, f"{server.url}/courses", per_page=10))
+    prefetched = _collect(lambda transport: aiter_records(
+        transport, f"{server.url}/courses", per_page=10, prefetch=True))
+
+    assert prefetched == plain
+
+
+def test_rejected_page_raises(server):
+    with pytest.raises(CanvasAPIError) as error:
+        _collect(lambda transport: aiter_records(transport, f"{server.url}/nope"))
+    assert error.value.status_code == 404
+
+
+def test_stale_cached_listing_is_revalidated_with_its_etag(server):
+    cache = ResponseCache(ttl_rules=[(r"/courses$", 0.0)])
+    transport = AsyncCanvasTransport(max_retries=0, cache=cache)
+    url = f"{server.url}/courses"
+
+    async def fetch_twice():
+        first = await transport.get(url, params={"per_page": 10})
+        second = await transport.get(url, params={"per_page": 10})
+        return first, second
+
+    server.reset_stats()
+    first, second = asyncio.run(fetch_twice())
+
+    assert second.status_code == 200
+    assert second.json() == first.json()
+    assert server.not_modified == 1
+    assert cache.stats()["revalidations"] == 1
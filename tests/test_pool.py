@@ -0,0 +1,68 @@
+import threading
+import time
+
+from app.agent.pool import AgentPool
+
+
+class _Agent:
+    def __init__(self, api_key=None, size=100, auth_delay=0.0):
+        self.size = size
+        self.auth_delay = auth_delay
+        self.measured = 0
+
+    def authenticate_user(self):
+        time.sleep(self.auth_delay)
+        return True
+
+    def footprint(self):
+        self.measured += 1
+        return self.size
+
+
+def test_use_measures_only_the_agent_used():
+    created = []
+
+    def factory(api_key):
+        created.append(_Agent(api_key))
+        return created[-1]
+
+    pool = AgentPool(max_sessions=10, max_bytes=10_000, factory=factory)
+    for i in range(5):
+        pool.create(f"session-{i}")
+    before = [agent.measured for agent in created]
+
+    pool.get("session-0")
+
+    assert [agent.measured for agent in created][1:] == before[1:]
+    assert pool.stats()["bytes"] == 500
+
+
+def test_memory_cap_evicts_least_recently_used():
+    sizes = iter([400, 400, 400])
+    pool = AgentPool(max_sessions=10, max_bytes=1000, factory=lambda api_key: _Agent(api_key, next(sizes)))
+    for i in range(3):
+        pool.create(f"session-{i}")
+
+    assert pool.get("session-0") is None
+    assert pool.stats()["bytes"] == 800
+    assert pool.stats()["evictions"]["memory"] == 1
+
+
+def test_concurrent_get_or_create_authenticates_one_agent():
+    created = []
+
+    def factory(api_key):
+        created.append(_Agent(api_key, auth_delay=0.05))
+        return created[-1]
+
+    pool = AgentPool(factory=factory)
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(pool.get_or_create("session")))
+               for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len(created) == 1
+    assert all(agent is created[0] for agent in results)
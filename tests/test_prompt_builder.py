@@ -0,0 +1,41 @@
+import datetime
+
+from app.services.prompt_builder import PromptBuilder, TRUNCATED_KEY
+
+NOW = datetime.datetime(2026, 10, 1, tzinfo=datetime.timezone.utc)
+
+
+def _grade_rows(count):
+    return [{
+        "assignment_name": f"Problem Set {i:04d}",
+        "assignment_id": 5000 + i,
+        "points_possible": 10,
+        "score": 8.5 if i % 2 == 0 else None,
+        "submitted": i % 2 == 0,
+        "graded": i % 2 == 0,
+    } for i in range(count)]
+
+
+def test_over_budget_grades_keep_the_rows_that_fit():
+    data = {"grades": {"overall": 88.5, "assignments": _grade_rows(200)}, "course_id": 1000}
+    builder = PromptBuilder(budget=3000, history_share=0.25)
+
+    messages, report = builder.build("", data, "What is my grade?", now=NOW)
+
+    section = next(section for section in report.sections if section.name == "grades")
+    assert section.tokens > section.allocated
+    assert section.allocated * 0.8 <= section.sent <= section.allocated
+    assert report.total <= report.budget
+    prompt = messages[0]["content"]
+    assert "Problem Set" in prompt
+    assert TRUNCATED_KEY in prompt
+
+
+def test_over_budget_grades_rank_graded_rows_first():
+    rows = _grade_rows(200)
+    data = {"grades": {"overall": 88.5, "assignments": rows}}
+    messages, _ = PromptBuilder(budget=3000, history_share=0.25).build("", data, "What is my grade?", now=NOW)
+
+    prompt = messages[0]["content"]
+    kept = [row for row in rows if row["assignment_name"] in prompt]
+    assert kept and all(row["graded"] for row in kept)